@@ -1,9 +1,16 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import requests
-import json
-from io import StringIO
+import os
+import time
+
+# Début du rerun, pour mesurer le premier affichage et les imports
+SCRIPT_START = time.perf_counter()
+
+import streamlit as st  # noqa: E402
+
+import mdb_instrument  # noqa: E402
+from mdb_instrument import instrumented  # noqa: E402
+
+# Vues de la page principale
+VIEWS = ["📋 Résultats", "📊 Graphiques", "📈 Analyse", "📁 Export"]
 
 # Configuration de la page
 st.set_page_config(
@@ -44,232 +51,450 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-
-@st.cache_data
-def load_screener_config():
-    """Charge la configuration des setups de screening"""
-    url = "https://gist.githubusercontent.com/traderLaval/9eaa7bc9f0aac2b276f59594e00f9207/raw/screener_setups.json"
-    try:
-        response = requests.get(url)
-        return json.loads(response.text)
-    except:
-        return {
-            "setups": {
-                "setup01": {"name": "MM200_Cross_Up", "output_file": "mm200_cross_up.csv", "description": "Close a franchi la MM200 jours à la hausse"},
-                "setup02": {"name": "MM200_Cross_Up_MACD_Up", "output_file": "mm200_cross_up_macd_up.csv", "description": "MM200 + MACD haussier"},
-                "setup03": {"name": "MM200_Cross_Up_WMA12_Up", "output_file": "mm200_cross_up_wma12_up.csv", "description": "MM200 + WMA12 ascendante"},
-                "setup04": {"name": "Weekly_SuperTrend_Cross", "output_file": "weekly_supertrend_cross.csv", "description": "SuperTrend hebdomadaire franchi"},
-                "setup05": {"name": "Above_Weekly_Below_Daily_SuperTrend", "output_file": "above_weekly_below_daily_supertrend.csv", "description": "Entre SuperTrend hebdo et daily"},
-                "setup09": {"name": "new_high_50_days", "output_file": "new_high_50_days.csv", "description": "Nouveau plus haut 50 jours"},
-                "setup10": {"name": "new_high_100_days", "output_file": "new_high_100_days.csv", "description": "Nouveau plus haut 100 jours"},
-                "setup11": {"name": "new_high_200_days", "output_file": "new_high_200_days.csv", "description": "Nouveau plus haut 200 jours"}
-            }
-        }
-
-
-@st.cache_data
-def load_screener_results(setup_name, output_file):
-    """Charge les résultats d'un screener spécifique"""
-    base_url = "https://gist.github.com/traderLaval/e4e5eee8d610dcdcaf716a52624334bb/raw/"
+# En-tête principal et sidebar peints avant les imports lourds et le chargement des données
+st.markdown("""
+<div class="main-header">
+    <h1>📊 Les moulins du Bazacle</h1>
+    <p>Analysez et filtrez les actions selon vos critères d'investissement</p>
+</div>
+""", unsafe_allow_html=True)
+st.sidebar.header("🔍 Filtres")
+FIRST_PAINT_MS = (time.perf_counter() - SCRIPT_START) * 1000
+
+# pandas et les modules de données (numpy, pyarrow, requests) ; plotly est importé au premier graphique
+IMPORT_START = time.perf_counter()
+import pandas as pd  # noqa: E402
+
+from mdb_backtest import BACKTEST_FILE, GROUPS, HORIZONS, load_backtest  # noqa: E402
+from mdb_export import EXPORT_FORMATS, available_formats, export_bytes  # noqa: E402
+from mdb_history import history_date, member_label  # noqa: E402
+from mdb_index import PEA_FILTER_OPTIONS, FilterSpec  # noqa: E402
+from mdb_query import QueryError, QueryPlanner  # noqa: E402
+from mdb_refresh import get_refresher  # noqa: E402
+from mdb_results import (cached_result, get_result_cache, restrict_spec,  # noqa: E402
+                         result_key, spec_from_params, spec_to_params)
+from mdb_views import compute_aggregates, page_rows, prepare_display_dataframe  # noqa: E402
+IMPORTS_MS = (time.perf_counter() - IMPORT_START) * 1000
+
+
+@instrumented("load_snapshot")
+def load_snapshot(progress=None):
+    """Dernier instantané valide des données, renouvelé en arrière-plan (None si aucun)"""
+    return get_refresher().get(progress)
+
+
+def format_age(seconds):
+    """Durée lisible : secondes, minutes ou heures"""
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def show_snapshot_info(snapshot, refresher):
+    """Version et âge de l'instantané servi, sous l'en-tête"""
+    now = time.time()
+    info = (f"🗂️ Données version {snapshot.version}, publiées il y a "
+            f"{format_age(now - snapshot.built_at)}, vérifiées il y a "
+            f"{format_age(now - snapshot.checked_at)}")
+    if snapshot.delta is not None:
+        info += (f" (univers mis à jour : {len(snapshot.delta.inserted)} ajoutées, "
+                 f"{len(snapshot.delta.updated)} modifiées, "
+                 f"{len(snapshot.delta.deleted)} retirées)")
+    st.caption(info)
+    quarantine = snapshot.stocks.quarantine
+    if quarantine:
+        with st.expander(f"⚠️ {len(quarantine)} lignes de l'univers écartées (format invalide)"):
+            st.dataframe(pd.DataFrame({
+                'Ligne': [q.line for q in quarantine],
+                'Motif': [q.reason for q in quarantine],
+                'Contenu': [q.text for q in quarantine]
+            }), hide_index=True, use_container_width=True)
+    if refresher.last_error:
+        st.warning(
+            f"⚠️ Dernier rafraîchissement en échec ({refresher.last_error}) : "
+            "affichage des dernières données valides")
+
+
+@instrumented("load_aggregates", cache=cached_result("aggregates"))
+def load_aggregates(key, _index, _rows):
+    """Agrégats des vues Graphiques et Analyse, calculés une fois par état des filtres"""
+    return compute_aggregates(_index.materialize(_rows))
+
+
+@instrumented("import_plotly")
+def import_plotly():
+    """plotly.express, importé seulement quand un graphique est affiché"""
+    import plotly.express as px
+
+    # plotly n'importe son encodeur JSON (orjson) qu'à la première sérialisation et le
+    # lit alors dans sys.modules : deux sessions simultanées pouvaient y trouver un
+    # module à moitié initialisé. Un import normal attend la fin de l'initialisation.
     try:
-        response = requests.get(base_url + output_file)
-        if response.status_code == 200:
-            # Lire le CSV avec les bons paramètres
-            screener_df = pd.read_csv(
-                StringIO(response.text),
-                sep=';',
-                comment='#',
-                encoding='utf-8',
-                on_bad_lines='warn'
-            )
+        import orjson  # noqa: F401
+    except ImportError:
+        pass
+    return px
 
-            # Debug : afficher les colonnes disponibles
-            st.sidebar.write(
-                f"Colonnes dans {output_file}: {screener_df.columns.tolist()}")
-
-            # Retourner la liste des noms
-            if 'Name' in screener_df.columns:
-                names = screener_df['Name'].dropna().tolist()
-                return names
-            elif 'name' in screener_df.columns:
-                names = screener_df['name'].dropna().tolist()
-                return names
-            else:
-                # Si pas de colonne Name, essayer d'autres possibilités
-                st.sidebar.warning(
-                    f"Colonnes disponibles: {screener_df.columns.tolist()}")
-                return []
-    except Exception as e:
-        st.sidebar.error(f"Erreur lors du chargement de {output_file}: {e}")
-    return []
 
+@instrumented("create_summary_charts")
+def create_summary_charts(aggregates):
+    """Crée des graphiques de synthèse"""
+    px = import_plotly()
+    market_counts = aggregates['market_counts']
+    fig_market = px.bar(
+        x=market_counts.values,
+        y=market_counts.index,
+        orientation='h',
+        title="📈 Distribution par Marché (Top 10)",
+        labels={'x': 'Nombre d\'actions', 'y': 'Marché'}
+    )
+    fig_market.update_layout(height=400)
+
+    sector_counts = aggregates['sector_counts']
+    fig_sector = px.pie(
+        values=sector_counts.values,
+        names=sector_counts.index,
+        title="🏭 Distribution par Secteur (Top 10)"
+    )
+    fig_sector.update_layout(height=400)
+
+    return fig_market, fig_sector
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_chart_figures(key, _index, _rows):
+    """Figures de la vue Graphiques, calculées une fois par état des filtres"""
+    px = import_plotly()
+    aggregates = load_aggregates(key, _index, _rows)
+    figures = {}
+    figures['market'], figures['sector'] = create_summary_charts(aggregates)
+
+    # Graphiques PEA/PEA-PME
+    pea_distribution = aggregates['pea_distribution']
+    if pea_distribution is not None:
+        figures['pea'] = px.pie(
+            values=pea_distribution.values,
+            names=[
+                'Non PEA' if not x else 'PEA Eligible' for x in pea_distribution.index],
+            title="💼 Répartition PEA"
+        )
 
-@st.cache_data
-def load_stocks_data():
-    """Charge les données des actions"""
-    url = "https://gist.githubusercontent.com/traderLaval/9eaa7bc9f0aac2b276f59594e00f9207/raw/zb_style_invest_sum.csv"
-    try:
-        response = requests.get(url)
-        df = pd.read_csv(StringIO(response.text), sep=';')
+    pea_pme_distribution = aggregates['pea_pme_distribution']
+    if pea_pme_distribution is not None:
+        figures['pea_pme'] = px.pie(
+            values=pea_pme_distribution.values,
+            names=[
+                'Non PEA-PME' if not x else 'PEA-PME Eligible' for x in pea_pme_distribution.index],
+            title="🟡 Répartition PEA-PME"
+        )
 
-        # Nettoyer les données
-        df = df.dropna(subset=['Name', 'Symbol'])
+    # Graphique des styles d'investissement
+    style_counts = aggregates['style_counts']
+    if len(style_counts):
+        style_df = pd.DataFrame({'Style': style_counts.index, 'Nombre': style_counts.values})
+        figures['styles'] = px.bar(
+            style_df,
+            x='Style',
+            y='Nombre',
+            title="Nombre d'actions par style d'investissement",
+            color='Nombre',
+            color_continuous_scale='Blues'
+        )
 
-        # S'assurer que Name ne contient qu'une seule valeur
-        df['Name'] = df['Name'].astype(str).str.strip()
+    return figures
 
-        # Gestion améliorée des colonnes PEA
-        for col in ['PEA', 'PEA-PME']:
-            if col in df.columns:
-                df[col] = df[col].fillna('False')
-                df[col] = df[col].astype(str).str.strip().str.lower() == 'true'
 
-        # Remplacer les 'X' par True dans les colonnes de critères (styles d'investissement)
-        criteria_columns = ['MBagger', 'ROE', 'grow', 'growR',
-                            'mom', 'qual', 'qualR', 'small', 'trend', 'value']
-        for col in criteria_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna('')
-                df[col] = df[col].astype(str).str.strip() == 'X'
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_analysis(key, _index, _rows):
+    """Statistiques de la vue Analyse, calculées une fois par état des filtres"""
+    aggregates = load_aggregates(key, _index, _rows)
+    analysis = {
+        'market_stats': aggregates['market_stats'],
+        'sector_stats': aggregates['sector_counts'],
+        'corr': None
+    }
 
-        return df
-    except Exception as e:
-        st.error(f"Erreur lors du chargement des données : {e}")
-        return pd.DataFrame()
+    # Matrice de corrélation des styles d'investissement
+    if aggregates['corr'] is not None:
+        px = import_plotly()
+        analysis['corr'] = px.imshow(
+            aggregates['corr'],
+            text_auto=True,
+            aspect="auto",
+            title="Matrice de corrélation des styles"
+        )
 
+    return analysis
 
-def prepare_display_dataframe(df):
-    """Prépare le DataFrame pour l'affichage avec les liens"""
-    # Colonnes de base toujours affichées
-    base_columns = ['Market', 'Name', 'Symbol', 'PEA', 'PEA-PME']
 
-    # Ajouter TOUTES les colonnes de styles d'investissement
-    style_columns = ['MBagger', 'ROE', 'grow', 'growR',
-                     'mom', 'qual', 'qualR', 'small', 'trend', 'value']
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_backtest_results(path, mtime):
+    """Statistiques du backtest, relues quand le fichier est régénéré (mtime)"""
+    return load_backtest(path)
 
-    # Ajouter les colonnes de secteur et industrie
-    sector_columns = ['Sector', 'Industry']
 
-    # Construire la liste complète des colonnes à afficher
-    all_columns = base_columns + style_columns + sector_columns
+def show_backtest(selected_setups, selected_markets, selected_sector):
+    """Performances historiques des setups (fichier produit par mdb_backtest.py)"""
+    st.subheader("🧪 Performances Historiques des Setups")
+    if not os.path.exists(BACKTEST_FILE):
+        st.info("Aucun backtest disponible : lancez "
+                f"`python mdb_backtest.py panel.parquet -o {BACKTEST_FILE}`.")
+        return
+    summary = load_backtest_results(BACKTEST_FILE, os.path.getmtime(BACKTEST_FILE))
 
-    # Filtrer les colonnes qui existent dans le DataFrame
-    display_columns = [col for col in all_columns if col in df.columns]
+    col1, col2 = st.columns(2)
+    with col1:
+        horizon = st.selectbox("Horizon (séances) :", options=list(HORIZONS), index=1)
+    with col2:
+        group = st.selectbox("Regrouper par :", options=GROUPS)
 
-    # Créer le DataFrame d'affichage
-    display_df = df[display_columns].copy()
+    table = summary[(summary['Horizon'] == horizon) & (summary['Groupe'] == group)]
+    # Les filtres de la sidebar restreignent les lignes affichées
+    if selected_setups:
+        table = table[table['Setup'].isin(selected_setups)]
+    if group == 'Market' and selected_markets:
+        table = table[table['Valeur'].isin(selected_markets)]
+    if group == 'Sector' and selected_sector != "Tous":
+        table = table[table['Valeur'] == selected_sector]
+    if len(table) == 0:
+        st.info("Aucun signal historique pour cette sélection.")
+        return
 
-    # Créer la colonne graphique en première position
-    if 'ZB URL' in df.columns:
-        def create_chart_icon(url):
-            if pd.isna(url) or url == '':
-                return "➖"
-            return "📊"
+    st.dataframe(table.drop(columns=['Groupe', 'Horizon']),
+                 hide_index=True, use_container_width=True)
+    if group == 'Tous':
+        st.write(f"**🎯 Taux de réussite à {horizon} séances**")
+        st.bar_chart(table.set_index('Setup')['Taux de réussite (%)'])
 
-        # Insérer la colonne graphique en première position
-        display_df.insert(0, '📊', df['ZB URL'].apply(create_chart_icon))
 
-    # Formatage des colonnes booléennes (PEA et styles d'investissement)
-    bool_columns = display_df.select_dtypes(include=['bool']).columns
-    for col in bool_columns:
-        display_df[col] = display_df[col].map(
-            {True: '✅', False: '❌', pd.NA: '➖'})
+def show_setup_status(membership, selected_setups):
+    """Chargement des setups sélectionnés : actions trouvées, erreurs et temps par fichier"""
+    if not selected_setups:
+        return
 
-    return display_df
+    selected = [s for s in selected_setups if s in membership.results]
+    for setup_name in selected:
+        result = membership.results[setup_name]
+        output_file = result["output_file"]
+        if result["error"]:
+            st.sidebar.error(
+                f"Erreur lors du chargement de {output_file}: {result['error']}")
+        elif result["columns"] is not None:
+            # Debug : afficher les colonnes disponibles
+            st.sidebar.write(
+                f"Colonnes dans {output_file}: {result['columns']}")
+            if not ('Name' in result["columns"] or 'name' in result["columns"]):
+                st.sidebar.warning(
+                    f"Colonnes disponibles: {result['columns']}")
 
+        names = result["names"]
+        if names:
+            st.sidebar.success(
+                f"✅ {setup_name}: {len(names)} actions trouvées")
+        else:
+            st.sidebar.warning(
+                f"⚠️ {setup_name}: Aucune action trouvée")
+
+    # Temps de chargement, échecs et lignes sans correspondance par setup
+    with st.sidebar.expander("⏱️ Chargement des setups"):
+        for setup_name in selected:
+            result = membership.results[setup_name]
+            status = "✅" if result["status_code"] == 200 and not result["error"] else "❌"
+            detail = result["error"] or f"HTTP {result['status_code']}, cache {result['cache_status']}"
+            if result.get("quarantined"):
+                detail += f", {len(result['quarantined'])} lignes mal formées écartées"
+            st.write(
+                f"{status} {result['output_file']}: {result['elapsed'] * 1000:.0f} ms ({detail})")
+        for setup_name in selected:
+            st.metric(
+                label=f"🔗 {setup_name} : sans correspondance",
+                value=membership.unmatched[setup_name],
+                help="Lignes du fichier du setup absentes de l'univers"
+            )
 
-def create_summary_charts(df):
-    """Crée des graphiques de synthèse"""
-    col1, col2 = st.columns(2)
 
-    with col1:
-        market_counts = df['Market'].value_counts().head(10)
-        fig_market = px.bar(
-            x=market_counts.values,
-            y=market_counts.index,
-            orientation='h',
-            title="📈 Distribution par Marché (Top 10)",
-            labels={'x': 'Nombre d\'actions', 'y': 'Marché'}
+@instrumented("resolve_rows", cache=cached_result("rows"))
+def resolve_rows(key, _snapshot, _spec):
+    """Positions retenues par les filtres et plan d'évaluation de l'expression
+
+    Les setups sont appliqués en premier (union de leurs colonnes), puis les
+    filtres de l'index, l'expression et enfin la recherche, qui classe les
+    lignes par pertinence.
+    """
+    rows = _snapshot.membership.filter_rows(_spec.setups)
+    rows = _snapshot.index.resolve(_spec, rows)
+    trace = []
+    if _spec.expression:
+        # Termes évalués du plus sélectif au plus large, sur les lignes déjà retenues
+        planner = QueryPlanner(_snapshot.index, _snapshot.membership)
+        rows = planner.filter_rows(_spec.expression, rows, trace)
+    if _spec.search:
+        rows = _snapshot.search.search(_spec.search, rows)
+    return rows, trace
+
+
+@instrumented("load_page", cache=cached_result("page"))
+def load_page(key, sort_column, ascending, page, page_size, _index, _rows):
+    """Positions et DataFrame d'affichage (avec liens) d'une page de résultats"""
+    positions = page_rows(_index.df, _rows, sort_column, ascending, page, page_size)
+    return positions, prepare_display_dataframe(_index.materialize(positions), links=True)
+
+
+def restore_widget(key, value):
+    """Valeur initiale d'un widget de filtre reprise de l'URL, au premier affichage de la session"""
+    if value and key not in st.session_state:
+        st.session_state[key] = value
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_membership_changes(version, since, until, _history):
+    """Entrées et sorties de chaque setup et style entre deux dates, sur tout l'univers"""
+    changes = _history.changes(since, until)
+    return pd.DataFrame({
+        'Setup / Style': [member_label(key) for key in changes],
+        'Type': ['Setup' if key.startswith('setup:') else 'Style' for key in changes],
+        'Entrées': [len(entered) for entered, left in changes.values()],
+        'Sorties': [len(left) for entered, left in changes.values()]
+    })
+
+
+def compare_date_control(history, until):
+    """Choix de la date de comparaison parmi les enregistrements antérieurs (None : aucune)"""
+    earlier = [date for date in reversed(history.dates) if date < until]
+    if not earlier:
+        return None
+    since = st.selectbox(
+        "Comparer avec le :",
+        options=["Aucune comparaison"] + earlier,
+        index=1,
+        help="Colonnes des setups et styles gagnés (🆕) ou perdus (🚪) depuis cette date"
+    )
+    return None if since == "Aucune comparaison" else since
+
+
+def show_membership_changes(snapshot, since, until):
+    """Nombre d'entrées et de sorties par setup et style depuis la date choisie"""
+    changes = load_membership_changes(snapshot.version, since, until, snapshot.history)
+    changes = changes[(changes['Entrées'] > 0) | (changes['Sorties'] > 0)]
+    with st.expander(f"🔄 Changements depuis le {since} : {changes['Entrées'].sum()} entrées, "
+                     f"{changes['Sorties'].sum()} sorties"):
+        if len(changes):
+            st.dataframe(changes, hide_index=True, use_container_width=True)
+        else:
+            st.write("Aucun changement d'appartenance.")
+
+
+@instrumented("build_export", cache=cached_result("export"))
+def build_export(key, variant, fmt, _index, _rows):
+    """Octets d'un export, construits à la demande et mémorisés par filtre et format"""
+    df = _index.df
+    if variant == "simple":
+        simple_cols = ['Market', 'Name', 'Symbol',
+                       'PEA', 'PEA-PME', 'Sector', 'ZB URL']
+        simple_cols = [
+            col for col in simple_cols if col in df.columns]
+        # Seules les colonnes exportées des lignes retenues sont extraites
+        return export_bytes(df.iloc[_rows, df.columns.get_indexer(simple_cols)], fmt)
+    return export_bytes(_index.materialize(_rows), fmt)
+
+
+def export_controls(label, variant, file_prefix, key, index, rows):
+    """Choix du format puis téléchargement d'un export, généré seulement sur demande"""
+    formats = available_formats()
+    col_format, col_button = st.columns([2, 3])
+
+    with col_format:
+        fmt = st.selectbox(
+            f"Format ({label}) :",
+            options=formats,
+            format_func=lambda f: EXPORT_FORMATS[f]["label"],
+            key=f"{file_prefix}_format"
         )
-        fig_market.update_layout(height=400)
-        st.plotly_chart(fig_market, use_container_width=True)
 
-    with col2:
-        sector_counts = df['Sector'].value_counts().head(10)
-        fig_sector = px.pie(
-            values=sector_counts.values,
-            names=sector_counts.index,
-            title="🏭 Distribution par Secteur (Top 10)"
-        )
-        fig_sector.update_layout(height=400)
-        st.plotly_chart(fig_sector, use_container_width=True)
+    # L'export demandé reste disponible tant que les filtres et le format ne changent pas
+    request = (key, variant, fmt)
+    state_key = f"{file_prefix}_request"
+    with col_button:
+        if st.button(f"⚙️ Préparer : {label}", key=f"{file_prefix}_prepare"):
+            st.session_state[state_key] = request
+
+        if st.session_state.get(state_key) == request:
+            export_format = EXPORT_FORMATS[fmt]
+            with st.spinner("Préparation de l'export..."):
+                data = build_export(key, variant, fmt, index, rows)
+            st.download_button(
+                label=f"📥 {label} ({export_format['label']})",
+                data=data,
+                file_name=f"{file_prefix}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}."
+                          f"{export_format['extension']}",
+                mime=export_format["mime"],
+                key=f"{file_prefix}_download"
+            )
 
 
-def filter_by_setups(df, selected_setups, config):
-    """Filtre les actions selon les setups sélectionnés"""
-    if not selected_setups:
-        return df
-
-    # Charger les résultats réels des screeners
-    all_names = set()
-
-    for setup_name in selected_setups:
-        # Trouver le setup correspondant dans la config
-        for setup_id, setup_info in config["setups"].items():
-            if setup_info["name"] == setup_name and "output_file" in setup_info:
-                # Charger les noms du screener
-                names = load_screener_results(
-                    setup_name, setup_info["output_file"])
-                if names:
-                    all_names.update(names)
-                    st.sidebar.success(
-                        f"✅ {setup_name}: {len(names)} actions trouvées")
-                else:
-                    st.sidebar.warning(
-                        f"⚠️ {setup_name}: Aucune action trouvée")
-                break
-
-    # Filtrer le DataFrame pour ne garder que les noms trouvés
-    if all_names:
-        # Utiliser la colonne Name pour le filtrage (comme dans votre code original)
-        return df[df['Name'].isin(all_names)]
+def main():
+    # Chargement des données : seule la toute première session du processus attend,
+    # en voyant chaque étape du chargement s'afficher
+    refresher = get_refresher()
+    if refresher.snapshot is None:
+        with st.status("Chargement des données...", expanded=True) as status:
+            snapshot = load_snapshot(status.write)
+            status.update(label="Données chargées" if snapshot else "Échec du chargement",
+                          state="complete" if snapshot else "error", expanded=False)
     else:
-        return df
+        snapshot = load_snapshot()
 
+    if snapshot is None:
+        st.error(f"Erreur lors du chargement des données : {refresher.last_error}")
+        st.error("Impossible de charger les données. Veuillez réessayer plus tard.")
+        return
 
-def main():
-    # En-tête principal
-    st.markdown("""
-    <div class="main-header">
-        <h1>📊 Les moulins du Bazacle</h1>
-        <p>Analysez et filtrez les actions selon vos critères d'investissement</p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Chargement des données
-    with st.spinner("Chargement des données..."):
-        config = load_screener_config()
-        df = load_stocks_data()
+    show_snapshot_info(snapshot, refresher)
+    config, index, membership = snapshot.config, snapshot.index, snapshot.membership
+    df = index.df
 
     if df.empty:
         st.error("Impossible de charger les données. Veuillez réessayer plus tard.")
         return
 
+    # Options des filtres de la sidebar
+    setup_options = {}
+    for setup_id, setup_info in config["setups"].items():
+        setup_options[setup_info["name"]] = setup_info.get(
+            "description", setup_info["name"])
+    available_markets = sorted(df['Market'].dropna().unique())
+    criteria_columns = ['MBagger', 'ROE', 'grow', 'growR',
+                        'mom', 'qual', 'qualR', 'small', 'trend', 'value']
+    available_criteria = [
+        col for col in criteria_columns if col in df.columns]
+    available_sectors = sorted(df['Sector'].dropna().unique())
+
+    # Filtres d'une URL partagée, repris par les widgets au premier affichage de la session
+    shared = restrict_spec(
+        spec_from_params({name: st.query_params.get_all(name) for name in st.query_params}),
+        setup_options, available_markets, available_criteria, available_sectors)
+
     # Sidebar pour les filtres
     with st.sidebar:
-        st.header("🔍 Filtres")
+        # Recherche d'une action, combinée aux autres filtres
+        restore_widget("filter_search", shared.search)
+        search_query = st.text_input(
+            "🔎 Rechercher une action :",
+            placeholder="Nom, symbole, secteur ou industrie",
+            help="Sans accents ni majuscules requis, fautes de frappe tolérées",
+            key="filter_search"
+        ).strip()
 
         # Setups de screening
         st.subheader("📋 Setups de Screening")
-        setup_options = {}
-        for setup_id, setup_info in config["setups"].items():
-            setup_options[setup_info["name"]] = setup_info.get(
-                "description", setup_info["name"])
-
+        restore_widget("filter_setups", list(shared.setups))
         selected_setups = st.multiselect(
             "Sélectionnez les setups :",
             options=list(setup_options.keys()),
-            help="Choisissez un ou plusieurs setups de screening"
+            help="Choisissez un ou plusieurs setups de screening",
+            key="filter_setups"
         )
 
         if selected_setups:
@@ -281,11 +506,12 @@ def main():
 
         # Filtres par marché - PAS DE SÉLECTION PAR DÉFAUT
         st.subheader("🏛️ Marchés")
-        available_markets = sorted(df['Market'].dropna().unique())
+        restore_widget("filter_markets", list(shared.markets))
         selected_markets = st.multiselect(
             "Sélectionnez les marchés :",
-            options=available_markets
+            options=available_markets,
             # PAS de default pour afficher tout au démarrage
+            key="filter_markets"
         )
 
         # Filtre PEA
@@ -299,60 +525,81 @@ def main():
             pea_pme_true_count = df['PEA-PME'].sum()
             st.write(f"🟡 **PEA-PME Eligible**: {pea_pme_true_count} actions")
 
+        restore_widget("filter_pea", shared.pea_filter)
         pea_filter = st.selectbox(
             "Filtre PEA :",
-            options=["Tous", "PEA Eligible",
-                     "Non PEA Eligible", "PEA-PME Eligible"]
+            options=PEA_FILTER_OPTIONS,
+            key="filter_pea"
         )
 
         # Critères d'investissement
         st.subheader("🎯 Critères d'Investissement")
-        criteria_columns = ['MBagger', 'ROE', 'grow', 'growR',
-                            'mom', 'qual', 'qualR', 'small', 'trend', 'value']
-        available_criteria = [
-            col for col in criteria_columns if col in df.columns]
-
+        restore_widget("filter_criteria", list(shared.criteria))
         selected_criteria = st.multiselect(
             "Sélectionnez les critères :",
             options=available_criteria,
-            help="Actions qui respectent au moins un de ces critères"
+            help="Actions qui respectent au moins un de ces critères",
+            key="filter_criteria"
         )
 
         # Filtre par secteur
         st.subheader("🏭 Secteurs")
-        available_sectors = sorted(df['Sector'].dropna().unique())
+        if shared.sector != "Tous":
+            restore_widget("filter_sector", shared.sector)
         selected_sector = st.selectbox(
             "Sélectionnez un secteur :",
-            options=["Tous"] + available_sectors
+            options=["Tous"] + available_sectors,
+            key="filter_sector"
         )
 
-    # Application des filtres
-    filtered_df = df.copy()
-
-    # Filtre par setups EN PREMIER
-    if selected_setups:
-        filtered_df = filter_by_setups(filtered_df, selected_setups, config)
-
-    # Filtre par marché - SEULEMENT si des marchés sont sélectionnés
-    if selected_markets:  # Si la liste n'est pas vide
-        filtered_df = filtered_df[filtered_df['Market'].isin(selected_markets)]
-
-    # Filtre PEA
-    if pea_filter == "PEA Eligible" and 'PEA' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['PEA'] == True]
-    elif pea_filter == "Non PEA Eligible" and 'PEA' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['PEA'] == False]
-    elif pea_filter == "PEA-PME Eligible" and 'PEA-PME' in filtered_df.columns:
-        filtered_df = filtered_df[filtered_df['PEA-PME'] == True]
-
-    # Filtre par critères
-    if selected_criteria:
-        criteria_mask = filtered_df[selected_criteria].any(axis=1)
-        filtered_df = filtered_df[criteria_mask]
-
-    # Filtre par secteur
-    if selected_sector != "Tous":
-        filtered_df = filtered_df[filtered_df['Sector'] == selected_sector]
+        # Expression booléenne, combinée aux filtres ci-dessus
+        st.subheader("🧮 Expression")
+        restore_widget("filter_expression", shared.expression)
+        expression = st.text_input(
+            "Combinez setups et critères :",
+            placeholder="MM200_Cross_Up AND NOT small AND (qual OR value)",
+            help="Setups, styles, PEA, PEA-PME, market:\"Euronext Paris\", sector:Technology ; "
+                 "opérateurs AND, OR, NOT et parenthèses",
+            key="filter_expression"
+        ).strip()
+
+        st.caption("🔗 L'adresse de la page reprend ces filtres : partagez-la pour rouvrir cet écran.")
+
+    # Application des filtres : positions de lignes résolues par l'index,
+    # le DataFrame filtré n'est construit qu'une seule fois à la fin
+    show_setup_status(membership, selected_setups)
+
+    if expression:
+        try:
+            QueryPlanner(index, membership).parse(expression)
+        except QueryError as e:
+            st.sidebar.error(f"Expression ignorée : {e}")
+            expression = ""
+
+    spec = FilterSpec(
+        setups=tuple(selected_setups),
+        markets=tuple(selected_markets),
+        pea_filter=pea_filter,
+        criteria=tuple(selected_criteria),
+        sector=selected_sector,
+        expression=expression,
+        search=search_query
+    )
+    # L'URL reprend les filtres appliqués : elle peut être partagée pour rouvrir cet écran
+    params = spec_to_params(spec)
+    if params != {name: st.query_params.get_all(name) for name in st.query_params}:
+        st.query_params.from_dict(params)
+
+    # L'univers de l'instantané est partagé par toutes les sessions et jamais modifié :
+    # la session ne manipule que les positions des lignes retenues, elles-mêmes
+    # partagées avec les sessions qui appliquent les mêmes filtres
+    key = result_key(snapshot.version, spec)
+    rows, trace = resolve_rows(key, snapshot, spec)
+    if spec.expression:
+        with st.sidebar.expander("🧭 Plan d'évaluation"):
+            st.dataframe(pd.DataFrame(trace, columns=['Terme', 'Estimation', 'Lignes examinées']),
+                         hide_index=True, use_container_width=True)
+    n_filtered = len(rows)
 
     # Affichage des métriques
     col1, col2, col3, col4 = st.columns(4)
@@ -367,13 +614,12 @@ def main():
     with col2:
         st.metric(
             label="🎯 Actions Filtrées",
-            value=len(filtered_df),
-            delta=f"{len(filtered_df) - len(df):+d}"
+            value=n_filtered,
+            delta=f"{n_filtered - len(df):+d}"
         )
 
     with col3:
-        pea_count = len(
-            filtered_df[filtered_df['PEA'] == True]) if 'PEA' in filtered_df.columns else 0
+        pea_count = index.count_flag(rows, 'PEA')
         st.metric(
             label="💼 PEA Eligible",
             value=pea_count,
@@ -381,29 +627,78 @@ def main():
         )
 
     with col4:
-        unique_markets = filtered_df['Market'].nunique()
+        unique_markets = index.count_values(rows, 'Market')
         st.metric(
             label="🏛️ Marchés",
             value=unique_markets,
             help="Nombre de marchés différents"
         )
 
-    # Onglets pour différentes vues
-    tab1, tab2, tab3, tab4 = st.tabs(
-        ["📋 Résultats", "📊 Graphiques", "📈 Analyse", "📁 Export"])
+    # Vues : seule la vue ouverte est calculée à chaque rerun
+    view = st.radio(
+        "Vue :",
+        options=VIEWS,
+        horizontal=True,
+        label_visibility="collapsed"
+    )
 
-    with tab1:
+    if view == VIEWS[0]:
         st.subheader("🎯 Actions Filtrées")
 
-        if len(filtered_df) > 0:
+        if n_filtered > 0:
             # Instructions d'utilisation
             st.info("💡 **Instructions :** Cliquez sur l'icône 📊 pour voir les graphiques ou sur le nom de l'entreprise pour accéder à sa fiche complète sur ZoneBourse.")
 
-            # Préparer le DataFrame d'affichage
-            display_df = prepare_display_dataframe(filtered_df)
-
-            # Créer une copie pour manipuler les liens
-            display_df_links = display_df.copy()
+            # Comparaison avec une date antérieure de l'historique d'appartenance
+            until = history_date(snapshot.built_at)
+            since = compare_date_control(snapshot.history, until)
+            if since is not None:
+                show_membership_changes(snapshot, since, until)
+
+            # Tri et pagination côté serveur : seule la page affichée est préparée et envoyée
+            sortable_columns = [col for col in ['Name', 'Symbol', 'Market', 'Sector', 'Industry',
+                                                'PEA', 'PEA-PME', 'MBagger', 'ROE', 'grow', 'growR',
+                                                'mom', 'qual', 'qualR', 'small', 'trend', 'value']
+                                if col in df.columns]
+            col_sort, col_order, col_size, col_page = st.columns([3, 2, 2, 2])
+            with col_sort:
+                sort_column = st.selectbox(
+                    "Trier par :", options=["Aucun tri"] + sortable_columns)
+            with col_order:
+                ascending = st.radio(
+                    "Ordre :", options=["Croissant", "Décroissant"], horizontal=True) == "Croissant"
+            with col_size:
+                page_size = st.selectbox(
+                    "Lignes par page :", options=[50, 100, 250, 500], index=1)
+
+            n_pages = max(1, -(-n_filtered // page_size))
+            with col_page:
+                page = st.number_input(
+                    f"Page (sur {n_pages}) :", min_value=1, max_value=n_pages, value=1, step=1)
+
+            positions, display_df_links = load_page(
+                key,
+                None if sort_column == "Aucun tri" else sort_column,
+                ascending,
+                int(page),
+                page_size,
+                index,
+                rows
+            )
+            first_row = (int(page) - 1) * page_size
+            caption = f"Lignes {first_row + 1} à {first_row + len(positions)} sur {n_filtered}"
+            if spec.search and sort_column == "Aucun tri":
+                caption += f", classées par pertinence pour « {spec.search} »"
+            st.caption(caption)
+
+            if since is not None:
+                # Setups et styles gagnés ou perdus par chaque action de la page,
+                # ajoutés à une copie : la page en cache est partagée entre sessions
+                display_df_links = display_df_links.copy(deep=False)
+                entered, left = snapshot.history.row_changes(
+                    snapshot.stock_ids[positions], since, until)
+                display_df_links.insert(1, '🆕 Entrées', [", ".join(e) for e in entered])
+                display_df_links.insert(2, '🚪 Sorties', [", ".join(e) for e in left])
 
             # Configuration des colonnes avec liens
             column_config = {
@@ -413,6 +708,9 @@ def main():
                 'PEA-PME': st.column_config.TextColumn("🟡 PEA-PME", width="small"),
                 'Sector': st.column_config.TextColumn("🏭 Secteur", width="medium"),
                 'Industry': st.column_config.TextColumn("🏢 Industrie", width="medium"),
+                # Changements depuis la date de comparaison
+                '🆕 Entrées': st.column_config.TextColumn("🆕 Entrées", width="medium"),
+                '🚪 Sorties': st.column_config.TextColumn("🚪 Sorties", width="medium"),
                 # Styles d'investissement
                 'MBagger': st.column_config.TextColumn("🚀 MBagger", width="small"),
                 'ROE': st.column_config.TextColumn("💰 ROE", width="small"),
@@ -427,18 +725,7 @@ def main():
             }
 
             # Configuration pour la colonne graphique
-            if '📊' in display_df_links.columns and 'ZB URL' in filtered_df.columns:
-                # Créer les URLs pour les graphiques
-                chart_urls = []
-                for idx in display_df_links.index:
-                    zb_url = filtered_df.loc[idx, 'ZB URL']
-                    if pd.isna(zb_url) or zb_url == '':
-                        chart_urls.append(None)
-                    else:
-                        chart_urls.append(f"{zb_url.rstrip('/')}/graphiques/")
-
-                display_df_links['📊'] = chart_urls
-
+            if '📊' in display_df_links.columns:
                 column_config['📊'] = st.column_config.LinkColumn(
                     "📊",
                     help="Cliquer pour voir les graphiques",
@@ -447,13 +734,7 @@ def main():
                 )
 
             # Configuration pour la colonne Name avec lien
-            if 'Name' in display_df_links.columns and 'ZB URL' in filtered_df.columns:
-                # Préserver le nom original
-                display_df_links['Name_Original'] = display_df_links['Name'].copy()
-
-                # Remplacer par les URLs
-                display_df_links['Name'] = filtered_df.loc[display_df_links.index, 'ZB URL']
-
+            if 'Name_Original' in display_df_links.columns:
                 column_config['Name'] = st.column_config.LinkColumn(
                     "🏢 Nom",
                     help="Cliquer pour voir la fiche complète",
@@ -472,109 +753,67 @@ def main():
             )
 
             # Possibilité de télécharger les résultats
-            csv = filtered_df.to_csv(index=False, sep=';')
-            st.download_button(
-                label="📥 Télécharger les résultats (CSV)",
-                data=csv,
-                file_name=f"screener_results_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime="text/csv"
-            )
+            export_controls("Télécharger les résultats", "full", "screener_results",
+                            key, index, rows)
         else:
             st.warning("Aucune action ne correspond aux critères sélectionnés.")
 
-    with tab2:
+    elif view == VIEWS[1]:
         st.subheader("📊 Visualisations")
-        if len(filtered_df) > 0:
-            create_summary_charts(filtered_df)
+        if n_filtered > 0:
+            figures = build_chart_figures(key, index, rows)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.plotly_chart(figures['market'], use_container_width=True)
+            with col2:
+                st.plotly_chart(figures['sector'], use_container_width=True)
 
             # Graphiques PEA/PEA-PME
             col1, col2 = st.columns(2)
 
             with col1:
-                if 'PEA' in filtered_df.columns:
-                    pea_distribution = filtered_df['PEA'].value_counts()
-                    fig_pea = px.pie(
-                        values=pea_distribution.values,
-                        names=[
-                            'Non PEA' if not x else 'PEA Eligible' for x in pea_distribution.index],
-                        title="💼 Répartition PEA"
-                    )
-                    st.plotly_chart(fig_pea, use_container_width=True)
+                if 'pea' in figures:
+                    st.plotly_chart(figures['pea'], use_container_width=True)
 
             with col2:
-                if 'PEA-PME' in filtered_df.columns:
-                    pea_pme_distribution = filtered_df['PEA-PME'].value_counts()
-                    fig_pea_pme = px.pie(
-                        values=pea_pme_distribution.values,
-                        names=[
-                            'Non PEA-PME' if not x else 'PEA-PME Eligible' for x in pea_pme_distribution.index],
-                        title="🟡 Répartition PEA-PME"
-                    )
-                    st.plotly_chart(fig_pea_pme, use_container_width=True)
+                if 'pea_pme' in figures:
+                    st.plotly_chart(figures['pea_pme'], use_container_width=True)
 
             # Graphique des styles d'investissement
             st.subheader("🎯 Répartition des Styles d'Investissement")
-            style_columns = ['MBagger', 'ROE', 'grow', 'growR',
-                             'mom', 'qual', 'qualR', 'small', 'trend', 'value']
-            style_data = []
-            for style in style_columns:
-                if style in filtered_df.columns:
-                    count = filtered_df[style].sum()
-                    style_data.append({'Style': style, 'Nombre': count})
-
-            if style_data:
-                style_df = pd.DataFrame(style_data)
-                fig_styles = px.bar(
-                    style_df,
-                    x='Style',
-                    y='Nombre',
-                    title="Nombre d'actions par style d'investissement",
-                    color='Nombre',
-                    color_continuous_scale='Blues'
-                )
-                st.plotly_chart(fig_styles, use_container_width=True)
+            if 'styles' in figures:
+                st.plotly_chart(figures['styles'], use_container_width=True)
         else:
             st.info("Sélectionnez des filtres pour voir les graphiques.")
 
-    with tab3:
+    elif view == VIEWS[2]:
         st.subheader("📈 Analyse Avancée")
-        if len(filtered_df) > 0:
+        if n_filtered > 0:
+            analysis = build_analysis(key, index, rows)
+
             col1, col2 = st.columns(2)
 
             with col1:
                 st.write("**📊 Statistiques par Marché**")
-                market_stats = filtered_df.groupby(
-                    'Market').size().sort_values(ascending=False)
-                st.bar_chart(market_stats)
+                st.bar_chart(analysis['market_stats'])
 
             with col2:
                 st.write("**🏭 Top 10 Secteurs**")
-                sector_stats = filtered_df['Sector'].value_counts().head(10)
-                st.bar_chart(sector_stats)
+                st.bar_chart(analysis['sector_stats'])
 
-            # Matrice de corrélation des styles d'investissement
-            style_columns = ['MBagger', 'ROE', 'grow', 'growR',
-                             'mom', 'qual', 'qualR', 'small', 'trend', 'value']
-            available_styles = [
-                col for col in style_columns if col in filtered_df.columns]
-
-            if len(available_styles) > 1:
+            if analysis['corr'] is not None:
                 st.write("**🔗 Corrélation entre Styles d'Investissement**")
-                corr_matrix = filtered_df[available_styles].corr()
-                fig_corr = px.imshow(
-                    corr_matrix,
-                    text_auto=True,
-                    aspect="auto",
-                    title="Matrice de corrélation des styles"
-                )
-                st.plotly_chart(fig_corr, use_container_width=True)
+                st.plotly_chart(analysis['corr'], use_container_width=True)
         else:
             st.info("Aucune donnée à analyser.")
 
-    with tab4:
+        show_backtest(selected_setups, selected_markets, selected_sector)
+
+    elif view == VIEWS[3]:
         st.subheader("📁 Export et Rapports")
 
-        if len(filtered_df) > 0:
+        if n_filtered > 0:
             # Résumé des filtres appliqués
             st.write("**📋 Filtres Appliqués :**")
             if selected_setups:
@@ -587,32 +826,71 @@ def main():
                 st.write(f"• Critères: {', '.join(selected_criteria)}")
             if selected_sector != "Tous":
                 st.write(f"• Secteur: {selected_sector}")
+            if spec.expression:
+                st.write(f"• Expression: {spec.expression}")
+            if search_query:
+                st.write(f"• Recherche: {search_query}")
 
             # Options d'export
             st.write("**📊 Options d'Export :**")
 
-            # Export CSV complet
-            csv_full = filtered_df.to_csv(index=False, sep=';')
-            st.download_button(
-                label="📥 Export CSV Complet",
-                data=csv_full,
-                file_name=f"screener_full_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime="text/csv"
-            )
+            # Export complet
+            export_controls("Export Complet", "full", "screener_full",
+                            key, index, rows)
 
-            # Export CSV simplifié
-            simple_cols = ['Market', 'Name', 'Symbol',
-                           'PEA', 'PEA-PME', 'Sector', 'ZB URL']
-            simple_cols = [
-                col for col in simple_cols if col in filtered_df.columns]
-            csv_simple = filtered_df[simple_cols].to_csv(index=False, sep=';')
-            st.download_button(
-                label="📥 Export CSV Simplifié",
-                data=csv_simple,
-                file_name=f"screener_simple_{pd.Timestamp.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime="text/csv"
-            )
+            # Export simplifié
+            export_controls("Export Simplifié", "simple", "screener_simple",
+                            key, index, rows)
+
+
+def show_result_cache_stats():
+    """Taux de succès et occupation du cache de résultats, toutes sessions confondues"""
+    cache = get_result_cache()
+    stats = cache.stats()
+    if not stats:
+        return
+    st.dataframe(pd.DataFrame({
+        'Résultat': [s['kind'] for s in stats],
+        'Succès': [s['hits'] for s in stats],
+        'Échecs': [s['misses'] for s in stats],
+        'Taux de succès': [f"{s['hit_rate']:.0%}" for s in stats],
+        'Entrées': [s['entries'] for s in stats],
+        'Mémoire (Mo)': [s['mb'] for s in stats]
+    }), hide_index=True, use_container_width=True)
+    st.caption(f"Cache des résultats : {cache.nbytes / 1024 / 1024:.1f} Mo sur "
+               f"{cache.max_bytes / 1024 / 1024:.0f}, {cache.evictions} évictions")
+
+
+def show_diagnostics():
+    """Panneau de la sidebar : mesures des étapes du rerun courant (MDB_INSTRUMENT=1)"""
+    records = mdb_instrument.run_records()
+    with st.sidebar.expander("🩺 Diagnostics"):
+        show_result_cache_stats()
+        if not records:
+            st.write("Aucune étape mesurée pendant ce rerun.")
+            return
+        diagnostics = pd.DataFrame({
+            'Étape': [r['stage'] for r in records],
+            'Durée (ms)': [r['wall_ms'] for r in records],
+            'Pic mémoire (Ko)': [r['peak_alloc_kb'] for r in records],
+            'Téléchargé (Ko)': [r['bytes_downloaded'] / 1024 for r in records],
+            'Cache': [r['cache'] or '' for r in records],
+            'Cache HTTP': [', '.join(f"{k}: {v}" for k, v in r['http_cache'].items())
+                           for r in records]
+        })
+        st.dataframe(diagnostics, hide_index=True, use_container_width=True)
+        st.caption(
+            f"{len(records)} étapes, {sum(r['wall_ms'] for r in records):.0f} ms cumulés "
+            "(les étapes imbriquées sont comptées plusieurs fois)")
+        if any(r['concurrent'] for r in records):
+            st.caption("Certaines étapes ont chevauché celles d'autres sessions : leur pic "
+                       "mémoire inclut les allocations de ces sessions.")
 
 
 if __name__ == "__main__":
+    mdb_instrument.begin_run()
+    mdb_instrument.record("first_paint", FIRST_PAINT_MS)
+    mdb_instrument.record("imports", IMPORTS_MS)
     main()
+    if mdb_instrument.ENABLED:
+        show_diagnostics()
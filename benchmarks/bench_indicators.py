@@ -0,0 +1,46 @@
+"""Benchmark hors ligne du moteur d'indicateurs sur des panels OHLCV synthétiques
+
+Exemple :
+
+    python benchmarks/bench_indicators.py --tickers 1000 5000 --days 300
+
+Mesure le passage du format long aux matrices séances x tickers, puis le
+calcul de tous les setups de la configuration à la dernière séance.
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from mdb_indicators import SETUP_SIGNALS, OHLCVPanel, screen_panel  # noqa: E402
+from synthetic import generate_ohlcv  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[1000, 5000],
+                        help="nombres de tickers (défaut : 1000 5000)")
+    parser.add_argument("--days", type=int, default=300,
+                        help="séances par ticker (défaut : 300)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for n_tickers in args.tickers:
+        long = generate_ohlcv(n_tickers, args.days, args.seed)
+        start = time.perf_counter()
+        panel = OHLCVPanel.from_long(long)
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        results = screen_panel(panel, list(SETUP_SIGNALS))
+        screened = time.perf_counter() - start
+        signals = sum(len(r["names"]) for r in results.values())
+        print(f"{n_tickers:>7} tickers x {args.days} séances : panel {loaded * 1000:8.1f} ms, "
+              f"{len(results)} setups {screened * 1000:8.1f} ms ({signals} signaux)", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
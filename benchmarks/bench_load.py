@@ -0,0 +1,268 @@
+"""Test de charge hors ligne : sessions Streamlit concurrentes (AppTest) sur des gists simulés
+
+Exemple :
+
+    python benchmarks/bench_load.py --rows 100000 --concurrency 1 4 16 --steps 12
+
+Un serveur HTTP local remplace les gists (configuration, univers et fichiers
+des setups synthétiques, avec ETag et latence réglable). Pour chaque niveau
+de concurrence, N sessions démarrent ensemble et enchaînent des interactions
+tirées au hasard : setups, marchés, filtre PEA, critères, secteur, vues et
+pages. Le rapport donne les latences des reruns (p50/p95/p99), le débit, la
+mémoire résidente maximale du processus et le taux de succès du cache de
+résultats partagé entre les sessions (mdb_results).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+# Les modules de l'application (et synthetic, qui en dépend) lisent les URL des
+# gists à l'import : ils ne sont importés qu'une fois le serveur local démarré
+
+
+class GistHandler(BaseHTTPRequestHandler):
+    """Sert les fichiers du serveur (server.files) avec ETag, comme les gists"""
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = self.server.files.get(self.path.lstrip("/"))
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_gist_server(files, latency):
+    """Serveur local des fichiers (nom -> octets) ; renvoie le serveur et son URL de base"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GistHandler)
+    server.files = files
+    server.latency = latency
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gist-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def gist_files(n_rows, seed):
+    """Fichiers des gists simulés : configuration, univers et résultats des setups"""
+    from mdb_data import STOCKS_FILE
+    from synthetic import generate_universe, screener_config, setup_csvs, universe_csv
+    universe = generate_universe(n_rows, seed)
+    files = {name: text.encode("utf-8") for name, text in setup_csvs(universe, seed).items()}
+    files[STOCKS_FILE] = universe_csv(universe).encode("utf-8")
+    files["screener_setups.json"] = json.dumps(screener_config()).encode("utf-8")
+    return files
+
+
+def interactions(rng, steps):
+    """Suite réaliste d'interactions : (libellé du widget, valeur)"""
+    from mdb_data import CRITERIA_COLUMNS
+    from mdb_index import PEA_FILTER_OPTIONS
+    from synthetic import MARKETS, SECTORS, screener_config
+    setups = [setup["name"] for setup in screener_config()["setups"].values()]
+    views = ["📋 Résultats", "📊 Graphiques", "📈 Analyse", "📁 Export"]
+    choices = [
+        ("Sélectionnez les setups :", lambda: rng.sample(setups, rng.randint(0, 3))),
+        ("Sélectionnez les marchés :", lambda: rng.sample(MARKETS, rng.randint(0, 3))),
+        ("Filtre PEA :", lambda: rng.choice(PEA_FILTER_OPTIONS)),
+        ("Sélectionnez les critères :", lambda: rng.sample(CRITERIA_COLUMNS, rng.randint(0, 3))),
+        ("Sélectionnez un secteur :", lambda: rng.choice(["Tous"] + SECTORS)),
+        ("Vue :", lambda: rng.choice(views)),
+        ("Trier par :", lambda: rng.choice(["Aucun tri", "Name", "Market", "Sector"])),
+    ]
+    # Les filtres reviennent plus souvent que les changements de vue et de tri
+    weights = [3, 3, 2, 2, 2, 2, 1]
+    return [(label, make()) for label, make in
+            (rng.choices(choices, weights)[0] for _ in range(steps))]
+
+
+def prepare_concurrent_sessions():
+    """Rend AppTest utilisable depuis plusieurs threads à la fois
+
+    AppTest installe puis retire à chaque rerun un Runtime global et l'option
+    global.appTest : des reruns simultanés se les retireraient mutuellement.
+    Ici, toutes les sessions partagent un même Runtime simulé, comme sur un
+    serveur Streamlit réel, et l'option reste active.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    config.set_option("global.appTest", True)
+
+
+def find_widget(at, label):
+    widgets = (list(at.sidebar.multiselect) + list(at.sidebar.selectbox)
+               + list(at.radio) + list(at.selectbox))
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    return None
+
+
+def run_session(app_file, script, latencies, errors, barrier):
+    """Une session : premier affichage puis les interactions, latence de chaque rerun"""
+    from streamlit.testing.v1 import AppTest
+    barrier.wait()
+    try:
+        start = time.perf_counter()
+        at = AppTest.from_file(app_file, default_timeout=300).run()
+        latencies.append(time.perf_counter() - start)
+        for label, value in script:
+            widget = find_widget(at, label)
+            if widget is None:
+                # Widget absent de la vue courante (tri hors de la vue Résultats)
+                continue
+            start = time.perf_counter()
+            widget.set_value(value).run()
+            latencies.append(time.perf_counter() - start)
+            if at.exception:
+                errors.append(at.exception[0].value)
+                return
+    except Exception as e:
+        errors.append(str(e))
+
+
+def cache_counts():
+    """Succès et échecs cumulés du cache de résultats, tous types confondus"""
+    from mdb_results import get_result_cache
+    stats = get_result_cache().stats()
+    return sum(s["hits"] for s in stats), sum(s["misses"] for s in stats)
+
+
+def run_level(app_file, concurrency, steps, seed):
+    """Lance concurrency sessions simultanées ; latences, durée totale, erreurs et RSS max"""
+    from bench_sessions import rss_mb
+    latencies, errors = [], []
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [
+        threading.Thread(target=run_session, name=f"session-{i}", args=(
+            app_file, interactions(random.Random(seed * 1000 + i), steps),
+            latencies, errors, barrier))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    peak_rss = [rss_mb() or 0.0]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(0.1):
+            peak_rss[0] = max(peak_rss[0], rss_mb() or 0.0)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return latencies, elapsed, errors, peak_rss[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000,
+                        help="taille de l'univers simulé (défaut : 20000)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="nombres de sessions simultanées (défaut : 1 2 4 8)")
+    parser.add_argument("--steps", type=int, default=10,
+                        help="interactions par session (défaut : 10)")
+    parser.add_argument("--latency-ms", type=float, default=20.0,
+                        help="latence simulée des gists en ms (défaut : 20)")
+    parser.add_argument("--refresh-interval", type=float, default=0.0,
+                        help="MDB_REFRESH_INTERVAL pendant le test (défaut : 0, pas de thread)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="fichier JSON des résultats (optionnel)")
+    args = parser.parse_args(argv)
+
+    server, url = start_gist_server({}, args.latency_ms / 1000)
+    cache_dir = tempfile.mkdtemp(prefix="mdb_load_")
+    os.environ.update({
+        "MDB_GIST_RAW_URL": url,
+        "MDB_SCREENER_RESULTS_URL": url,
+        "MDB_CACHE_DIR": cache_dir,
+        "MDB_REFRESH_INTERVAL": str(args.refresh_interval)
+    })
+    server.files = gist_files(args.rows, args.seed)
+    prepare_concurrent_sessions()
+    app_file = os.path.join(REPO_DIR, "MdB_SCC_NG.py")
+    print(f"Gists simulés sur {url} ({args.rows} lignes, latence {args.latency_ms:.0f} ms)")
+
+    # Première session seule : chargement de l'instantané et imports hors mesure
+    run_level(app_file, 1, 0, args.seed)
+
+    results = []
+    print(f"{'sessions':>8} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'reruns/s':>9} {'RSS Mo':>8} {'cache %':>8}")
+    for concurrency in args.concurrency:
+        hits, misses = cache_counts()
+        latencies, elapsed, errors, peak_rss = run_level(
+            app_file, concurrency, args.steps, args.seed + concurrency)
+        p50, p95, p99 = (np.percentile(latencies or [np.nan], [50, 95, 99]) * 1000).tolist()
+        hits, misses = (a - b for a, b in zip(cache_counts(), (hits, misses)))
+        hit_rate = hits / max(1, hits + misses)
+        results.append({
+            "concurrency": concurrency,
+            "reruns": len(latencies),
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "throughput": len(latencies) / elapsed,
+            "peak_rss_mb": peak_rss,
+            "cache_hit_rate": hit_rate,
+            "errors": errors
+        })
+        print(f"{concurrency:>8} {len(latencies):>7} {p50:9.1f} {p95:9.1f} {p99:9.1f} "
+              f"{len(latencies) / elapsed:9.2f} {peak_rss:8.0f} {hit_rate:8.0%}", flush=True)
+        for error in errors:
+            print(f"  erreur : {error}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"rows": args.rows, "steps": args.steps, "results": results}, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
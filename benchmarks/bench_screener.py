@@ -0,0 +1,275 @@
+"""Benchmark hors ligne de chaque étape du screener sur des univers synthétiques
+
+Exemples :
+
+    python benchmarks/bench_screener.py                      # 10k et 100k lignes
+    python benchmarks/bench_screener.py --sizes 1000000 --repeat 1
+    python benchmarks/bench_screener.py --save-baseline      # met à jour la référence
+
+Les résultats (temps et pic d'allocation par étape) sont écrits en JSON et
+comparés à benchmarks/baseline.json ; le code de sortie vaut 1 en cas de
+régression.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from mdb_data import (clean_stocks_data, parse_screener_results,  # noqa: E402
+                      read_snapshot, setup_output_files, stocks_table,
+                      update_stocks_table, write_snapshot)
+from mdb_export import export_bytes  # noqa: E402
+from mdb_history import MembershipHistory, snapshot_members, stock_keys  # noqa: E402
+from mdb_index import FilterIndex, FilterSpec, SetupMembership, carry_keys  # noqa: E402
+from mdb_query import QueryPlanner  # noqa: E402
+from mdb_results import ResultCache, result_key  # noqa: E402
+from mdb_search import SearchIndex  # noqa: E402
+from mdb_views import (compute_aggregates, prepare_display_dataframe,  # noqa: E402
+                       sort_and_paginate)
+from synthetic import (daily_changes, generate_universe, screener_config,  # noqa: E402
+                       setup_csvs, universe_csv)
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Filtres représentatifs des interactions de la sidebar
+SPECS = [
+    FilterSpec(),
+    FilterSpec(markets=("Euronext Paris",), pea_filter="PEA Eligible"),
+    FilterSpec(markets=("Nasdaq", "NYSE"), criteria=("qual", "value"), sector="Technology"),
+    FilterSpec(pea_filter="Non PEA Eligible", criteria=("mom",)),
+    FilterSpec(pea_filter="PEA-PME Eligible", sector="Healthcare"),
+]
+# Expressions du champ avancé (mdb_query) : ET sélectif, OU large, marché et secteur
+EXPRESSIONS = [
+    "MM200_Cross_Up AND NOT small AND (qual OR value)",
+    "(new_high_50_days OR Weekly_SuperTrend_Cross) AND PEA",
+    "market:Nasdaq AND NOT sector:Technology AND (mom OR grow)",
+]
+SEARCH_QUERIES = ["societe 12", "technolgy", "health", "SYM4"]
+SELECTED_SETUPS = ("MM200_Cross_Up", "new_high_50_days", "Weekly_SuperTrend_Cross")
+
+
+def measure(results, n_rows, stage, func, repeat):
+    """Chronomètre func (meilleur temps sur repeat exécutions) puis mesure son pic d'allocation"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+
+    # Exécution séparée sous tracemalloc, qui ralentit le code mesuré
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results.append({
+        "rows": n_rows,
+        "stage": stage,
+        "seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "peak_mb": peak / 1024 / 1024
+    })
+    print(f"{n_rows:>9} {stage:<28} {min(timings) * 1000:10.2f} ms "
+          f"{peak / 1024 / 1024:10.1f} Mo", flush=True)
+    return value
+
+
+def bench_size(n_rows, repeat, seed, workdir):
+    """Mesure chaque étape du pipeline sur un univers de n_rows lignes"""
+    results = []
+    universe = generate_universe(n_rows, seed)
+    text = universe_csv(universe)
+    config = screener_config()
+    setup_texts = setup_csvs(universe, seed)
+    next_text = universe_csv(daily_changes(universe, seed))
+    # Résultats des setups du lendemain : d'autres actions tirées dans l'univers
+    next_setup_texts = setup_csvs(universe, seed + 1)
+    del universe
+
+    # Chargement : parse et nettoyage du CSV, puis instantané Arrow
+    df = measure(results, n_rows, "parse_clean", lambda: clean_stocks_data(text), repeat)
+    snapshot_path = os.path.join(workdir, f"universe_{n_rows}.arrow")
+    measure(results, n_rows, "snapshot_write", lambda: write_snapshot(df, snapshot_path), repeat)
+    measure(results, n_rows, "snapshot_read", lambda: read_snapshot(snapshot_path), repeat)
+
+    # Rafraîchissement incrémental : 1 % des lignes modifiées, quelques ajouts et retraits
+    table = measure(results, n_rows, "row_hashes", lambda: stocks_table(df, text), repeat)
+    next_table, delta = measure(results, n_rows, "delta_ingest",
+                                lambda: update_stocks_table(table, next_text), repeat)
+
+    # Setups : parse des fichiers, matrice d'appartenance et filter_by_setups
+    setup_files = setup_output_files(config)
+    parsed = measure(results, n_rows, "setup_parse", lambda: {
+        name: parse_screener_results(setup_texts[f]) for name, f in setup_files.items()
+    }, repeat)
+    membership = measure(results, n_rows, "setup_membership",
+                         lambda: SetupMembership(df, parsed), repeat)
+    measure(results, n_rows, "setup_membership_delta", lambda: SetupMembership(
+        next_table.df, parsed,
+        {col: carry_keys(keys, delta.source_rows, next_table.df[col])
+         for col, keys in membership.universe_keys.items()}), repeat)
+    setup_rows = measure(results, n_rows, "filter_by_setups",
+                         lambda: membership.filter_rows(SELECTED_SETUPS), repeat)
+
+    # Chaîne de filtres de main() : construction de l'index puis résolution des filtres
+    index = measure(results, n_rows, "index_build", lambda: FilterIndex(df), repeat)
+    measure(results, n_rows, "index_delta", lambda: FilterIndex(
+        next_table.df, index, delta.source_rows), repeat)
+    measure(results, n_rows, "filter_chain", lambda: [
+        index.materialize(index.resolve(spec, rows))
+        for spec in SPECS for rows in (None, setup_rows)
+    ], repeat)
+
+    # Expressions : analyse puis évaluation planifiée, seules ou après le filtre des setups
+    planner = QueryPlanner(index, membership)
+    measure(results, n_rows, "query_expression", lambda: [
+        planner.filter_rows(expression, rows) for expression in EXPRESSIONS
+        for rows in (None, setup_rows)
+    ], repeat)
+
+    # Cache de résultats : clé canonique de chaque filtre puis lecture d'un résultat déjà calculé
+    cache = ResultCache()
+    for spec in SPECS:
+        cache.get_or_compute("rows", (result_key("bench", spec),),
+                             lambda spec=spec: index.resolve(spec))
+    measure(results, n_rows, "result_cache_hit", lambda: [
+        cache.get_or_compute("rows", (result_key("bench", spec),), lambda: None)
+        for spec in SPECS
+    ], repeat)
+
+    # Recherche : index construit par instantané, puis requêtes saisies (préfixe, faute de frappe)
+    search = measure(results, n_rows, "search_build", lambda: SearchIndex(df), repeat)
+    measure(results, n_rows, "search_query", lambda: [
+        search.search(query, rows) for query in SEARCH_QUERIES
+        for rows in (None, setup_rows)
+    ], repeat)
+
+    # Historique : appartenance du jour enregistrée, puis entrées et sorties depuis la veille
+    history = MembershipHistory(os.path.join(workdir, f"history_{n_rows}"))
+    stock_ids = history.ids_for(stock_keys(df, membership))
+    previous_members = snapshot_members(index, membership, stock_ids)
+    next_membership = SetupMembership(next_table.df, {
+        name: parse_screener_results(next_setup_texts[f]) for name, f in setup_files.items()})
+    next_ids = history.ids_for(stock_keys(next_table.df, next_membership))
+    history.record("2000-01-01", previous_members)
+    measure(results, n_rows, "history_record", lambda: history.record(
+        "2000-01-02", snapshot_members(FilterIndex(next_table.df), next_membership, next_ids)),
+        repeat)
+    measure(results, n_rows, "history_changes",
+            lambda: history.changes("2000-01-01", "2000-01-02"), repeat)
+
+    # Affichage et agrégations sur un filtre large
+    filtered = index.materialize(index.resolve(SPECS[3]))
+    measure(results, n_rows, "prepare_display_dataframe",
+            lambda: prepare_display_dataframe(filtered, links=True), repeat)
+    measure(results, n_rows, "prepare_display_page", lambda: prepare_display_dataframe(
+        sort_and_paginate(filtered, 'Name', True, 1, 100), links=True), repeat)
+    measure(results, n_rows, "aggregations", lambda: compute_aggregates(filtered), repeat)
+
+    # Exports
+    for fmt in ["csv", "csv.gz", "parquet"]:
+        measure(results, n_rows, f"export_{fmt.replace('.', '_')}",
+                lambda: export_bytes(filtered, fmt), repeat)
+
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds, min_mb):
+    """Liste des régressions de temps ou de mémoire par rapport à la référence"""
+    reference = {(r["rows"], r["stage"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        ref = reference.get((r["rows"], r["stage"]))
+        if ref is None:
+            continue
+        if (r["seconds"] > ref["seconds"] * (1 + tolerance)
+                and r["seconds"] - ref["seconds"] > min_seconds):
+            regressions.append(
+                f"{r['rows']} lignes, {r['stage']} : {r['seconds'] * 1000:.2f} ms "
+                f"(référence {ref['seconds'] * 1000:.2f} ms)")
+        if (r["peak_mb"] > ref["peak_mb"] * (1 + tolerance)
+                and r["peak_mb"] - ref["peak_mb"] > min_mb):
+            regressions.append(
+                f"{r['rows']} lignes, {r['stage']} : {r['peak_mb']:.1f} Mo "
+                f"(référence {ref['peak_mb']:.1f} Mo)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000],
+                        help="tailles d'univers à mesurer (défaut : 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="exécutions chronométrées par étape (défaut : 3)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json",
+                        help="fichier JSON des résultats (défaut : bench_results.json)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="référence à comparer (défaut : benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="enregistre les résultats comme nouvelle référence")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="écart relatif toléré avant de signaler une régression")
+    parser.add_argument("--min-ms", type=float, default=2.0,
+                        help="écart absolu minimal en ms pour une régression de temps")
+    parser.add_argument("--min-mb", type=float, default=1.0,
+                        help="écart absolu minimal en Mo pour une régression mémoire")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.sizes:
+            results.extend(bench_size(n_rows, args.repeat, args.seed, workdir))
+
+    report = {
+        "meta": {
+            "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats écrits dans {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence mise à jour : {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Pas de référence, comparaison ignorée")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance,
+                          args.min_ms / 1000, args.min_mb)
+    if regressions:
+        print(f"{len(regressions)} régression(s) par rapport à {args.baseline} :")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print(f"Aucune régression par rapport à {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
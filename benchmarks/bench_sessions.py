@@ -0,0 +1,175 @@
+"""Mémoire par session : sessions Streamlit simulées (AppTest) sur un univers synthétique
+
+Exemple :
+
+    python benchmarks/bench_sessions.py --rows 100000 --sessions 20
+
+Toutes les sessions tournent dans ce processus et partagent le même
+instantané, construit hors ligne. Chacune reste ouverte (état de session,
+widgets) pendant que les suivantes sont créées ; la mémoire retenue après
+chaque nouvelle session mesure le coût d'un utilisateur supplémentaire, à
+comparer à la taille de l'univers.
+"""
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import pyarrow as pa  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import mdb_refresh  # noqa: E402
+from mdb_data import (StocksTable, clean_stocks_data, parse_screener_results,  # noqa: E402
+                      setup_output_files)
+from mdb_history import (MembershipHistory, history_date, snapshot_members,  # noqa: E402
+                         stock_keys)
+from mdb_index import FilterIndex, SetupMembership  # noqa: E402
+from mdb_refresh import Refresher, Snapshot  # noqa: E402
+from mdb_search import SearchIndex  # noqa: E402
+from synthetic import generate_universe, screener_config, setup_csvs, universe_csv  # noqa: E402
+
+APP_FILE = os.path.join(REPO_DIR, "MdB_SCC_NG.py")
+
+# Interactions d'une session, appliquées à tour de rôle : (libellé du widget, valeur)
+INTERACTIONS = [
+    ("Sélectionnez les marchés :", ["Euronext Paris"]),
+    ("Sélectionnez les setups :", ["MM200_Cross_Up", "new_high_50_days"]),
+    ("Filtre PEA :", "PEA Eligible"),
+    ("Sélectionnez les critères :", ["qual", "value"]),
+    ("Vue :", "📊 Graphiques"),
+    ("Vue :", "📈 Analyse"),
+]
+
+
+def synthetic_snapshot(n_rows, seed=0):
+    """Instantané complet construit sans réseau à partir des données synthétiques"""
+    universe = generate_universe(n_rows, seed)
+    text = universe_csv(universe)
+    config = screener_config()
+    setup_texts = setup_csvs(universe, seed)
+    del universe
+
+    df = clean_stocks_data(text)
+    setup_results = {}
+    for name, output_file in setup_output_files(config).items():
+        parsed = parse_screener_results(setup_texts[output_file])
+        setup_results[name] = {
+            "output_file": output_file,
+            "names": parsed["names"] or [],
+            "symbols": parsed["symbols"],
+            "columns": parsed["columns"],
+            "status_code": 200,
+            "elapsed": 0.0,
+            "error": None,
+            "cache_status": "local",
+            "version": None,
+            "quarantined": parsed["quarantined"]
+        }
+    index = FilterIndex(df)
+    membership = SetupMembership(df, setup_results)
+    # Historique en mémoire seulement, avec l'appartenance du jour
+    history = MembershipHistory(None)
+    stock_ids = history.ids_for(stock_keys(df, membership))
+    now = time.time()
+    history.record(history_date(now), snapshot_members(index, membership, stock_ids))
+    return Snapshot(f"synthetic-{n_rows}", f"synthetic-{n_rows}", config, index, membership,
+                    SearchIndex(df), history, stock_ids, StocksTable(df), None, now, now)
+
+
+def install_snapshot(snapshot):
+    """Remplace le rafraîchisseur du processus par un instantané fixe (sans thread)"""
+    mdb_refresh._refresher = Refresher(interval=0, builder=lambda previous, progress: snapshot)
+    mdb_refresh._refresher.refresh()
+
+
+def find_widget(at, label):
+    for widget in list(at.sidebar.multiselect) + list(at.sidebar.selectbox) + list(at.radio):
+        if widget.label == label:
+            return widget
+    raise KeyError(label)
+
+
+def open_session(step):
+    """Nouvelle session : premier affichage puis une interaction de la liste"""
+    at = AppTest.from_file(APP_FILE, default_timeout=120).run()
+    label, value = INTERACTIONS[step % len(INTERACTIONS)]
+    find_widget(at, label).set_value(value).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+def retained_mb():
+    """Mémoire allouée par Python et numpy (tracemalloc) et par Arrow (chaînes pyarrow)"""
+    return (tracemalloc.get_traced_memory()[0] + pa.total_allocated_bytes()) / 1024 / 1024
+
+
+def rss_mb():
+    """Mémoire résidente du processus (Linux), None ailleurs"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help="taille de l'univers (défaut : 100000)")
+    parser.add_argument("--sessions", type=int, default=20,
+                        help="sessions ouvertes successivement (défaut : 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ratio", type=float, default=0.1,
+                        help="coût maximal d'une session, en part de la taille de l'univers")
+    args = parser.parse_args(argv)
+
+    snapshot = synthetic_snapshot(args.rows, args.seed)
+    install_snapshot(snapshot)
+    universe_mb = snapshot.df.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f"Univers : {args.rows} lignes, {universe_mb:.1f} Mo")
+
+    # Sessions de chauffe : imports, caches de l'application et premiers graphiques
+    warmup = [open_session(step) for step in range(len(INTERACTIONS))]
+    del warmup
+    gc.collect()
+
+    tracemalloc.start()
+    sessions = []
+    retained = []
+    peaks = []
+    base = retained_mb()
+    for step in range(args.sessions):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        sessions.append(open_session(step))
+        # Pic transitoire des deux reruns de la session, au-delà de la mémoire déjà retenue
+        peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024 / 1024)
+        gc.collect()
+        retained.append(retained_mb() - base)
+        rss = rss_mb()
+        print(f"{step + 1:>4} sessions : {retained[-1]:8.2f} Mo retenus, "
+              f"pic {peaks[-1]:8.2f} Mo" + (f", RSS {rss:.0f} Mo" if rss is not None else ""),
+              flush=True)
+    tracemalloc.stop()
+
+    # Croissance moyenne par session, hors première (caches encore remplis par les filtres)
+    per_session = (retained[-1] - retained[0]) / max(1, args.sessions - 1)
+    print(f"Mémoire par session supplémentaire : {per_session:.2f} Mo "
+          f"({per_session / universe_mb:.1%} de l'univers), pic médian par session "
+          f"{statistics.median(peaks):.2f} Mo")
+    return 0 if per_session <= args.max_ratio * universe_mb else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
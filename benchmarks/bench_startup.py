@@ -0,0 +1,82 @@
+"""Temps de démarrage à froid : imports de l'application mesurés dans des processus neufs
+
+Exemple :
+
+    python benchmarks/bench_startup.py --repeat 5
+
+Chaque étape est importée dans un nouvel interpréteur, après les étapes qui la
+précèdent, pour reproduire l'ordre du script : streamlit avant le premier
+affichage, puis les modules de données, puis plotly au premier graphique.
+Le premier affichage et les imports d'une session réelle sont journalisés
+par l'application avec MDB_INSTRUMENT=1 (étapes first_paint et imports).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# Étapes dans l'ordre du script : (nom, imports déjà faits, imports mesurés)
+STAGES = [
+    ("streamlit", [], ["streamlit"]),
+    ("data_modules", ["streamlit"], ["pandas", "mdb_backtest", "mdb_export", "mdb_index",
+                                     "mdb_refresh", "mdb_views"]),
+    ("plotly", ["streamlit", "pandas", "mdb_views"], ["plotly.express"]),
+]
+
+_PROBE = """
+import importlib, json, sys, time
+for name in {before!r}:
+    importlib.import_module(name)
+start = time.perf_counter()
+for name in {measured!r}:
+    importlib.import_module(name)
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def time_imports(before, measured):
+    """Durée d'import de measured dans un interpréteur neuf où before est déjà importé"""
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(before=before, measured=measured)],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="processus lancés par étape (défaut : 5)")
+    parser.add_argument("--output", default=None,
+                        help="fichier JSON des résultats (optionnel)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for stage, before, measured in STAGES:
+        timings = [time_imports(before, measured) for _ in range(args.repeat)]
+        results.append({
+            "stage": stage,
+            "modules": measured,
+            "median_seconds": statistics.median(timings),
+            "min_seconds": min(timings)
+        })
+        print(f"{stage:<14} {statistics.median(timings) * 1000:9.1f} ms (médiane), "
+              f"{min(timings) * 1000:9.1f} ms (min)", flush=True)
+
+    # Avant le premier affichage, seul streamlit doit être importé
+    print(f"Premier affichage après {results[0]['median_seconds'] * 1000:.1f} ms d'imports, "
+          f"{sum(r['median_seconds'] for r in results[1:]) * 1000:.1f} ms différés")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
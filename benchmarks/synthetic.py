@@ -0,0 +1,151 @@
+"""Génération d'univers synthétiques au schéma de zb_style_invest_sum.csv et des setups"""
+import numpy as np
+import pandas as pd
+
+from mdb_data import CRITERIA_COLUMNS
+
+MARKETS = ["Euronext Paris", "Euronext Amsterdam", "Euronext Bruxelles", "Xetra",
+           "London Stock Exchange", "Borsa Italiana", "SIX Swiss Exchange",
+           "Nasdaq", "NYSE", "Toronto Stock Exchange", "Tokyo Stock Exchange"]
+MARKET_WEIGHTS = [0.10, 0.04, 0.02, 0.08, 0.09, 0.05, 0.03, 0.25, 0.20, 0.06, 0.08]
+
+SECTORS = ["Technology", "Healthcare", "Financials", "Industrials", "Consumer Cyclical",
+           "Consumer Defensive", "Energy", "Basic Materials", "Utilities",
+           "Real Estate", "Communication Services"]
+
+# Probabilité qu'une action porte chaque style d'investissement
+STYLE_RATES = [0.03, 0.15, 0.20, 0.10, 0.18, 0.12, 0.08, 0.30, 0.25, 0.14]
+
+# Setups de la configuration par défaut et part de l'univers retenue par chacun
+SETUPS = {
+    "setup01": ("MM200_Cross_Up", "mm200_cross_up.csv", 0.02),
+    "setup02": ("MM200_Cross_Up_MACD_Up", "mm200_cross_up_macd_up.csv", 0.01),
+    "setup03": ("MM200_Cross_Up_WMA12_Up", "mm200_cross_up_wma12_up.csv", 0.01),
+    "setup04": ("Weekly_SuperTrend_Cross", "weekly_supertrend_cross.csv", 0.03),
+    "setup05": ("Above_Weekly_Below_Daily_SuperTrend",
+                "above_weekly_below_daily_supertrend.csv", 0.05),
+    "setup09": ("new_high_50_days", "new_high_50_days.csv", 0.04),
+    "setup10": ("new_high_100_days", "new_high_100_days.csv", 0.025),
+    "setup11": ("new_high_200_days", "new_high_200_days.csv", 0.015),
+}
+
+
+def generate_universe(n_rows, seed=0):
+    """DataFrame brut (texte, comme dans le CSV source) d'un univers de n_rows actions"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n_rows)
+
+    sector_idx = rng.integers(0, len(SECTORS), n_rows)
+    sectors = np.array(SECTORS, dtype=object)[sector_idx]
+    industries = sectors + " " + (rng.integers(0, 8, n_rows) + 1).astype(str)
+
+    names = np.char.add("Societe ", ids.astype(str)).astype(object)
+    # Quelques noms avec des espaces parasites, comme dans la source
+    padded = rng.random(n_rows) < 0.01
+    names[padded] = names[padded] + "  "
+    symbols = np.char.add("SYM", ids.astype(str)).astype(object)
+
+    columns = {
+        "Market": rng.choice(MARKETS, n_rows, p=MARKET_WEIGHTS),
+        "Name": names,
+        "Symbol": symbols,
+        "PEA": rng.choice(["True", "False", ""], n_rows, p=[0.25, 0.70, 0.05]),
+        "PEA-PME": rng.choice(["True", "False"], n_rows, p=[0.08, 0.92]),
+    }
+    for col, rate in zip(CRITERIA_COLUMNS, STYLE_RATES):
+        columns[col] = np.where(rng.random(n_rows) < rate, "X", "")
+    columns["Sector"] = sectors
+    columns["Industry"] = industries
+
+    slugs = np.char.add(np.char.add("SOCIETE-", ids.astype(str)), "-")
+    urls = np.char.add(np.char.add("https://www.zonebourse.com/cours/action/", slugs),
+                       (ids + 1000).astype(str))
+    urls = np.char.add(urls, "/").astype(object)
+    urls[rng.random(n_rows) < 0.02] = ""
+    columns["ZB URL"] = urls
+
+    return pd.DataFrame(columns)
+
+
+def universe_csv(universe):
+    """Texte CSV (séparateur ';') d'un univers brut"""
+    return universe.to_csv(index=False, sep=';')
+
+
+def screener_config():
+    """Configuration des setups, au format de screener_setups.json"""
+    return {
+        "setups": {
+            setup_id: {"name": name, "output_file": output_file,
+                       "description": f"Setup synthétique {name}"}
+            for setup_id, (name, output_file, rate) in SETUPS.items()
+        }
+    }
+
+
+def setup_csvs(universe, seed=0, unmatched_rate=0.02):
+    """Fichiers de résultats des setups (nom de fichier -> texte CSV)
+
+    Une petite part des lignes désigne des actions absentes de l'univers.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_rows = len(universe)
+    files = {}
+    for name, output_file, rate in SETUPS.values():
+        picked = rng.choice(n_rows, max(1, int(n_rows * rate)), replace=False)
+        setup_df = universe.iloc[np.sort(picked)][['Name', 'Symbol']].copy()
+        setup_df['Name'] = setup_df['Name'].str.strip()
+
+        n_unknown = int(len(setup_df) * unmatched_rate)
+        if n_unknown:
+            unknown = pd.DataFrame({
+                'Name': [f"Inconnue {i}" for i in range(n_unknown)],
+                'Symbol': [f"UNK{i}" for i in range(n_unknown)]
+            })
+            setup_df = pd.concat([setup_df, unknown], ignore_index=True)
+
+        files[output_file] = f"# {name}\n" + setup_df.to_csv(index=False, sep=';')
+    return files
+
+
+def daily_changes(universe, seed=0, rate=0.01, n_new=10, n_removed=10):
+    """Univers du lendemain : styles modifiés sur une part des lignes, actions ajoutées et retirées"""
+    rng = np.random.default_rng(seed + 2)
+    changed = universe.copy()
+    n_rows = len(changed)
+
+    rows = rng.choice(n_rows, max(1, int(n_rows * rate)), replace=False)
+    cols = rng.choice(CRITERIA_COLUMNS, len(rows))
+    for col in set(cols):
+        picked = rows[cols == col]
+        changed.loc[picked, col] = np.where(changed.loc[picked, col] == "X", "", "X")
+
+    changed = changed.drop(index=rng.choice(n_rows, n_removed, replace=False))
+    new_rows = generate_universe(n_new, seed + 3)
+    new_rows["Symbol"] = "NEW" + new_rows["Symbol"]
+    return pd.concat([changed, new_rows], ignore_index=True)
+
+
+def generate_ohlcv(n_tickers, n_days, seed=0):
+    """Panel OHLCV synthétique au format long (Date, Symbol, Open, High, Low, Close)
+
+    Marches aléatoires log-normales avec des régimes de tendance, pour que les
+    setups (croisements, nouveaux plus hauts, SuperTrend) se déclenchent.
+    """
+    rng = np.random.default_rng(seed + 4)
+    dates = pd.bdate_range(end="2024-12-31", periods=n_days)
+    drift = rng.normal(0, 0.0015, (n_days // 60 + 1, n_tickers)).repeat(60, axis=0)[:n_days]
+    returns = drift + rng.normal(0, 0.018, (n_days, n_tickers))
+    close = 20 * np.exp(rng.normal(0, 1, n_tickers) + np.cumsum(returns, axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.006, close.shape))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, 0.008, close.shape)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, 0.008, close.shape)))
+
+    return pd.DataFrame({
+        "Date": np.tile(dates.to_numpy(), n_tickers),
+        "Symbol": np.repeat(np.char.add("SYM", np.arange(n_tickers).astype(str)), n_days),
+        "Open": open_.T.ravel(),
+        "High": high.T.ravel(),
+        "Low": low.T.ravel(),
+        "Close": close.T.ravel(),
+    })
@@ -0,0 +1,215 @@
+"""Backtest historique des setups du screener sur un panel OHLCV local
+
+Les signaux de chaque setup sont calculés sur toutes les séances du panel
+(mdb_indicators), puis suivis des rendements à 5, 20 et 60 séances. Les
+tickers sont répartis en lots traités dans un pool de processus ; chaque
+processus ne lit que les tickers de son lot.
+
+Utilisation en ligne de commande (résultats lus par la vue Analyse) :
+
+    python mdb_backtest.py panel.parquet --workers 8 -o backtest.parquet
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from mdb_indicators import compute_signals, load_panel, panel_symbols
+
+# Horizons des rendements suivant un signal, en séances
+HORIZONS = (5, 20, 60)
+SHARD_SIZE = 250
+
+# Résultats lus par l'application
+BACKTEST_FILE = os.environ.get("MDB_BACKTEST_FILE", "backtest.parquet")
+
+# Regroupements des statistiques : ensemble des signaux, puis par colonne de l'univers
+GROUPS = ['Tous', 'Market', 'Sector']
+
+
+def forward_returns(close, horizon):
+    """Rendement entre la clôture de chaque séance et celle horizon séances plus tard"""
+    future = np.full_like(close, np.nan)
+    future[:-horizon] = close[horizon:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return future / close - 1
+
+
+def _empty_events(symbols, horizons):
+    # Mêmes colonnes et types qu'un lot avec des signaux, Symbol compris (catégoriel)
+    frame = pd.DataFrame({
+        'Setup': pd.Series(dtype=object),
+        'Symbol': pd.Categorical.from_codes([], np.asarray(symbols).astype(str)),
+        'Date': pd.Series(dtype='datetime64[ns]')
+    })
+    for h in horizons:
+        frame[f'r{h}'] = pd.Series(dtype=np.float32)
+    return frame
+
+
+def signal_events(panel, setup_names=None, horizons=HORIZONS):
+    """Un enregistrement par signal : Setup, Symbol (catégoriel), Date et rendements r<horizon>"""
+    returns = {h: forward_returns(panel.close, h) for h in horizons}
+    frames = []
+    for name, signals in compute_signals(panel, setup_names).items():
+        rows, columns = np.nonzero(signals)
+        frame = pd.DataFrame({
+            'Setup': name,
+            'Symbol': pd.Categorical.from_codes(columns, panel.symbols.astype(str)),
+            'Date': panel.dates[rows]
+        })
+        for h in horizons:
+            frame[f'r{h}'] = returns[h][rows, columns].astype(np.float32)
+        frames.append(frame)
+    if not frames:
+        return _empty_events(panel.symbols, horizons)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _backtest_shard(path, symbols, setup_names, horizons):
+    # Exécuté dans un processus du pool : le lot est lu directement depuis le fichier
+    return signal_events(load_panel(path, symbols), setup_names, horizons)
+
+
+def run_backtest(path, setup_names=None, horizons=HORIZONS, workers=None,
+                 shard_size=SHARD_SIZE, progress=None):
+    """Signaux de tout le panel, calculés par lots de tickers dans un pool de processus
+
+    workers=1 calcule les lots dans le processus courant. progress reçoit
+    (lots terminés, nombre de lots).
+    """
+    symbols = panel_symbols(path)
+    shards = [symbols[i:i + shard_size] for i in range(0, len(symbols), shard_size)]
+    progress = progress or (lambda done, total: None)
+    events = []
+    if workers == 1:
+        for shard in shards:
+            events.append(_backtest_shard(path, shard, setup_names, horizons))
+            progress(len(events), len(shards))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for frame in pool.map(_backtest_shard, [path] * len(shards), shards,
+                                  [setup_names] * len(shards), [horizons] * len(shards)):
+                events.append(frame)
+                progress(len(events), len(shards))
+    events = [frame for frame in events if len(frame)]
+    if not events:
+        # Aucun setup calculable ou panel sans ticker
+        return _empty_events([], horizons).astype({'Setup': 'category'})
+    # Les tickers restent catégoriels d'un lot à l'autre (un lot par ensemble de catégories)
+    symbols = union_categoricals([frame['Symbol'] for frame in events])
+    events = pd.concat(events, ignore_index=True)
+    events['Symbol'] = symbols
+    events['Setup'] = events['Setup'].astype('category')
+    return events
+
+
+def summarize(events, universe=None, horizons=HORIZONS):
+    """Statistiques par setup, horizon et groupe (tous les signaux, Market, Sector)
+
+    Taux de réussite : part des signaux suivis d'un rendement positif. Les
+    signaux trop récents pour un horizon n'entrent pas dans ses statistiques.
+    """
+    events = events.assign(Tous=pd.Categorical(['Tous'] * len(events)))
+    symbols = events['Symbol'].astype('category').cat
+    stocks = None if universe is None else universe.drop_duplicates('Symbol')
+    for col in GROUPS[1:]:
+        if stocks is not None and col in stocks.columns:
+            # Correspondance calculée une fois par ticker, puis étendue aux signaux
+            mapping = pd.Series(stocks[col].astype(object).to_numpy(),
+                                index=stocks['Symbol'].astype(str))
+            values = mapping.reindex(symbols.categories.astype(str)).fillna('Inconnu')
+            events[col] = pd.Categorical(values.to_numpy()[symbols.codes])
+        else:
+            events[col] = pd.Categorical(['Inconnu'] * len(events))
+
+    columns = [f'r{h}' for h in horizons]
+    if len(events) == 0:
+        return pd.DataFrame(columns=['Setup', 'Groupe', 'Valeur', 'Horizon', 'Signaux',
+                                     'Taux de réussite (%)', 'Rendement moyen (%)',
+                                     'Médiane (%)', 'Q1 (%)', 'Q3 (%)'])
+    returns = events[columns]
+    hits = returns.gt(0).astype(float).where(returns.notna())
+    tables = []
+    for col in GROUPS:
+        # Une passe par regroupement pour tous les horizons
+        keys = [events['Setup'], events[col]]
+        grouped = returns.groupby(keys, observed=True)
+        count, mean = grouped.count(), grouped.mean()
+        quantiles = grouped.quantile([0.25, 0.5, 0.75])
+        hit_rate = hits.groupby(keys, observed=True).mean()
+        for h, column in zip(horizons, columns):
+            by_quantile = quantiles[column].unstack()
+            table = pd.DataFrame({
+                'Signaux': count[column],
+                'Taux de réussite (%)': hit_rate[column] * 100,
+                'Rendement moyen (%)': mean[column] * 100,
+                'Médiane (%)': by_quantile[0.5] * 100,
+                'Q1 (%)': by_quantile[0.25] * 100,
+                'Q3 (%)': by_quantile[0.75] * 100
+            })
+            table.index.names = ['Setup', 'Valeur']
+            tables.append(table.reset_index().assign(Groupe=col, Horizon=h))
+
+    summary = pd.concat(tables, ignore_index=True)
+    summary = summary[summary['Signaux'] > 0]
+    first = ['Setup', 'Groupe', 'Valeur', 'Horizon']
+    summary = summary[first + [c for c in summary.columns if c not in first]]
+    return summary.astype({'Setup': str}).round(2).reset_index(drop=True)
+
+
+def load_backtest(path=BACKTEST_FILE):
+    """Statistiques enregistrées par la ligne de commande (None si absentes)"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Backtest des setups du screener sur un panel OHLCV local")
+    parser.add_argument("panel", help="panel OHLCV au format long (.parquet ou .csv)")
+    parser.add_argument("-o", "--output", default=BACKTEST_FILE,
+                        help=f"fichier Parquet des statistiques (défaut : {BACKTEST_FILE})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processus du pool (défaut : nombre de cœurs)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help=f"tickers par lot (défaut : {SHARD_SIZE})")
+    parser.add_argument("--events", default=None,
+                        help="fichier Parquet des signaux individuels (optionnel)")
+    args = parser.parse_args(argv)
+
+    from mdb_data import fetch_screener_config, fetch_stocks_data, setup_output_files
+    setup_names = list(setup_output_files(fetch_screener_config()))
+    try:
+        universe = fetch_stocks_data()
+    except Exception as e:
+        print(f"Univers indisponible, pas de statistiques par marché et secteur : {e}",
+              file=sys.stderr)
+        universe = None
+
+    start = time.perf_counter()
+    events = run_backtest(
+        args.panel, setup_names, workers=args.workers, shard_size=args.shard_size,
+        progress=lambda done, total: print(f"\rLots : {done}/{total}", end="",
+                                           file=sys.stderr, flush=True))
+    print(f"\n{len(events)} signaux en {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    if args.events:
+        events.to_parquet(args.events, index=False)
+    summary = summarize(events, universe)
+    summary.to_parquet(args.output, index=False)
+    overall = summary[(summary['Groupe'] == 'Tous') & (summary['Horizon'] == HORIZONS[1])]
+    print(overall[['Setup', 'Signaux', 'Taux de réussite (%)', 'Rendement moyen (%)']]
+          .to_string(index=False))
+    print(f"Statistiques écrites dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+"""Chargement et nettoyage des données du screener, instantané colonnaire sur disque"""
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from mdb_http import fetch, fetch_many, get_cache
+from mdb_instrument import record_fetch
+
+# Sources des données, surchargeables pour pointer vers un serveur local
+GIST_RAW_URL = os.environ.get(
+    "MDB_GIST_RAW_URL",
+    "https://gist.githubusercontent.com/traderLaval/9eaa7bc9f0aac2b276f59594e00f9207/raw/")
+SCREENER_RESULTS_URL = os.environ.get(
+    "MDB_SCREENER_RESULTS_URL",
+    "https://gist.github.com/traderLaval/e4e5eee8d610dcdcaf716a52624334bb/raw/")
+
+# Fichier de l'univers d'actions dans le gist
+STOCKS_FILE = "zb_style_invest_sum.csv"
+
+# Colonnes de styles d'investissement (critères marqués 'X' dans le CSV)
+CRITERIA_COLUMNS = ['MBagger', 'ROE', 'grow', 'growR',
+                    'mom', 'qual', 'qualR', 'small', 'trend', 'value']
+
+# Colonnes d'éligibilité PEA ('true'/'false' dans le CSV)
+PEA_COLUMNS = ['PEA', 'PEA-PME']
+
+# Colonnes à faible cardinalité stockées en catégories
+CATEGORY_COLUMNS = ['Market', 'Sector', 'Industry']
+
+# Type des autres colonnes texte : chaînes Arrow, lisibles sans copie depuis l'instantané
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+# Valeurs lues comme manquantes, les mêmes que pd.read_csv
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+             '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# Schéma déclaré de l'univers : catégories et drapeaux lus en dictionnaires (chaque valeur
+# distincte n'est convertie qu'une fois), texte en chaînes Arrow
+_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+STOCKS_SCHEMA = {
+    **{col: _DICTIONARY for col in CATEGORY_COLUMNS + PEA_COLUMNS + CRITERIA_COLUMNS},
+    **{col: pa.string() for col in ['Name', 'Symbol', 'ZB URL']}
+}
+
+
+# Configuration utilisée quand le gist, le cache disque et le miroir sont indisponibles
+DEFAULT_SCREENER_CONFIG = {
+    "setups": {
+        "setup01": {"name": "MM200_Cross_Up", "output_file": "mm200_cross_up.csv", "description": "Close a franchi la MM200 jours à la hausse"},
+        "setup02": {"name": "MM200_Cross_Up_MACD_Up", "output_file": "mm200_cross_up_macd_up.csv", "description": "MM200 + MACD haussier"},
+        "setup03": {"name": "MM200_Cross_Up_WMA12_Up", "output_file": "mm200_cross_up_wma12_up.csv", "description": "MM200 + WMA12 ascendante"},
+        "setup04": {"name": "Weekly_SuperTrend_Cross", "output_file": "weekly_supertrend_cross.csv", "description": "SuperTrend hebdomadaire franchi"},
+        "setup05": {"name": "Above_Weekly_Below_Daily_SuperTrend", "output_file": "above_weekly_below_daily_supertrend.csv", "description": "Entre SuperTrend hebdo et daily"},
+        "setup09": {"name": "new_high_50_days", "output_file": "new_high_50_days.csv", "description": "Nouveau plus haut 50 jours"},
+        "setup10": {"name": "new_high_100_days", "output_file": "new_high_100_days.csv", "description": "Nouveau plus haut 100 jours"},
+        "setup11": {"name": "new_high_200_days", "output_file": "new_high_200_days.csv", "description": "Nouveau plus haut 200 jours"}
+    }
+}
+
+
+@dataclass
+class QuarantinedLine:
+    """Ligne d'un CSV écartée au parse : plus de champs que l'en-tête"""
+    # Numéro de la ligne dans le fichier (l'en-tête est la ligne 1)
+    line: int
+    text: str
+    reason: str
+
+
+def read_csv_table(text, column_types=None, include_columns=None, comment=None):
+    """Parse un CSV ';' avec pyarrow : (table, position de chaque ligne, quarantaine)
+
+    Comme avec pd.read_csv, une ligne vide donne une ligne de valeurs
+    manquantes et une ligne trop courte est complétée de champs vides ; une
+    ligne trop longue est écartée dans la quarantaine au lieu d'interrompre
+    le parse. La position d'une ligne est son numéro de ligne de données (0
+    pour celle qui suit l'en-tête). Avec comment, les lignes commençant par
+    ce caractère sont lues comme vides.
+    """
+    offset = 0
+    if comment:
+        text = re.sub(rf"(?m)^[ \t]*{re.escape(comment)}.*$", "", text)
+        # Les lignes vides avant l'en-tête ne sont pas des lignes de données
+        stripped = text.lstrip("\n")
+        offset, text = len(text) - len(stripped), stripped
+
+    def parse(body, use_threads, types):
+        invalid = []
+
+        def keep_invalid(row):
+            invalid.append(row)
+            return 'skip'
+
+        table = pacsv.read_csv(
+            pa.py_buffer(body.encode('utf-8')),
+            read_options=pacsv.ReadOptions(use_threads=use_threads),
+            parse_options=pacsv.ParseOptions(
+                delimiter=';', ignore_empty_lines=False, invalid_row_handler=keep_invalid),
+            convert_options=pacsv.ConvertOptions(
+                column_types=types, include_columns=include_columns or [],
+                include_missing_columns=True, null_values=NA_VALUES, strings_can_be_null=True))
+        return table, invalid
+
+    table, invalid = parse(text, True, column_types or {})
+    if any(row.number is None for row in invalid):
+        # Les numéros des lignes invalides ne sont connus qu'en lecture séquentielle
+        table, invalid = parse(text, False, column_types or {})
+    positions = np.arange(len(table) + len(invalid))
+    if not invalid:
+        return table, positions, []
+
+    # Hors champs multilignes entre guillemets, numéro de ligne = position + 2
+    positions = np.delete(positions, [row.number - 2 for row in invalid])
+    quarantine = [QuarantinedLine(row.number + offset, row.text,
+                                  f"{row.actual_columns} champs au lieu de {row.expected_columns}")
+                  for row in invalid if row.actual_columns > row.expected_columns]
+    short = [row for row in invalid if row.actual_columns < row.expected_columns]
+    if short:
+        header = text.split('\n', 1)[0].rstrip('\r')
+        padded, _ = parse("\n".join([header] + [
+            row.text + ';' * (row.expected_columns - row.actual_columns) for row in short]),
+            False, {field.name: field.type for field in table.schema})
+        positions = np.concatenate([positions, [row.number - 2 for row in short]])
+        order = np.argsort(positions, kind='stable')
+        table = pa.concat_tables([table, padded]).unify_dictionaries().take(order)
+        positions = positions[order]
+    return table, positions, quarantine
+
+
+def _dictionary_flags(column, rule):
+    """Booléens d'une colonne dictionnaire : rule appliquée une fois par valeur distincte"""
+    chunks = [np.empty(0, dtype=bool)]
+    for chunk in column.chunks:
+        # Valeur manquante : dernière case de la table, toujours False
+        lookup = np.array([rule(v) for v in chunk.dictionary.to_pylist()] + [False])
+        chunks.append(lookup[pc.fill_null(chunk.indices, len(chunk.dictionary)).to_numpy()])
+    return pa.array(np.concatenate(chunks))
+
+
+def _read_stocks_csv(text, quarantine=None):
+    """Lignes du CSV de l'univers, déjà typées ; les lignes écartées s'ajoutent à quarantine
+
+    Les lignes vides restent des lignes (éliminées au nettoyage) : l'index de
+    chaque ligne parsée est son numéro de ligne de données dans le texte.
+    """
+    table, positions, rejected = read_csv_table(text, STOCKS_SCHEMA)
+    if quarantine is not None:
+        quarantine.extend(rejected)
+
+    # Conversions faites sur les colonnes Arrow, avant l'unique passage en pandas
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if name == 'Name':
+            column = pc.utf8_trim_whitespace(column)
+        elif name in PEA_COLUMNS:
+            column = _dictionary_flags(column, lambda v: v.strip().lower() == 'true')
+        elif name in CRITERIA_COLUMNS:
+            # 'X' marque un style d'investissement
+            column = _dictionary_flags(column, lambda v: v.strip() == 'X')
+        columns.append(column)
+    df = pa.Table.from_arrays(columns, table.column_names).to_pandas(types_mapper=_arrow_types)
+    df.index = positions
+    return df
+
+
+def clean_stocks_data(text, quarantine=None):
+    """Parse et nettoie le CSV de l'univers d'actions"""
+    return _clean_stocks_frame(_read_stocks_csv(text, quarantine)).reset_index(drop=True)
+
+
+# Version de la sortie, clé des résultats parsés du cache disque (voir mdb_http.fetch) :
+# à incrémenter à chaque changement de colonnes ou de types
+clean_stocks_data.parse_version = 2
+
+
+def _clean_stocks_frame(df):
+    """Nettoie les lignes parsées du CSV de l'univers, en conservant leur index
+
+    Les types (drapeaux, catégories, chaînes) sont déjà ceux de _read_stocks_csv.
+    """
+    # Nettoyer les données
+    df = df.dropna(subset=['Name', 'Symbol'])
+
+    # Catégories des seules lignes retenues, triées comme par astype('category')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            values = df[col].cat.remove_unused_categories()
+            df[col] = values.cat.reorder_categories(sorted(values.cat.categories))
+
+    return df
+
+
+@dataclass
+class StocksTable:
+    """Univers nettoyé et empreinte de la ligne source de chacune de ses lignes"""
+    df: pd.DataFrame
+    version: str = None
+    header: str = None
+    # Empreinte (uint64) de la ligne du CSV dont provient chaque ligne de df ; None si inconnue
+    row_hashes: np.ndarray = None
+    # Lignes du CSV écartées au parse (QuarantinedLine) ; None si inconnues
+    quarantine: list = None
+
+
+@dataclass
+class StocksDelta:
+    """Différences entre deux versions de l'univers, par Symbol"""
+    # Pour chaque ligne du nouvel univers, sa position dans l'ancien (-1 : ligne renettoyée)
+    source_rows: np.ndarray
+    inserted: list
+    updated: list
+    deleted: list
+
+    @property
+    def unchanged(self):
+        return int((self.source_rows >= 0).sum())
+
+
+def _split_lines(text):
+    """En-tête et lignes de données du CSV, ou None si le découpage par ligne n'est pas sûr"""
+    # Champs entre guillemets (retours à la ligne possibles) et fins de ligne \r : parse complet
+    if '"' in text or '\r' in text:
+        return None
+    lines = text.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    if not lines:
+        return None
+    return lines[0], lines[1:]
+
+
+def _hash_lines(lines):
+    return pd.util.hash_array(np.array(lines, dtype=object), categorize=False)
+
+
+def stocks_table(df, text, version=None):
+    """StocksTable d'un univers déjà nettoyé (relu depuis le cache par exemple) et de son texte"""
+    split = _split_lines(text)
+    if split is None:
+        return StocksTable(df, version)
+    header, lines = split
+    hashes = _hash_lines(lines)
+    quarantine = []
+    if len(hashes) != len(df):
+        # Des lignes ont été éliminées au parse ou au nettoyage : retrouver lesquelles
+        keys, positions, quarantine = read_csv_table(
+            text, {'Name': pa.string(), 'Symbol': pa.string()}, ['Name', 'Symbol'])
+        if len(positions) + len(quarantine) != len(lines):
+            return StocksTable(df, version)
+        kept = pc.and_(pc.is_valid(keys['Name']), pc.is_valid(keys['Symbol']))
+        hashes = hashes[positions[kept.to_numpy(zero_copy_only=False)]]
+        if len(hashes) != len(df):
+            return StocksTable(df, version)
+    return StocksTable(df, version, header, hashes, quarantine)
+
+
+def update_stocks_table(previous, text, version=None):
+    """Applique à l'univers précédent les lignes insérées, modifiées et supprimées de text
+
+    Seules les lignes dont l'empreinte est nouvelle sont parsées et nettoyées ;
+    les autres sont reprises de previous. Renvoie (StocksTable, StocksDelta),
+    ou None si le texte impose un parse complet (en-tête modifié, guillemets...).
+    """
+    split = _split_lines(text)
+    if previous.row_hashes is None or split is None or split[0] != previous.header:
+        return None
+    header, lines = split
+    hashes = _hash_lines(lines)
+
+    # Ligne de l'ancien univers portant la même empreinte (la première en cas de doublon)
+    first = ~pd.Index(previous.row_hashes).duplicated()
+    first_rows = np.flatnonzero(first)
+    source = pd.Index(previous.row_hashes[first]).get_indexer(hashes)
+    source = np.where(source >= 0, first_rows[source], -1)
+
+    kept_lines = np.flatnonzero(source >= 0)
+    changed_lines = np.flatnonzero(source < 0)
+    parts = [previous.df.iloc[source[kept_lines]]]
+    fresh_lines = np.empty(0, dtype=np.intp)
+    fresh_symbols = []
+    quarantine = []
+    if len(changed_lines):
+        rejected = []
+        subset = _read_stocks_csv(
+            "\n".join([header] + [lines[i] for i in changed_lines]) + "\n", rejected)
+        if len(subset) + len(rejected) != len(changed_lines):
+            return None
+        # Numéros des lignes écartées dans le nouveau fichier (lignes de données à partir de 2)
+        quarantine = [QuarantinedLine(int(changed_lines[q.line - 2]) + 2, q.text, q.reason)
+                      for q in rejected]
+        fresh = _clean_stocks_frame(subset)
+        fresh_lines = changed_lines[fresh.index.to_numpy()]
+        fresh_symbols = fresh['Symbol'].tolist()
+        if len(fresh):
+            # Une partie vide changerait les types du concat (toutes les lignes écartées)
+            parts.append(fresh)
+
+    # Réassemblage dans l'ordre des lignes du nouveau fichier
+    line_order = np.concatenate([kept_lines, fresh_lines])
+    order = np.argsort(line_order, kind='stable')
+    df = pd.concat(parts, ignore_index=True).take(order).reset_index(drop=True)
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            # Catégories des seules valeurs présentes, comme après un nettoyage complet
+            df[col] = df[col].cat.remove_unused_categories() \
+                if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype('category')
+        elif col in previous.df.columns and df[col].dtype != previous.df[col].dtype:
+            df[col] = df[col].astype(previous.df[col].dtype)
+
+    source_rows = np.concatenate(
+        [source[kept_lines], np.full(len(fresh_lines), -1, dtype=source.dtype)])[order]
+    reused = np.zeros(len(previous.df), dtype=bool)
+    reused[source[kept_lines]] = True
+    previous_symbols = pd.Index(previous.df['Symbol'])
+    current_symbols = pd.Index(df['Symbol'])
+    delta = StocksDelta(
+        source_rows=source_rows,
+        inserted=[s for s in fresh_symbols if s not in previous_symbols],
+        updated=[s for s in fresh_symbols if s in previous_symbols],
+        deleted=[s for s in previous.df['Symbol'][~reused] if s not in current_symbols]
+    )
+    return StocksTable(df, version, header, hashes[line_order[order]], quarantine), delta
+
+
+def _arrow_types(arrow_type):
+    if arrow_type in (pa.string(), pa.large_string()):
+        return STRING_DTYPE
+    return None
+
+
+def write_snapshot(df, path):
+    """Écrit le DataFrame nettoyé au format Arrow IPC"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_snapshot(path):
+    """Relit un instantané Arrow IPC par memory-map, sans reparser de texte
+
+    Les colonnes texte restent adossées au fichier mappé ; seules les colonnes
+    booléennes et les codes des catégories sont matérialisés.
+    """
+    # Pas de fermeture explicite : les buffers Arrow gardent le mapping en vie
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=_arrow_types)
+
+
+class ArrowSnapshotCodec:
+    """Format Arrow IPC pour le cache disque des résultats parsés (voir mdb_http)"""
+    name = "arrow-ipc"
+    version = 1
+
+    def write(self, obj, path):
+        write_snapshot(obj, path)
+
+    def read(self, path):
+        return read_snapshot(path)
+
+
+ARROW_SNAPSHOT_CODEC = ArrowSnapshotCodec()
+
+
+def fetch_screener_config():
+    """Configuration des setups de screening (gist, cache disque ou miroir local)
+
+    Si aucune source ne fournit une configuration valide, la configuration
+    par défaut est renvoyée ; l'échec reste visible dans l'instrumentation.
+    """
+    response = fetch(GIST_RAW_URL + "screener_setups.json", parse=json.loads)
+    record_fetch(response)
+    if response.ok and isinstance(response.parsed, dict) \
+            and isinstance(response.parsed.get("setups"), dict):
+        return response.parsed
+    return copy.deepcopy(DEFAULT_SCREENER_CONFIG)
+
+
+def parse_screener_results(text):
+    """Extrait les noms (et symboles s'ils existent) d'un CSV de résultats de screener"""
+    # Lignes de commentaire ignorées, lignes mal formées mises en quarantaine
+    table, positions, quarantine = read_csv_table(text, comment='#')
+    screener_df = table.to_pandas()
+    parsed = {"names": None, "symbols": None, "columns": screener_df.columns.tolist(),
+              "quarantined": quarantine}
+
+    # Retourner la liste des noms (None si pas de colonne Name)
+    if 'Name' in screener_df.columns:
+        parsed["names"] = screener_df['Name'].dropna().tolist()
+    elif 'name' in screener_df.columns:
+        parsed["names"] = screener_df['name'].dropna().tolist()
+
+    # Les symboles, plus fiables que les noms pour la jointure avec l'univers
+    for col in ['Symbol', 'symbol']:
+        if col in screener_df.columns:
+            parsed["symbols"] = screener_df[col].dropna().tolist()
+            break
+    return parsed
+
+
+# Version de la sortie (voir clean_stocks_data) : 2 depuis l'ajout de "quarantined"
+parse_screener_results.parse_version = 2
+
+
+def fetch_screener_results(output_files):
+    """Télécharge en parallèle les résultats de plusieurs screeners"""
+    fetched = fetch_many([SCREENER_RESULTS_URL + f for f in output_files],
+                         parse=parse_screener_results)
+
+    results = {}
+    for output_file in output_files:
+        response = fetched[SCREENER_RESULTS_URL + output_file]
+        record_fetch(response)
+        result = {
+            "output_file": output_file,
+            "names": [],
+            "symbols": None,
+            "columns": None,
+            "status_code": response.status_code,
+            "elapsed": response.elapsed,
+            "error": response.error,
+            "cache_status": response.cache_status,
+            "version": response.version,
+            "quarantined": []
+        }
+        if response.ok:
+            result["columns"] = response.parsed["columns"]
+            result["quarantined"] = response.parsed.get("quarantined", [])
+            result["symbols"] = response.parsed["symbols"]
+            result["names"] = response.parsed["names"] or []
+        results[output_file] = result
+    return results
+
+
+def fetch_stocks_result():
+    """Télécharge l'univers d'actions ; FetchResult avec le DataFrame nettoyé dans parsed
+
+    Lève une exception en cas d'échec.
+    """
+    # Le résultat nettoyé est relu par memory-map depuis l'instantané Arrow du cache
+    response = fetch(GIST_RAW_URL + STOCKS_FILE,
+                     parse=clean_stocks_data, codec=ARROW_SNAPSHOT_CODEC)
+    record_fetch(response)
+    if not response.ok:
+        raise ValueError(response.error or f"HTTP {response.status_code}")
+    return response
+
+
+def fetch_stocks_table(previous=None):
+    """Télécharge l'univers ; renvoie (FetchResult, StocksTable, StocksDelta ou None)
+
+    Avec previous (StocksTable de la version précédente), seules les lignes
+    modifiées sont nettoyées ; sinon tout l'univers est nettoyé, ou relu depuis
+    l'instantané Arrow du cache. Lève une exception en cas d'échec.
+    """
+    if previous is None:
+        response = fetch_stocks_result()
+        return response, stocks_table(response.parsed, response.text, response.version), None
+
+    url = GIST_RAW_URL + STOCKS_FILE
+    response = fetch(url)
+    record_fetch(response)
+    if not response.ok:
+        raise ValueError(response.error or f"HTTP {response.status_code}")
+    if response.version and response.version == previous.version:
+        response.parsed = previous.df
+        return response, previous, None
+
+    updated = update_stocks_table(previous, response.text, response.version)
+    if updated is not None:
+        table, delta = updated
+    else:
+        table, delta = stocks_table(clean_stocks_data(response.text), response.text,
+                                    response.version), None
+    response.parsed = table.df
+
+    # Le cache disque garde l'univers nettoyé de cette version pour les prochains démarrages
+    cache = get_cache()
+    if cache and response.version:
+        cache.store_parsed(url, response.version, table.df, ARROW_SNAPSHOT_CODEC,
+                           clean_stocks_data)
+    return response, table, delta
+
+
+def fetch_stocks_data():
+    """Télécharge l'univers d'actions nettoyé ; lève une exception en cas d'échec"""
+    return fetch_stocks_result().parsed
+
+
+def setup_output_files(config):
+    """Fichier de résultats de chaque setup de la configuration, par nom de setup"""
+    setup_files = {}
+    for setup_id, setup_info in config["setups"].items():
+        if "output_file" in setup_info:
+            setup_files[setup_info["name"]] = setup_info["output_file"]
+    return setup_files
@@ -0,0 +1,75 @@
+"""Génération des exports du screener : CSV par blocs, CSV gzip, Parquet et XLSX
+
+write_export écrit dans un fichier ouvert : le CSV y est sérialisé et
+compressé par blocs de CSV_CHUNK_ROWS lignes, sans chaîne complète (c'est
+le chemin de mdb_screen, qui écrit sur disque). Dans l'application,
+st.download_button n'accepte que le contenu entier : export_bytes produit
+donc les octets du fichier final, gardés une fois par filtre et par format
+dans le cache de résultats partagé (mdb_results), et Streamlit en conserve
+une copie par session tant que le bouton est affiché.
+"""
+import gzip
+import importlib.util
+from io import BytesIO
+
+from mdb_instrument import instrumented
+
+# Nombre de lignes sérialisées à la fois pour les exports CSV
+CSV_CHUNK_ROWS = 50_000
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "extension": "csv", "mime": "text/csv"},
+    "csv.gz": {"label": "CSV compressé (gzip)", "extension": "csv.gz",
+               "mime": "application/gzip"},
+    "parquet": {"label": "Parquet", "extension": "parquet",
+                "mime": "application/vnd.apache.parquet"},
+    "xlsx": {"label": "Excel (XLSX)", "extension": "xlsx",
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+}
+
+
+def available_formats():
+    """Formats utilisables ici (XLSX nécessite openpyxl, dépendance optionnelle)"""
+    formats = list(EXPORT_FORMATS)
+    if importlib.util.find_spec("openpyxl") is None:
+        formats.remove("xlsx")
+    return formats
+
+
+def iter_csv_chunks(df, chunk_rows=CSV_CHUNK_ROWS, sep=';'):
+    """Produit le CSV de df par blocs d'octets, sans construire la chaîne complète"""
+    yield df.iloc[:0].to_csv(index=False, sep=sep).encode("utf-8")
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, sep=sep, header=False).encode("utf-8")
+
+
+def write_export(df, fileobj, fmt):
+    """Écrit df au format fmt dans un fichier binaire ouvert"""
+    if fmt == "csv":
+        for block in iter_csv_chunks(df):
+            fileobj.write(block)
+    elif fmt == "csv.gz":
+        with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6) as gz:
+            for block in iter_csv_chunks(df):
+                gz.write(block)
+    elif fmt == "parquet":
+        df.to_parquet(fileobj, index=False)
+    elif fmt == "xlsx":
+        if "xlsx" not in available_formats():
+            raise ValueError("L'export XLSX nécessite le paquet openpyxl")
+        df.to_excel(fileobj, index=False, engine="openpyxl")
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt!r}")
+
+
+@instrumented("export_bytes")
+def export_bytes(df, fmt):
+    """Renvoie l'export de df au format fmt sous forme d'octets
+
+    Le fichier entier est en mémoire (voir la docstring du module) ; seul le
+    texte CSV intermédiaire est évité, par blocs.
+    """
+    buffer = BytesIO()
+    write_export(df, buffer, fmt)
+    return buffer.getvalue()
@@ -0,0 +1,238 @@
+"""Historique de l'appartenance aux setups et aux styles, une entrée par date d'instantané
+
+Chaque action reçoit un identifiant entier stable, attribué à la première
+apparition de son Symbol normalisé (dictionnaire stocks.u64, écrit en ajout
+seul). Pour chaque date, l'enregistrement members-AAAA-MM-JJ.npz contient,
+par setup et par drapeau de style, la liste triée des identifiants membres,
+encodée en écarts successifs puis compressée. Les dates s'ajoutent sans
+jamais modifier les précédentes ; seule celle du jour est réécrite par les
+rafraîchissements suivants.
+
+Les entrées et sorties entre deux dates sont des différences de listes
+triées ; l'appartenance à une date est celle du dernier enregistrement
+antérieur ou égal.
+
+Plusieurs processus (réplicas sur un même hôte) peuvent partager le
+répertoire : chaque écriture se fait sous un verrou exclusif (LOCK_FILE), et
+le dictionnaire est relu une fois le verrou pris, pour ne jamais attribuer
+un identifiant déjà donné par un autre processus.
+"""
+import bisect
+import contextlib
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from mdb_http import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:
+    # Hors POSIX : pas de verrou entre processus, un seul processus doit écrire
+    fcntl = None
+from mdb_index import normalize_keys
+
+# Répertoire de l'historique (vide : historique conservé en mémoire seulement)
+HISTORY_DIR = os.environ.get(
+    "MDB_HISTORY_DIR", os.path.join(CACHE_DIR, "history") if CACHE_DIR else "")
+
+KEYS_FILE = "stocks.u64"
+LOCK_FILE = ".lock"
+RECORD_PATTERN = re.compile(r"^members-(\d{4}-\d{2}-\d{2})\.npz$")
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def history_date(timestamp):
+    """Date (locale) d'un instantané, au format AAAA-MM-JJ"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+def member_label(key):
+    """Libellé affiché d'une clé d'enregistrement (setup:<nom> ou flag:<colonne>)"""
+    return key.split(":", 1)[1]
+
+
+def _encode(ids):
+    return np.diff(ids, prepend=np.uint32(0)).astype(np.uint32)
+
+
+def _decode(deltas):
+    return np.cumsum(deltas, dtype=np.uint32)
+
+
+class MembershipHistory:
+    """Historique en ajout seul : dictionnaire des actions et enregistrements par date
+
+    Les écritures des processus partageant le répertoire sont sérialisées par
+    un verrou fcntl. Les lecteurs (sessions) voient toujours un état
+    cohérent : chaque écriture remplace les tables d'un seul coup.
+    """
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory or None
+        self._lock = threading.Lock()
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.records = {}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load()
+        self._lookup = pd.Index(self.keys)
+        self.dates = sorted(self.records)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Verrou des écritures : threads du processus, puis autres processus du répertoire"""
+        with self._lock:
+            if not self.directory or fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_keys(self):
+        path = os.path.join(self.directory, KEYS_FILE)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.uint64)
+        data = np.fromfile(path, dtype=np.uint8)
+        # Une écriture interrompue ne laisse qu'une clé tronquée en fin de fichier
+        return data[:len(data) - len(data) % 8].view(np.uint64)
+
+    def _load(self):
+        self.keys = self._read_keys()
+        for filename in os.listdir(self.directory):
+            match = RECORD_PATTERN.match(filename)
+            if not match:
+                continue
+            try:
+                with np.load(os.path.join(self.directory, filename)) as archive:
+                    self.records[match.group(1)] = {
+                        key: _decode(archive[key]) for key in archive.files}
+            except (OSError, ValueError):
+                continue
+
+    def ids_for(self, keys):
+        """Identifiants des clés normalisées (mdb_index.normalize_keys), créés au besoin"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        ids = self._lookup.get_indexer(keys)
+        if (ids >= 0).all():
+            return ids.astype(np.uint32)
+        with self._locked():
+            if self.directory:
+                # Identifiants attribués entre-temps par les autres processus
+                stored = self._read_keys()
+                if len(stored) > len(self.keys):
+                    self.keys = stored
+                    self._lookup = pd.Index(self.keys)
+            ids = self._lookup.get_indexer(keys)
+            new_keys = pd.unique(keys[ids < 0])
+            if len(new_keys):
+                if self.directory:
+                    path = os.path.join(self.directory, KEYS_FILE)
+                    with open(path, "ab") as f:
+                        # Clé tronquée d'une écriture interrompue : écrasée, pour rester aligné
+                        f.truncate(len(self.keys) * 8)
+                        f.write(new_keys.tobytes())
+                self.keys = np.concatenate([self.keys, new_keys])
+                self._lookup = pd.Index(self.keys)
+                ids = self._lookup.get_indexer(keys)
+        return ids.astype(np.uint32)
+
+    def record(self, date, members):
+        """Enregistre l'appartenance de la date (clé -> identifiants triés et distincts)"""
+        with self._locked():
+            if self.directory:
+                path = os.path.join(self.directory, f"members-{date}.npz")
+                tmp_path = f"{path}.{threading.get_ident()}.tmp.npz"
+                try:
+                    np.savez_compressed(
+                        tmp_path, **{key: _encode(ids) for key, ids in members.items()})
+                    os.replace(tmp_path, path)
+                except OSError:
+                    # Disque indisponible : l'enregistrement reste en mémoire
+                    pass
+            records = dict(self.records)
+            records[date] = members
+            self.records = records
+            self.dates = sorted(records)
+
+    def as_of(self, date):
+        """Appartenance à la date : dernier enregistrement antérieur ou égal (None si aucun)"""
+        dates = self.dates
+        i = bisect.bisect_right(dates, date)
+        return self.records[dates[i - 1]] if i else None
+
+    def changes(self, since, until):
+        """Entrées et sorties entre deux dates : clé -> (identifiants entrés, sortis)
+
+        Seules les clés enregistrées aux deux dates sont comparées.
+        """
+        before, after = self.as_of(since), self.as_of(until)
+        if before is None or after is None:
+            return {}
+        return {
+            key: (np.setdiff1d(after[key], before[key], assume_unique=True),
+                  np.setdiff1d(before[key], after[key], assume_unique=True))
+            for key in after if key in before
+        }
+
+    def row_changes(self, ids, since, until):
+        """Libellés des setups et styles entrés et sortis pour chaque identifiant de ids"""
+        entered = [[] for _ in range(len(ids))]
+        left = [[] for _ in range(len(ids))]
+        before, after = self.as_of(since), self.as_of(until)
+        if before is None or after is None:
+            return entered, left
+        for key in after:
+            if key not in before:
+                continue
+            was = np.isin(ids, before[key])
+            now = np.isin(ids, after[key])
+            for i in np.flatnonzero(now & ~was):
+                entered[i].append(member_label(key))
+            for i in np.flatnonzero(was & ~now):
+                left[i].append(member_label(key))
+        return entered, left
+
+
+def stock_keys(df, membership):
+    """Clés normalisées identifiant les actions de l'univers : Symbol, à défaut Name
+
+    Les clés sont gardées dans membership.universe_keys pour être reprises
+    par les instantanés suivants.
+    """
+    col = 'Symbol' if 'Symbol' in df.columns else 'Name'
+    if col not in membership.universe_keys:
+        membership.universe_keys[col] = normalize_keys(df[col])
+    return membership.universe_keys[col]
+
+
+def snapshot_members(index, membership, stock_ids):
+    """Identifiants membres de chaque setup (chargé sans erreur) et de chaque drapeau"""
+    members = {}
+    for j, name in enumerate(membership.setups):
+        # Un setup en échec n'a pas de liste fiable : il n'est pas enregistré
+        if membership.results[name].get("error"):
+            continue
+        members[f"setup:{name}"] = np.unique(stock_ids[membership.matrix[:, j]])
+    for col, bit in index.bits.items():
+        members[f"flag:{col}"] = np.unique(stock_ids[(index.flags & bit) != 0])
+    return members
+
+
+def get_history():
+    """Retourne l'historique partagé par tout le processus"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = MembershipHistory()
+    return _history
@@ -0,0 +1,498 @@
+"""Transport HTTP partagé pour le chargement des fichiers des gists
+
+Chaque requête a des délais de connexion et de lecture, est retentée sur
+erreur réseau, 429 ou 5xx (backoff exponentiel avec gigue, dans une durée
+totale bornée), et passe par le disjoncteur de son hôte : après plusieurs
+échecs consécutifs, l'hôte n'est plus sollicité pendant un temps. En dernier
+recours, le fichier est lu dans le cache disque puis dans le miroir local.
+"""
+import hashlib
+import json
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Nombre maximal de connexions gardées ouvertes par hôte (et de téléchargements simultanés)
+POOL_MAXSIZE = 8
+
+# Délais de connexion et de lecture d'une tentative, durée maximale de toutes les tentatives
+CONNECT_TIMEOUT = float(os.environ.get("MDB_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("MDB_READ_TIMEOUT", "10"))
+REQUEST_DEADLINE = float(os.environ.get("MDB_REQUEST_DEADLINE", "20"))
+
+# Nouvelles tentatives après la première, délais de base et maximal du backoff
+MAX_RETRIES = int(os.environ.get("MDB_MAX_RETRIES", "2"))
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 4.0
+# Statuts retentés : surcharge ou panne passagère du serveur
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Disjoncteur : échecs consécutifs avant ouverture, puis durée d'ouverture en secondes
+BREAKER_THRESHOLD = int(os.environ.get("MDB_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("MDB_BREAKER_COOLDOWN", "30"))
+
+# Miroir local : copies des fichiers des gists, par nom de fichier (vide pour désactiver)
+MIRROR_DIR = os.environ.get("MDB_MIRROR_DIR", "")
+
+# Cache disque : répertoire (vide pour désactiver), fraîcheur en secondes et taille maximale
+CACHE_DIR = os.environ.get(
+    "MDB_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mdb_screener"))
+CACHE_TTL = float(os.environ.get("MDB_CACHE_TTL", "300"))
+CACHE_MAX_BYTES = int(float(os.environ.get("MDB_CACHE_MAX_MB", "200")) * 1024 * 1024)
+# Intervalle minimal entre deux mises à jour de la date d'utilisation (ordre LRU) d'une entrée
+CACHE_TOUCH_INTERVAL = 60
+
+_session = None
+_session_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+@dataclass
+class FetchResult:
+    """Résultat d'un téléchargement : contenu, statut, durée et erreur éventuelle"""
+    url: str
+    text: str = None
+    status_code: int = None
+    elapsed: float = 0.0
+    error: str = None
+    # Empreinte du contenu, stable tant que le fichier distant ne change pas
+    version: str = None
+    # "miss", "hit" (frais), "revalidated" (304), "stale" (réseau en échec) ou "mirror"
+    cache_status: str = "miss"
+    # Octets reçus du réseau (0 quand le corps vient du cache)
+    nbytes: int = 0
+    # Résultat de la fonction parse passée à fetch()
+    parsed: object = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.status_code == 200
+
+
+class PickleCodec:
+    """Format par défaut des résultats parsés enregistrés dans le cache disque"""
+    name = "pickle"
+    # Version du format de stockage, à incrémenter quand write() change
+    version = 1
+
+    def write(self, obj, path):
+        with open(path, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+PICKLE_CODEC = PickleCodec()
+
+
+class DiskCache:
+    """Cache disque des corps HTTP avec ETag/Last-Modified et éviction LRU
+
+    Chaque URL est stockée sous trois fichiers : le corps brut (.body), les
+    métadonnées (.json) et le résultat déjà parsé de ce corps (.parsed).
+    """
+
+    def __init__(self, directory, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, session=None,
+                 touch_interval=CACHE_TOUCH_INTERVAL):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.session = session
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, path, data):
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_meta(self, url):
+        try:
+            with open(self._path(url, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, url, meta):
+        self._write(self._path(url, ".json"), json.dumps(meta).encode("utf-8"))
+
+    def _read_body(self, url, meta):
+        try:
+            with open(self._path(url, ".body"), "rb") as f:
+                return f.read().decode(meta.get("encoding") or "utf-8", errors="replace")
+        except OSError:
+            return None
+
+    def fetch(self, url):
+        """Renvoie le contenu de url, revalidé par GET conditionnel une fois le TTL écoulé"""
+        start = time.perf_counter()
+        meta = self._read_meta(url)
+        cached_text = self._read_body(url, meta) if meta else None
+        if cached_text is None:
+            meta = None
+
+        if meta and time.time() - meta["checked_at"] < self.ttl:
+            return self._from_cache(url, meta, cached_text, "hit", start)
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = http_get(url, headers, self.session)
+        except requests.RequestException as e:
+            if meta:
+                return self._from_cache(url, meta, cached_text, "stale", start)
+            return FetchResult(url, elapsed=time.perf_counter() - start, error=str(e))
+
+        if response.status_code == 304 and meta:
+            meta["checked_at"] = time.time()
+            return self._from_cache(url, meta, cached_text, "revalidated", start, changed=True)
+        if response.status_code in RETRY_STATUSES and meta:
+            # Serveur toujours en échec après les nouvelles tentatives
+            return self._from_cache(url, meta, cached_text, "stale", start)
+
+        result = FetchResult(url, response.text, response.status_code,
+                             time.perf_counter() - start, nbytes=_wire_bytes(response))
+        if response.status_code == 200:
+            body = response.content
+            result.version = hashlib.sha1(body).hexdigest()
+            self._store(url, response, body, result.version)
+        return result
+
+    def _from_cache(self, url, meta, text, cache_status, start, changed=False):
+        # Date d'utilisation réécrite au plus une fois par touch_interval : un hit ne
+        # coûte alors qu'une lecture, l'ordre LRU reste exact à cet intervalle près
+        now = time.time()
+        if changed or now - meta.get("used_at", 0) >= self.touch_interval:
+            meta["used_at"] = now
+            self._write_meta(url, meta)
+        return FetchResult(url, text, 200, time.perf_counter() - start,
+                           version=meta["version"], cache_status=cache_status)
+
+    def _store(self, url, response, body, version):
+        now = time.time()
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "version": version,
+            "checked_at": now,
+            "used_at": now
+        }
+        with self._lock:
+            self._write(self._path(url, ".body"), body)
+            self._write_meta(url, meta)
+        self.evict()
+
+    def load_parsed(self, url, version, codec=PICKLE_CODEC, parser=None):
+        """Renvoie le résultat parsé de la version donnée, ou None s'il n'existe pas"""
+        meta = self._read_meta(url)
+        if (not meta or meta.get("parsed_version") != version
+                or meta.get("parsed_key") != _parsed_key(codec, parser)):
+            return None
+        try:
+            return codec.read(self._path(url, ".parsed"))
+        except Exception:
+            return None
+
+    def store_parsed(self, url, version, obj, codec=PICKLE_CODEC, parser=None):
+        """Enregistre le résultat parsé d'une version du corps"""
+        with self._lock:
+            meta = self._read_meta(url)
+            if not meta or meta.get("version") != version:
+                return
+            path = self._path(url, ".parsed")
+            tmp_path = _tmp_path(path)
+            codec.write(obj, tmp_path)
+            os.replace(tmp_path, path)
+            meta["parsed_version"] = version
+            meta["parsed_key"] = _parsed_key(codec, parser)
+            self._write_meta(url, meta)
+        self.evict()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for filename in os.listdir(self.directory):
+                if not filename.endswith(".json"):
+                    continue
+                key = filename[:-len(".json")]
+                paths = [os.path.join(self.directory, key + suffix)
+                         for suffix in (".json", ".body", ".parsed")]
+                size = 0
+                for path in paths:
+                    try:
+                        size += os.path.getsize(path)
+                    except FileNotFoundError:
+                        # Entrée supprimée entre-temps par un autre processus
+                        pass
+                try:
+                    with open(paths[0], encoding="utf-8") as f:
+                        used_at = json.load(f).get("used_at", 0)
+                except (OSError, ValueError):
+                    used_at = 0
+                entries.append((used_at, size, paths))
+                total += size
+
+            for used_at, size, paths in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+
+def _tmp_path(path):
+    # Unique par processus et par thread : plusieurs instances de l'application
+    # peuvent partager le même répertoire de cache
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _parsed_key(codec, parser):
+    # Un résultat parsé n'est réutilisable qu'avec le même format et la même fonction, dans
+    # la même version de sa sortie (attribut parse_version du parser, à incrémenter quand la
+    # forme du résultat change)
+    parser_name = ""
+    if parser:
+        name = getattr(parser, "__qualname__", type(parser).__qualname__)
+        parser_name = f"{parser.__module__}.{name}/{getattr(parser, 'parse_version', 1)}"
+    return f"{codec.name}/{getattr(codec, 'version', 1)}:{parser_name}"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Requête refusée sans appel réseau : le disjoncteur de l'hôte est ouvert"""
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un hôte : fermé, ouvert après threshold échecs consécutifs, puis semi-ouvert
+
+    Une fois cooldown écoulé, une seule requête d'essai passe ; son succès
+    referme le disjoncteur, son échec le rouvre pour une nouvelle période.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+    def allow(self):
+        """True si une requête peut partir maintenant"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+def get_breaker(url):
+    """Disjoncteur de l'hôte de url, partagé par tout le processus"""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def _retry_delay(attempt, response):
+    # Backoff exponentiel avec gigue complète ; Retry-After (en secondes) s'il est plus long
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+    return delay
+
+
+def _wire_bytes(response):
+    # Octets reçus du réseau, compressés (gzip) le cas échéant
+    try:
+        return int(response.raw.tell()) or len(response.content)
+    except (AttributeError, TypeError, ValueError):
+        return len(response.content)
+
+
+def http_get(url, headers=None, session=None):
+    """GET via la session partagée, avec délais, nouvelles tentatives et disjoncteur
+
+    Renvoie la dernière réponse reçue (y compris un statut d'erreur) ; lève
+    requests.RequestException si aucune réponse n'a été obtenue ou si le
+    disjoncteur de l'hôte est ouvert.
+    """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Disjoncteur ouvert pour {urlsplit(url).netloc}")
+
+    session = session or get_session()
+    deadline = time.monotonic() + REQUEST_DEADLINE
+    for attempt in range(MAX_RETRIES + 1):
+        response, error = None, None
+        try:
+            response = session.get(url, headers=headers,
+                                   timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+        except requests.RequestException as e:
+            error = e
+        delay = _retry_delay(attempt, response)
+        if attempt == MAX_RETRIES or time.monotonic() + delay >= deadline:
+            break
+        time.sleep(delay)
+
+    breaker.record_failure()
+    if error is not None:
+        raise error
+    return response
+
+
+def _from_mirror(url, start):
+    """Fichier de même nom dans le miroir local, ou None"""
+    if not MIRROR_DIR:
+        return None
+    path = os.path.join(MIRROR_DIR, os.path.basename(urlsplit(url).path))
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+    except OSError:
+        return None
+    return FetchResult(url, body.decode("utf-8", errors="replace"), 200,
+                       time.perf_counter() - start, version=hashlib.sha1(body).hexdigest(),
+                       cache_status="mirror")
+
+
+def get_session():
+    """Retourne la session keep-alive partagée par tout le processus"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # Corps compressés à l'envoi : les CSV des gists se compressent très bien
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _session = session
+    return _session
+
+
+def get_cache():
+    """Retourne le cache disque du processus, ou None s'il est désactivé"""
+    global _cache
+    with _cache_lock:
+        if _cache is None and CACHE_DIR:
+            _cache = DiskCache(CACHE_DIR)
+    return _cache
+
+
+def set_cache(cache):
+    """Remplace le cache disque du processus (None pour revenir à la configuration)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def _download(url):
+    start = time.perf_counter()
+    try:
+        response = http_get(url)
+        return FetchResult(url, response.text, response.status_code,
+                           time.perf_counter() - start, nbytes=_wire_bytes(response))
+    except requests.RequestException as e:
+        return FetchResult(url, elapsed=time.perf_counter() - start, error=str(e))
+
+
+def fetch(url, parse=None, codec=PICKLE_CODEC):
+    """Télécharge une URL via le cache et la session partagés sans jamais lever d'exception
+
+    Si parse est fourni, il est appliqué au texte et son résultat est placé dans
+    result.parsed ; il est réutilisé depuis le disque (au format codec) tant que
+    le contenu, la version du codec et l'attribut parse_version de parse
+    n'ont pas changé.
+    """
+    start = time.perf_counter()
+    cache = get_cache()
+    result = cache.fetch(url) if cache else _download(url)
+    if not result.ok:
+        # Ni la source ni le cache disque : copie du miroir local si elle existe
+        result = _from_mirror(url, start) or result
+    if parse is None or not result.ok:
+        return result
+
+    if cache and result.version:
+        result.parsed = cache.load_parsed(url, result.version, codec, parse)
+        if result.parsed is not None:
+            return result
+
+    try:
+        result.parsed = parse(result.text)
+    except Exception as e:
+        result.error = str(e)
+        return result
+
+    if cache and result.version:
+        cache.store_parsed(url, result.version, result.parsed, codec, parse)
+    return result
+
+
+def fetch_many(urls, parse=None, max_workers=POOL_MAXSIZE):
+    """Télécharge plusieurs URLs en parallèle, renvoie un dict url -> FetchResult"""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        results = list(pool.map(lambda url: fetch(url, parse), urls))
+    return dict(zip(urls, results))
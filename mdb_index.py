@@ -0,0 +1,270 @@
+"""Index de filtrage : drapeaux en bitmasks, postings par marché/secteur et setups"""
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from mdb_data import CRITERIA_COLUMNS, PEA_COLUMNS
+
+# Bits des drapeaux, dans l'ordre : styles d'investissement puis PEA et PEA-PME
+FLAG_COLUMNS = CRITERIA_COLUMNS + PEA_COLUMNS
+
+# Options du filtre PEA, identiques aux libellés de la sidebar
+PEA_FILTER_OPTIONS = ["Tous", "PEA Eligible", "Non PEA Eligible", "PEA-PME Eligible"]
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """Filtres de la sidebar ; les setups sont résolus par SetupMembership"""
+    setups: tuple = ()
+    markets: tuple = ()
+    pea_filter: str = "Tous"
+    criteria: tuple = ()
+    sector: str = "Tous"
+    # Expression booléenne (mdb_query), combinée aux filtres précédents
+    expression: str = ""
+    # Recherche textuelle (mdb_search), appliquée après les autres filtres
+    search: str = ""
+
+    def canonical(self):
+        """Forme équivalente indépendante de l'ordre des sélections, de la casse et des espaces
+
+        Setups, marchés et critères sont des unions ; l'expression et la
+        recherche ne distinguent ni la casse ni les espaces répétés.
+        """
+        return FilterSpec(
+            setups=tuple(sorted(set(self.setups))),
+            markets=tuple(sorted(set(self.markets))),
+            pea_filter=self.pea_filter,
+            criteria=tuple(sorted(set(self.criteria))),
+            sector=self.sector,
+            expression=" ".join(self.expression.casefold().split()),
+            search=" ".join(self.search.casefold().split())
+        )
+
+
+class FilterIndex:
+    """Index précalculé sur l'univers pour résoudre un FilterSpec en positions de lignes
+
+    Les drapeaux booléens sont regroupés dans un entier par ligne (un bit par
+    colonne de FLAG_COLUMNS) ; Market et Sector sont stockés en codes entiers
+    avec, pour chaque valeur, la liste triée des lignes qui la portent.
+    """
+
+    def __init__(self, df, previous=None, source_rows=None):
+        # previous et source_rows (voir mdb_data.StocksDelta) : les drapeaux des lignes
+        # reprises telles quelles de l'univers précédent ne sont pas recalculés
+        self.df = df
+        self.n_rows = len(df)
+        # Identifiant de cette construction, pour y rattacher les structures dérivées
+        self.token = uuid.uuid4().hex
+
+        self.bits = {}
+        for bit, col in enumerate(FLAG_COLUMNS):
+            if col in df.columns:
+                self.bits[col] = np.uint16(1 << bit)
+
+        rows = None
+        self.flags = np.zeros(self.n_rows, dtype=np.uint16)
+        if previous is not None and previous.bits == self.bits:
+            reused = source_rows >= 0
+            self.flags[reused] = previous.flags[source_rows[reused]]
+            rows = np.flatnonzero(~reused)
+        for col, bit in self.bits.items():
+            # Valeur manquante : drapeau absent, comme any() des filtres pandas d'origine
+            values = df[col].to_numpy(dtype=bool, na_value=False)
+            if rows is None:
+                self.flags |= values.astype(np.uint16) * bit
+            else:
+                self.flags[rows] |= values[rows].astype(np.uint16) * bit
+        # Nombre de lignes par drapeau, pour estimer la sélectivité des filtres (mdb_query)
+        self.flag_counts = {col: int(np.count_nonzero(self.flags & bit))
+                            for col, bit in self.bits.items()}
+
+        self.codes = {}
+        self.categories = {}
+        self.postings = {}
+        for col in ['Market', 'Sector']:
+            if col not in df.columns:
+                continue
+            values = df[col].astype('category')
+            codes = values.cat.codes.to_numpy()
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(values.cat.categories) + 1))
+            self.codes[col] = codes
+            self.categories[col] = list(values.cat.categories)
+            self.postings[col] = {
+                value: order[bounds[i]:bounds[i + 1]]
+                for i, value in enumerate(self.categories[col])
+            }
+
+    def rows_for(self, col, values):
+        """Positions triées des lignes dont col prend une des valeurs données"""
+        postings = self.postings.get(col, {})
+        lists = [postings[v] for v in values if v in postings]
+        if not lists:
+            return np.empty(0, dtype=np.intp)
+        if len(lists) == 1:
+            return lists[0]
+        # Union de plusieurs postings : un passage sur les codes évite un tri
+        return np.flatnonzero(self._code_filter(col, values)[self.codes[col]])
+
+    def _code_filter(self, col, values):
+        """Table code -> booléen des valeurs retenues pour col"""
+        keep = np.zeros(len(self.categories[col]) + 1, dtype=bool)
+        for value in values:
+            if value in self.postings[col]:
+                keep[self.categories[col].index(value)] = True
+        # Le code -1 (valeur manquante) tombe sur la dernière case, toujours False
+        return keep
+
+    def resolve(self, spec, rows=None):
+        """Positions triées des lignes qui satisfont spec, parmi rows si fourni"""
+        selections = {}
+        if spec.markets and 'Market' in self.postings:
+            selections['Market'] = list(spec.markets)
+        if spec.sector != "Tous" and 'Sector' in self.postings:
+            selections['Sector'] = [spec.sector]
+
+        # Partir de la sélection la plus petite, puis vérifier les autres par leurs codes
+        candidates = [] if rows is None else [(len(rows), None)]
+        for col, values in selections.items():
+            postings = self.postings[col]
+            candidates.append((sum(len(postings[v]) for v in values if v in postings), col))
+        smallest = min(candidates, key=lambda c: c[0])[1] if candidates else None
+        if smallest is not None:
+            selected = self.rows_for(smallest, selections.pop(smallest))
+            if rows is not None:
+                in_rows = np.zeros(self.n_rows, dtype=bool)
+                in_rows[rows] = True
+                selected = selected[in_rows[selected]]
+            rows = selected
+        for col, values in selections.items():
+            rows = rows[self._code_filter(col, values)[self.codes[col][rows]]]
+
+        # Drapeaux exigés, interdits et « au moins un parmi »
+        required = np.uint16(0)
+        forbidden = np.uint16(0)
+        if spec.pea_filter == "PEA Eligible" and 'PEA' in self.bits:
+            required |= self.bits['PEA']
+        elif spec.pea_filter == "Non PEA Eligible" and 'PEA' in self.bits:
+            forbidden |= self.bits['PEA']
+        elif spec.pea_filter == "PEA-PME Eligible" and 'PEA-PME' in self.bits:
+            required |= self.bits['PEA-PME']
+
+        any_of = np.uint16(0)
+        for col in spec.criteria:
+            any_of |= self.bits.get(col, np.uint16(0))
+
+        if not (required or forbidden or any_of):
+            return np.arange(self.n_rows) if rows is None else rows
+
+        flags = self.flags if rows is None else self.flags[rows]
+        mask = (flags & (required | forbidden)) == required
+        if any_of:
+            mask &= (flags & any_of) != 0
+        return np.flatnonzero(mask) if rows is None else rows[mask]
+
+    def materialize(self, rows):
+        """DataFrame des lignes retenues ; l'univers partagé lui-même s'il est retenu en entier"""
+        if len(rows) == self.n_rows and np.all(rows[1:] > rows[:-1]):
+            return self.df
+        return self.df.iloc[rows]
+
+    def count_flag(self, rows, col):
+        """Nombre de lignes de rows dont le drapeau col est vrai, sans construire de DataFrame"""
+        if col not in self.bits:
+            return 0
+        return int(np.count_nonzero(self.flags[rows] & self.bits[col]))
+
+    def count_values(self, rows, col):
+        """Nombre de valeurs distinctes (hors manquantes) de col parmi rows"""
+        if col not in self.codes:
+            return 0
+        codes = self.codes[col][rows]
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0])))
+
+
+def normalize_keys(values):
+    """Clés de jointure : texte normalisé (Unicode, espaces, casse) haché en uint64"""
+    text = (pd.Series(values, dtype=object).astype(str)
+            .str.normalize('NFKC')
+            .str.strip()
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.casefold())
+    return pd.util.hash_array(text.to_numpy(dtype=object), categorize=False)
+
+
+def carry_keys(previous_keys, source_rows, values):
+    """Clés normalisées de values, reprises de previous_keys pour les lignes inchangées
+
+    source_rows donne pour chaque ligne sa position dans l'univers précédent,
+    ou -1 pour une ligne nouvelle ou modifiée (voir mdb_data.StocksDelta).
+    """
+    keys = np.empty(len(source_rows), dtype=np.uint64)
+    reused = source_rows >= 0
+    keys[reused] = previous_keys[source_rows[reused]]
+    fresh = np.flatnonzero(~reused)
+    if len(fresh):
+        keys[fresh] = normalize_keys(values.iloc[fresh])
+    return keys
+
+
+class SetupMembership:
+    """Matrice d'appartenance des lignes de l'univers aux setups
+
+    Une colonne booléenne par setup, alignée sur les lignes de l'univers. La
+    jointure se fait sur le Symbol normalisé quand le fichier du setup en
+    fournit, sinon sur le Name normalisé.
+    """
+
+    def __init__(self, df, setup_results, universe_keys=None):
+        # setup_results : nom du setup -> {"names": [...], "symbols": [...] ou None, ...}
+        # universe_keys : clés normalisées de l'univers déjà calculées, par colonne
+        self.results = setup_results
+        self.setups = list(setup_results)
+        self.matrix = np.zeros((len(df), len(self.setups)), dtype=bool, order='F')
+        self.unmatched = {}
+        self.universe_keys = dict(universe_keys or {})
+
+        universe_keys = self.universe_keys
+        # Tables de hachage construites une fois par colonne plutôt qu'un tri par setup
+        universe_index = {}
+        universe_lookup = {}
+        for j, (setup_name, result) in enumerate(setup_results.items()):
+            col, values = ('Symbol', result.get("symbols")) if result.get("symbols") \
+                else ('Name', result.get("names") or [])
+            if col not in universe_keys:
+                universe_keys[col] = normalize_keys(df[col]) if col in df.columns \
+                    else np.empty(0, dtype=np.uint64)
+            if col not in universe_index:
+                universe_index[col] = pd.Index(universe_keys[col])
+                universe_lookup[col] = pd.Index(pd.unique(universe_keys[col]))
+            setup_keys = normalize_keys(values)
+            self.matrix[:, j] = universe_index[col].isin(setup_keys)
+            self.unmatched[setup_name] = int(
+                (universe_lookup[col].get_indexer(setup_keys) < 0).sum())
+        # Nombre de lignes par setup, pour estimer la sélectivité des filtres (mdb_query)
+        self.counts = self.matrix.sum(axis=0)
+
+    def filter_rows(self, selected_setups):
+        """Positions retenues par le filtre des setups, ou None s'il ne filtre rien
+
+        Comme dans l'application : si aucun des setups sélectionnés n'a de
+        résultats, le filtre est ignoré plutôt que de tout exclure.
+        """
+        selected = [s for s in selected_setups if s in self.results]
+        if not any(self.results[s]["names"] for s in selected):
+            return None
+        return self.rows_for(selected)
+
+    def rows_for(self, selected_setups):
+        """Positions triées des lignes présentes dans au moins un des setups"""
+        columns = [self.setups.index(s) for s in selected_setups if s in self.setups]
+        if not columns:
+            return np.empty(0, dtype=np.intp)
+        mask = self.matrix[:, columns[0]].copy()
+        for j in columns[1:]:
+            mask |= self.matrix[:, j]
+        return np.flatnonzero(mask)
@@ -0,0 +1,398 @@
+"""Calcul local des setups du screener à partir d'un panel OHLCV
+
+Les indicateurs sont calculés pour tous les tickers à la fois, sur des matrices
+dates x tickers : une ligne par séance, une colonne par Symbol. Chaque setup
+produit une matrice booléenne de signaux ; le screening retient la dernière
+séance (ou la séance as_of), le backtest utilise toutes les séances.
+
+Utilisation en ligne de commande :
+
+    python mdb_indicators.py panel.parquet --output-dir setups/ --compare
+
+Le panel est un fichier Parquet ou CSV au format long : une ligne par séance
+et par ticker, avec les colonnes Date, Symbol, Open, High, Low et Close.
+"""
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from mdb_data import (fetch_screener_config, fetch_screener_results, fetch_stocks_data,
+                      setup_output_files)
+
+# Paramètres des indicateurs
+SMA_PERIOD = 200
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+WMA_PERIOD = 12
+SUPERTREND_PERIOD = 10
+SUPERTREND_MULTIPLIER = 3.0
+
+PANEL_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+
+@dataclass
+class OHLCVPanel:
+    """Cours alignés : matrices float (séances x tickers), NaN pour les séances manquantes"""
+    dates: pd.DatetimeIndex
+    symbols: pd.Index
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    @classmethod
+    def from_long(cls, df):
+        """Panel à partir d'un DataFrame long (Date, Symbol, Open, High, Low, Close)"""
+        df = df.assign(Date=pd.to_datetime(df['Date']))
+        wide = df.pivot_table(index='Date', columns='Symbol', values=PANEL_COLUMNS,
+                              aggfunc='last').sort_index()
+        symbols = wide.columns.get_level_values('Symbol').unique()
+        arrays = {
+            col.lower(): wide[col].reindex(columns=symbols).to_numpy(dtype=float)
+            for col in PANEL_COLUMNS
+        }
+        return cls(wide.index, pd.Index(symbols), **arrays)
+
+    def take(self, columns):
+        """Sous-panel limité à certaines colonnes (tickers), par positions"""
+        return OHLCVPanel(self.dates, self.symbols[columns], self.open[:, columns],
+                          self.high[:, columns], self.low[:, columns], self.close[:, columns])
+
+
+def load_panel(path, symbols=None):
+    """Lit un panel OHLCV au format long (Parquet, ou CSV séparé par ';')
+
+    Avec symbols, seuls ces tickers sont chargés (filtre appliqué à la lecture
+    pour le Parquet).
+    """
+    columns = ['Date', 'Symbol'] + PANEL_COLUMNS
+    if path.endswith(".parquet"):
+        filters = None if symbols is None else [('Symbol', 'in', list(symbols))]
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        df = pd.read_csv(path, sep=';', usecols=columns)
+        if symbols is not None:
+            df = df[df['Symbol'].isin(symbols)]
+    return OHLCVPanel.from_long(df)
+
+
+def panel_symbols(path):
+    """Tickers présents dans un panel, sans charger les cours"""
+    if path.endswith(".parquet"):
+        symbols = pd.read_parquet(path, columns=['Symbol'])['Symbol']
+    else:
+        symbols = pd.read_csv(path, sep=';', usecols=['Symbol'])['Symbol']
+    return sorted(symbols.dropna().astype(str).unique())
+
+
+def sma(values, period):
+    return pd.DataFrame(values).rolling(period, min_periods=period).mean().to_numpy()
+
+
+def ema(values, span):
+    return pd.DataFrame(values).ewm(span=span, adjust=False, min_periods=span).mean().to_numpy()
+
+
+def rma(values, period):
+    """Moyenne lissée de Wilder (ATR, RSI) ; les séances manquantes sont ignorées"""
+    return pd.DataFrame(values).ewm(alpha=1 / period, adjust=False, ignore_na=True,
+                                    min_periods=period).mean().to_numpy()
+
+
+def wma(values, period):
+    """Moyenne pondérée linéairement (poids 1 à period, le plus fort sur la dernière séance)"""
+    weights = np.arange(1, period + 1, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if len(values) >= period:
+        windows = sliding_window_view(values, period, axis=0)
+        result[period - 1:] = windows @ weights / weights.sum()
+    return result
+
+
+def true_range(high, low, close):
+    # Clôture de la dernière séance cotée, pour franchir les trous de cotation
+    previous_close = pd.DataFrame(close).ffill().shift(1).to_numpy()
+    with np.errstate(invalid='ignore'):
+        return np.fmax(high - low, np.fmax(np.abs(high - previous_close),
+                                           np.abs(low - previous_close)))
+
+
+def supertrend(high, low, close, period=SUPERTREND_PERIOD, multiplier=SUPERTREND_MULTIPLIER):
+    """SuperTrend de tous les tickers ; renvoie (ligne, tendance haussière)
+
+    La récurrence des bandes impose une boucle sur les séances, vectorisée sur
+    les tickers.
+    """
+    atr = rma(true_range(high, low, close), period)
+    middle = (high + low) / 2
+    basic_upper = middle + multiplier * atr
+    basic_lower = middle - multiplier * atr
+
+    n_dates, n_tickers = close.shape
+    line = np.full((n_dates, n_tickers), np.nan)
+    bullish = np.zeros((n_dates, n_tickers), dtype=bool)
+    upper = np.full(n_tickers, np.nan)
+    lower = np.full(n_tickers, np.nan)
+    trend_up = np.zeros(n_tickers, dtype=bool)
+    previous_close = np.full(n_tickers, np.nan)
+
+    with np.errstate(invalid='ignore'):
+        for t in range(n_dates):
+            # Les tickers sans séance ce jour-là gardent leur état
+            quoted = ~np.isnan(close[t])
+            # Bandes finales : elles ne s'éloignent du cours que si le cours les a franchies
+            reset_upper = np.isnan(upper) | (basic_upper[t] < upper) | (previous_close > upper)
+            upper = np.where(quoted & reset_upper, basic_upper[t], upper)
+            reset_lower = np.isnan(lower) | (basic_lower[t] > lower) | (previous_close < lower)
+            lower = np.where(quoted & reset_lower, basic_lower[t], lower)
+            valid = quoted & ~np.isnan(atr[t])
+            new_trend = np.where(trend_up, ~(close[t] < lower), close[t] > upper) & valid
+            trend_up = np.where(quoted, new_trend, trend_up)
+            line[t] = np.where(valid, np.where(trend_up, lower, upper), np.nan)
+            bullish[t] = trend_up & valid
+            previous_close = np.where(quoted, close[t], previous_close)
+    return line, bullish
+
+
+def weekly_bars(panel):
+    """Barres hebdomadaires (semaine close le vendredi) et numéro de semaine de chaque séance"""
+    week = panel.dates.to_period('W-FRI')
+    frames = {
+        'high': pd.DataFrame(panel.high).groupby(week).max(),
+        'low': pd.DataFrame(panel.low).groupby(week).min(),
+        'close': pd.DataFrame(panel.close).groupby(week).last(),
+    }
+    week_codes = pd.Index(frames['close'].index).get_indexer(week)
+    return {k: v.to_numpy(dtype=float) for k, v in frames.items()}, week_codes
+
+
+def _crossed_up(values, reference):
+    """Au-dessus de reference à la séance, en dessous ou égal à la précédente"""
+    with np.errstate(invalid='ignore'):
+        above = values > reference
+        below = values <= reference
+    was_below = np.vstack([np.zeros((1, below.shape[1]), dtype=bool), below[:-1]])
+    return above & was_below
+
+
+class Indicators:
+    """Indicateurs d'un panel, calculés à la première utilisation et partagés entre setups"""
+
+    def __init__(self, panel):
+        self.panel = panel
+
+    @cached_property
+    def sma200(self):
+        return sma(self.panel.close, SMA_PERIOD)
+
+    @cached_property
+    def mm200_cross_up(self):
+        return _crossed_up(self.panel.close, self.sma200)
+
+    @cached_property
+    def macd_up(self):
+        macd = ema(self.panel.close, MACD_FAST) - ema(self.panel.close, MACD_SLOW)
+        signal = pd.DataFrame(macd).ewm(span=MACD_SIGNAL, adjust=False,
+                                        min_periods=MACD_SIGNAL).mean().to_numpy()
+        with np.errstate(invalid='ignore'):
+            return macd > signal
+
+    @cached_property
+    def wma12_up(self):
+        values = wma(self.panel.close, WMA_PERIOD)
+        previous = np.vstack([np.full((1, values.shape[1]), np.nan), values[:-1]])
+        with np.errstate(invalid='ignore'):
+            return values > previous
+
+    @cached_property
+    def daily_supertrend(self):
+        return supertrend(self.panel.high, self.panel.low, self.panel.close)
+
+    @cached_property
+    def weekly_supertrend(self):
+        """SuperTrend hebdomadaire ramené sur les séances ; (ligne, haussier, fin de semaine)
+
+        La valeur d'une séance est celle de sa semaine arrêtée à cette séance pour
+        la dernière séance de chaque semaine, celle de la semaine précédente sinon :
+        pas de regard vers l'avant dans le backtest.
+        """
+        bars, week_codes = weekly_bars(self.panel)
+        line, bullish = supertrend(bars['high'], bars['low'], bars['close'])
+        week_end = np.append(week_codes[1:] != week_codes[:-1], True)
+        source = np.where(week_end, week_codes, week_codes - 1)
+        daily_line = np.where((source >= 0)[:, None], line[np.maximum(source, 0)], np.nan)
+        daily_bullish = np.where((source >= 0)[:, None], bullish[np.maximum(source, 0)], False)
+        return daily_line, daily_bullish, week_end
+
+    @cached_property
+    def weekly_supertrend_cross(self):
+        _, bullish, week_end = self.weekly_supertrend
+        flipped = np.zeros_like(bullish)
+        ends = np.flatnonzero(week_end)
+        # Changement de tendance d'une fin de semaine à la suivante
+        flipped[ends[1:]] = bullish[ends[1:]] & ~bullish[ends[:-1]]
+        return flipped
+
+    def new_high(self, days):
+        """Plus haut de la séance supérieur aux plus hauts des days séances précédentes"""
+        previous_max = pd.DataFrame(self.panel.high).shift(1).rolling(
+            days, min_periods=days).max().to_numpy()
+        with np.errstate(invalid='ignore'):
+            return self.panel.high > previous_max
+
+
+# Signaux des setups de la configuration, par nom de setup
+SETUP_SIGNALS = {
+    "MM200_Cross_Up": lambda ind: ind.mm200_cross_up,
+    "MM200_Cross_Up_MACD_Up": lambda ind: ind.mm200_cross_up & ind.macd_up,
+    "MM200_Cross_Up_WMA12_Up": lambda ind: ind.mm200_cross_up & ind.wma12_up,
+    "Weekly_SuperTrend_Cross": lambda ind: ind.weekly_supertrend_cross,
+    "Above_Weekly_Below_Daily_SuperTrend": lambda ind: _between_supertrends(ind),
+    "new_high_50_days": lambda ind: ind.new_high(50),
+    "new_high_100_days": lambda ind: ind.new_high(100),
+    "new_high_200_days": lambda ind: ind.new_high(200),
+}
+
+
+def _between_supertrends(ind):
+    weekly_line, weekly_bullish, _ = ind.weekly_supertrend
+    daily_line, daily_bullish = ind.daily_supertrend
+    with np.errstate(invalid='ignore'):
+        return (weekly_bullish & (ind.panel.close > weekly_line)
+                & ~daily_bullish & (ind.panel.close < daily_line))
+
+
+# Les noms de la configuration sont comparés sans tenir compte de la casse
+_SIGNALS_BY_KEY = {name.lower(): signal for name, signal in SETUP_SIGNALS.items()}
+
+
+def compute_signals(panel, setup_names=None):
+    """Matrices booléennes (séances x tickers) des setups demandés (tous par défaut)"""
+    indicators = Indicators(panel)
+    names = SETUP_SIGNALS if setup_names is None else setup_names
+    return {name: _SIGNALS_BY_KEY[name.lower()](indicators) for name in names
+            if name.lower() in _SIGNALS_BY_KEY}
+
+
+def screen_panel(panel, setup_names=None, universe=None, as_of=None):
+    """Résultats des setups à la séance as_of (la dernière par défaut)
+
+    Même format que mdb_data.parse_screener_results ; les noms viennent de
+    l'univers (Symbol -> Name) quand il est fourni, sinon le Symbol sert de nom.
+    Lève ValueError si as_of précède la première séance du panel.
+    """
+    row = -1
+    if as_of is not None:
+        row = panel.dates.get_indexer([pd.Timestamp(as_of)], method='pad')[0]
+        # -1 : aucune séance au plus tard à as_of (et non la dernière séance)
+        if row < 0:
+            first = panel.dates[0].date() if len(panel.dates) else None
+            raise ValueError(f"Aucune séance au {pd.Timestamp(as_of).date()} ou avant : "
+                             f"première séance disponible le {first}")
+    names_by_symbol = {}
+    if universe is not None:
+        names_by_symbol = dict(zip(universe['Symbol'].astype(str), universe['Name'].astype(str)))
+
+    results = {}
+    for name, signals in compute_signals(panel, setup_names).items():
+        symbols = panel.symbols[signals[row]].astype(str).tolist()
+        results[name] = {
+            "names": [names_by_symbol.get(s, s) for s in symbols],
+            "symbols": symbols,
+            "columns": ['Name', 'Symbol']
+        }
+    return results
+
+
+def compute_screener_results(panel, config, universe=None):
+    """Équivalent local de mdb_data.fetch_screener_results pour les setups de config"""
+    start = time.perf_counter()
+    setup_files = setup_output_files(config)
+    screened = screen_panel(panel, list(setup_files), universe)
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for setup_name, output_file in setup_files.items():
+        result = {
+            "output_file": output_file,
+            "names": [],
+            "symbols": None,
+            "columns": None,
+            "status_code": None,
+            "elapsed": elapsed,
+            "error": None,
+            "cache_status": "local",
+            "version": None,
+            "quarantined": []
+        }
+        if setup_name in screened:
+            result.update(screened[setup_name], status_code=200)
+        else:
+            result["error"] = f"Setup {setup_name} non calculable localement"
+        results[output_file] = result
+    return results
+
+
+def setup_csv(result):
+    """Texte CSV d'un résultat de setup, au format des fichiers du gist"""
+    return pd.DataFrame({'Name': result["names"], 'Symbol': result["symbols"]}).to_csv(
+        index=False, sep=';')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calcule les setups du screener à partir d'un panel OHLCV local")
+    parser.add_argument("panel", help="panel OHLCV au format long (.parquet ou .csv)")
+    parser.add_argument("-o", "--output-dir", default="setups",
+                        help="répertoire des fichiers de résultats (défaut : setups)")
+    parser.add_argument("--as-of", default=None, help="séance du screening (défaut : la dernière)")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare les résultats à ceux téléchargés depuis le gist")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    panel = load_panel(args.panel)
+    print(f"Panel chargé : {len(panel.symbols)} tickers x {len(panel.dates)} séances en "
+          f"{time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+    config = fetch_screener_config()
+    try:
+        universe = fetch_stocks_data()
+    except Exception as e:
+        print(f"Univers indisponible, les symboles servent de noms : {e}", file=sys.stderr)
+        universe = None
+
+    start = time.perf_counter()
+    setup_files = setup_output_files(config)
+    results = screen_panel(panel, list(setup_files), universe, args.as_of)
+    print(f"{len(results)} setups calculés en {time.perf_counter() - start:.2f} s",
+          file=sys.stderr)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for setup_name, result in results.items():
+        path = os.path.join(args.output_dir, setup_files[setup_name])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(setup_csv(result))
+        print(f"{setup_name}\t{len(result['names'])}\t{path}")
+
+    if args.compare:
+        downloaded = fetch_screener_results(tuple(setup_files[s] for s in results))
+        for setup_name, result in results.items():
+            remote = downloaded[setup_files[setup_name]]
+            if remote["error"]:
+                print(f"{setup_name}: comparaison impossible ({remote['error']})")
+                continue
+            local, reference = set(result["names"]), set(remote["names"])
+            print(f"{setup_name}: {len(local & reference)} communs, "
+                  f"{len(local - reference)} en plus, {len(reference - local)} manquants")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
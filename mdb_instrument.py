@@ -0,0 +1,198 @@
+"""Instrumentation optionnelle des étapes du screener (MDB_INSTRUMENT=1)
+
+Chaque étape décorée par instrumented() produit un enregistrement : durée,
+pic d'allocation (tracemalloc), octets téléchargés, statut des caches. Les
+enregistrements sont émis en lignes JSON sur le logger "mdb.instrument" et
+conservés pour le panneau de diagnostic de la sidebar.
+
+Sans la variable d'environnement, instrumented() renvoie les fonctions
+telles quelles : aucun coût à l'exécution.
+
+tracemalloc ne suit qu'un pic pour tout le processus : il est reporté sur
+les étapes ouvertes de tous les threads avant chaque remise à zéro. Le pic
+d'une étape est exact quand une seule session s'exécute ; si une étape
+d'un autre thread l'a chevauchée, il inclut aussi les allocations de
+celui-ci (majorant) et l'enregistrement porte "concurrent": true.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+ENABLED = os.environ.get("MDB_INSTRUMENT", "").lower() not in ("", "0", "false", "no")
+
+# Derniers enregistrements du processus, toutes sessions confondues
+RECENT_RECORDS = deque(maxlen=500)
+
+logger = logging.getLogger("mdb.instrument")
+
+_local = threading.local()
+
+# Piles d'étapes ouvertes de chaque thread, pour leur reporter le pic global
+_open_stacks = {}
+_peak_lock = threading.Lock()
+
+if ENABLED:
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class _Frame:
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = time.perf_counter()
+        self.start_memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        self.peak = self.start_memory
+        self.bytes_downloaded = 0
+        self.http_cache = {}
+        self.executed = False
+        # Vrai si une étape d'un autre thread était ouverte pendant celle-ci
+        self.concurrent = False
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+        with _peak_lock:
+            _open_stacks[threading.get_ident()] = _local.stack
+    return _local.stack
+
+
+def _release_stack():
+    # Pile vide : retirée du registre, qui sinon garderait une entrée par thread terminé
+    with _peak_lock:
+        _open_stacks.pop(threading.get_ident(), None)
+    del _local.stack
+
+
+def _sync_peak(closing=None):
+    # tracemalloc n'a qu'un pic global : on le reporte sur les étapes ouvertes de tous les
+    # threads (et sur closing, qui vient d'être retirée) avant de le remettre à zéro
+    if not tracemalloc.is_tracing():
+        return
+    with _peak_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        busy = [stack for stack in _open_stacks.values() if stack]
+        frames = [frame for stack in busy for frame in stack]
+        if closing is not None:
+            frames.append(closing)
+            if not _local.stack:
+                busy.append([closing])
+        for frame in frames:
+            frame.peak = max(frame.peak, peak)
+            if len(busy) > 1:
+                frame.concurrent = True
+        tracemalloc.reset_peak()
+
+
+def begin_run():
+    """Démarre la collecte des enregistrements du rerun courant (thread du script)"""
+    _local.run_records = []
+
+
+def run_records():
+    """Enregistrements collectés depuis le dernier begin_run() dans ce thread"""
+    return list(getattr(_local, "run_records", []))
+
+
+def record_fetch(result):
+    """Attribue un téléchargement (mdb_http.FetchResult) à l'étape en cours"""
+    stack = getattr(_local, "stack", None) if ENABLED else None
+    if not stack:
+        return
+    # Les étapes englobantes en héritent à la sortie de celle-ci
+    frame = stack[-1]
+    frame.bytes_downloaded += result.nbytes
+    frame.http_cache[result.cache_status] = frame.http_cache.get(result.cache_status, 0) + 1
+
+
+def _mark_executed(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stack = getattr(_local, "stack", None)
+        if stack:
+            stack[-1].executed = True
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def instrumented(stage, cache=None):
+    """Décorateur d'étape ; cache est un décorateur de cache (st.cache_data...) à instrumenter
+
+    Avec cache, l'enregistrement indique si l'appel a été servi par le cache.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return cache(func) if cache else func
+
+        inner = cache(_mark_executed(func)) if cache else func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = _stack()
+            _sync_peak()
+            frame = _Frame(stage)
+            stack.append(frame)
+            try:
+                return inner(*args, **kwargs)
+            finally:
+                stack.pop()
+                _sync_peak(frame)
+                for parent in stack:
+                    parent.bytes_downloaded += frame.bytes_downloaded
+                    for status, count in frame.http_cache.items():
+                        parent.http_cache[status] = parent.http_cache.get(status, 0) + count
+                if not stack:
+                    _release_stack()
+                _emit(frame, cache is not None)
+        return wrapper
+    return decorator
+
+
+def _emit(frame, cached):
+    record = {
+        "ts": time.time(),
+        "stage": frame.stage,
+        "wall_ms": round((time.perf_counter() - frame.start) * 1000, 3),
+        "peak_alloc_kb": round((frame.peak - frame.start_memory) / 1024, 1),
+        "bytes_downloaded": frame.bytes_downloaded,
+        "http_cache": frame.http_cache,
+        "cache": ("miss" if frame.executed else "hit") if cached else None,
+        "concurrent": frame.concurrent,
+        "thread": threading.current_thread().name
+    }
+    _publish(record)
+
+
+def record(stage, wall_ms, **fields):
+    """Enregistre une mesure prise hors d'une fonction décorée (démarrage, premier affichage)"""
+    if not ENABLED:
+        return
+    _publish(dict({
+        "ts": time.time(),
+        "stage": stage,
+        "wall_ms": round(wall_ms, 3),
+        "peak_alloc_kb": 0.0,
+        "bytes_downloaded": 0,
+        "http_cache": {},
+        "cache": None,
+        "concurrent": False,
+        "thread": threading.current_thread().name
+    }, **fields))
+
+
+def _publish(record):
+    RECENT_RECORDS.append(record)
+    if hasattr(_local, "run_records"):
+        _local.run_records.append(record)
+    logger.info(json.dumps(record))
@@ -0,0 +1,270 @@
+"""Expressions booléennes sur les setups, les styles, le PEA, le marché et le secteur
+
+Exemple : MM200_Cross_Up AND new_high_50_days AND NOT small AND (qual OR value)
+
+Termes : nom d'un setup ou d'une colonne de drapeau (styles, PEA, PEA-PME),
+market:<valeur> et sector:<valeur> (entre guillemets si la valeur contient
+des espaces). Opérateurs : NOT (!), AND (&), OR (|) et parenthèses, sans
+distinction de casse ; NOT est prioritaire sur AND, lui-même prioritaire
+sur OR.
+
+Le planificateur évalue les termes d'un AND du plus sélectif au moins
+sélectif, chacun sur les seules lignes encore candidates, et s'arrête dès
+qu'il n'en reste plus ; ceux d'un OR, du plus large au plus étroit, sur les
+seules lignes pas encore retenues. Les cardinalités viennent des index de
+l'instantané (FilterIndex, SetupMembership) : aucun terme n'est évalué pour
+les estimer.
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+_TOKEN = re.compile(r"""\s*(?:(?P<op>[()&|!:])|"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<word>[^\s()&|!:"']+))""")
+_KEYWORDS = {'and': '&', 'or': '|', 'not': '!'}
+
+
+class QueryError(ValueError):
+    """Expression mal formée ou terme inconnu"""
+
+
+@dataclass(frozen=True)
+class Term:
+    # kind : 'setup', 'flag', 'Market' ou 'Sector' ; key : nom du setup, colonne ou valeur
+    kind: str
+    key: str
+
+    @property
+    def label(self):
+        return self.key if self.kind in ('setup', 'flag') else f"{self.kind.lower()}:{self.key}"
+
+
+@dataclass(frozen=True)
+class Not:
+    child: object
+
+
+@dataclass(frozen=True)
+class And:
+    children: tuple
+
+
+@dataclass(frozen=True)
+class Or:
+    children: tuple
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise QueryError(f"Caractère inattendu en position {position + 1}")
+        if match.group('op'):
+            tokens.append(('op', match.group('op')))
+        elif match.group('word') and match.group('word').lower() in _KEYWORDS:
+            tokens.append(('op', _KEYWORDS[match.group('word').lower()]))
+        else:
+            value = match.group('word')
+            if value is None:
+                value = match.group('dq') if match.group('dq') is not None else match.group('sq')
+            tokens.append(('name', value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Descente récursive : or := and ('|' and)* ; and := not ('&' not)* ; not := '!' not | atom"""
+
+    def __init__(self, tokens, resolve):
+        self.tokens = tokens
+        self.position = 0
+        self.resolve = resolve
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token != ('op', value)):
+            expected = f"« {value} »" if value else "Un terme"
+            found = f"« {token[1]} »" if token[0] else "la fin de l'expression"
+            raise QueryError(f"{expected} attendu, {found} trouvé")
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            raise QueryError(f"« {self.peek()[1]} » inattendu : opérateur AND ou OR manquant ?")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ('op', '|'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(_flatten(Or, children))
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() == ('op', '&'):
+            self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(_flatten(And, children))
+
+    def parse_not(self):
+        if self.peek() == ('op', '!'):
+            self.take()
+            child = self.parse_not()
+            return child.child if isinstance(child, Not) else Not(child)
+        return self.parse_atom()
+
+    def parse_atom(self):
+        if self.peek() == ('op', '('):
+            self.take()
+            node = self.parse_or()
+            self.take(')')
+            return node
+        kind, name = self.take()
+        if kind != 'name':
+            raise QueryError(f"Terme attendu, « {name} » trouvé")
+        if self.peek() == ('op', ':'):
+            self.take()
+            kind, value = self.take()
+            if kind != 'name':
+                raise QueryError(f"Valeur attendue après « {name}: »")
+            return self.resolve(name, value)
+        return self.resolve(None, name)
+
+
+def _flatten(cls, children):
+    # (a AND b) AND c devient AND(a, b, c)
+    flat = []
+    for child in children:
+        flat.extend(child.children if isinstance(child, cls) else [child])
+    return tuple(flat)
+
+
+class QueryPlanner:
+    """Analyse et évalue les expressions sur un instantané (FilterIndex et SetupMembership)"""
+
+    def __init__(self, index, membership):
+        self.index = index
+        self.membership = membership
+        self.n_rows = index.n_rows
+        self._setups = {name.casefold(): name for name in membership.setups}
+        self._flags = {col.casefold(): col for col in index.bits}
+        self._values = {col: {str(v).casefold(): v for v in index.categories[col]}
+                        for col in index.categories}
+
+    def parse(self, expression):
+        """Arbre de l'expression ; lève QueryError si elle est mal formée"""
+        tokens = _tokenize(expression)
+        if not tokens:
+            raise QueryError("Expression vide")
+        return _Parser(tokens, self._resolve).parse()
+
+    def _resolve(self, prefix, name):
+        if prefix is not None:
+            col = {'market': 'Market', 'sector': 'Sector'}.get(prefix.casefold())
+            if col is None:
+                raise QueryError(f"Préfixe inconnu « {prefix}: » (market: ou sector:)")
+            value = self._values.get(col, {}).get(name.casefold())
+            if value is None:
+                raise QueryError(f"Valeur inconnue pour {prefix}: « {name} »")
+            return Term(col, value)
+        folded = name.casefold()
+        if folded in self._setups:
+            return Term('setup', self._setups[folded])
+        if folded in self._flags:
+            return Term('flag', self._flags[folded])
+        raise QueryError(f"Terme inconnu « {name} » : setup, style, PEA, PEA-PME, "
+                         "market:<valeur> ou sector:<valeur> attendu")
+
+    def cardinality(self, node):
+        """Nombre estimé de lignes de l'univers satisfaisant node"""
+        if isinstance(node, Term):
+            if node.kind == 'setup':
+                return int(self.membership.counts[self.membership.setups.index(node.key)])
+            if node.kind == 'flag':
+                return self.index.flag_counts[node.key]
+            return len(self.index.postings[node.kind][node.key])
+        if isinstance(node, Not):
+            return self.n_rows - self.cardinality(node.child)
+        estimates = [self.cardinality(child) for child in node.children]
+        return min(estimates) if isinstance(node, And) else min(self.n_rows, sum(estimates))
+
+    def evaluate(self, node, rows=None, trace=None):
+        """Positions triées des lignes de rows (de l'univers si None) satisfaisant node
+
+        trace, si fourni, reçoit (terme, cardinalité estimée, lignes examinées)
+        pour chaque terme évalué, dans l'ordre d'évaluation.
+        """
+        if isinstance(node, Term):
+            return self._evaluate_term(node, rows, trace)
+
+        base = np.arange(self.n_rows) if rows is None else rows
+        if isinstance(node, Not):
+            return _remove(base, self.evaluate(node.child, base, trace))
+
+        if isinstance(node, And):
+            # Du plus sélectif au moins sélectif, sur les lignes encore candidates
+            for child in sorted(node.children, key=self.cardinality):
+                rows = self.evaluate(child, rows, trace)
+                if len(rows) == 0:
+                    break
+            return rows
+
+        # OR : du plus large au plus étroit, sur les lignes pas encore retenues
+        matched = []
+        remaining = base
+        for child in sorted(node.children, key=self.cardinality, reverse=True):
+            hit = self.evaluate(child, remaining, trace)
+            matched.append(hit)
+            remaining = _remove(remaining, hit)
+            if len(remaining) == 0:
+                break
+        return np.sort(np.concatenate(matched)) if len(matched) > 1 else matched[0]
+
+    def _evaluate_term(self, term, rows, trace):
+        if trace is not None:
+            trace.append((term.label, self.cardinality(term),
+                          self.n_rows if rows is None else len(rows)))
+        if term.kind == 'setup':
+            column = self.membership.matrix[:, self.membership.setups.index(term.key)]
+            return np.flatnonzero(column) if rows is None else rows[column[rows]]
+        if term.kind == 'flag':
+            bit = self.index.bits[term.key]
+            if rows is None:
+                return np.flatnonzero(self.index.flags & bit)
+            return rows[(self.index.flags[rows] & bit) != 0]
+        if rows is None:
+            return self.index.postings[term.kind][term.key]
+        code = self.index.categories[term.kind].index(term.key)
+        return rows[self.index.codes[term.kind][rows] == code]
+
+    def filter_rows(self, expression, rows=None, trace=None):
+        """Positions des lignes de rows satisfaisant expression ; lève QueryError
+
+        Un OR de setups seuls suit le filtre des setups de la sidebar : si aucun
+        n'a de résultats, il ne filtre rien.
+        """
+        node = self.parse(expression)
+        setups = [node] if isinstance(node, Term) else list(getattr(node, 'children', []))
+        if isinstance(node, (Term, Or)) and all(isinstance(t, Term) and t.kind == 'setup'
+                                                for t in setups):
+            if not any(self.membership.results[t.key]["names"] for t in setups):
+                return np.arange(self.n_rows) if rows is None else rows
+        return self.evaluate(node, rows, trace)
+
+
+def _remove(rows, hit):
+    """rows privé de hit, les deux triés et hit inclus dans rows"""
+    if len(hit) == 0:
+        return rows
+    keep = np.ones(len(rows), dtype=bool)
+    keep[np.searchsorted(rows, hit)] = False
+    return rows[keep]
@@ -0,0 +1,214 @@
+"""Rafraîchissement en arrière-plan des données du screener (stale-while-revalidate)
+
+Un thread du processus reconstruit périodiquement l'instantané (configuration,
+univers indexé, appartenance aux setups, historique) hors du chemin des requêtes, puis le
+substitue d'un seul coup au précédent. Les sessions lisent toujours le dernier
+instantané valide, y compris quand les gists sont injoignables. Les résultats
+mis en cache pour les versions précédentes (mdb_results) sont alors retirés.
+
+Avec MDB_OHLCV_PANEL, les setups sont calculés à partir de ce panel local
+(mdb_indicators) au lieu d'être téléchargés.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from mdb_data import (StocksDelta, StocksTable, fetch_screener_config,
+                      fetch_screener_results, fetch_stocks_table, setup_output_files)
+from mdb_history import (MembershipHistory, get_history, history_date, snapshot_members,
+                         stock_keys)
+from mdb_http import CACHE_TTL
+from mdb_index import FilterIndex, SetupMembership, carry_keys
+from mdb_instrument import instrumented
+from mdb_results import get_result_cache
+from mdb_search import SearchIndex
+
+# Intervalle entre deux rafraîchissements en secondes (0 : pas de thread de fond)
+REFRESH_INTERVAL = float(os.environ.get("MDB_REFRESH_INTERVAL", str(CACHE_TTL)))
+
+# Panel OHLCV local : les setups y sont calculés au lieu d'être téléchargés du gist
+OHLCV_PANEL = os.environ.get("MDB_OHLCV_PANEL") or None
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """État complet et immuable des données servies aux sessions"""
+    # Empreinte de la configuration, de l'univers et des fichiers des setups
+    version: str
+    universe_version: str
+    config: dict
+    index: FilterIndex
+    membership: SetupMembership
+    search: SearchIndex
+    # Historique d'appartenance (mdb_history) et identifiants des lignes de l'univers
+    history: MembershipHistory
+    stock_ids: np.ndarray
+    # Univers avec les empreintes de ses lignes, et différences avec la version précédente
+    stocks: StocksTable
+    delta: StocksDelta
+    # Construction de cette version, puis dernière vérification auprès des sources
+    built_at: float
+    checked_at: float
+
+    @property
+    def df(self):
+        return self.index.df
+
+
+def _digest(parts):
+    return hashlib.sha1("\n".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+
+
+@instrumented("build_snapshot")
+def build_snapshot(previous=None, progress=None):
+    """Télécharge les sources et construit l'instantané suivant
+
+    Les parties inchangées depuis previous sont réutilisées ; un setup dont le
+    téléchargement échoue garde son dernier résultat valide. Lève une exception
+    si l'univers ne peut pas être chargé. progress reçoit un message par étape.
+    """
+    progress = progress or (lambda message: None)
+    config = fetch_screener_config()
+    setup_files = setup_output_files(config)
+    progress(f"⚙️ Configuration : {len(setup_files)} setups")
+    response, stocks, delta = fetch_stocks_table(previous.stocks if previous else None)
+    if delta is not None:
+        progress(f"📈 Univers : {len(stocks.df)} actions (+{len(delta.inserted)} "
+                 f"~{len(delta.updated)} -{len(delta.deleted)})")
+    else:
+        progress(f"📈 Univers : {len(stocks.df)} actions ({response.cache_status})")
+    if OHLCV_PANEL:
+        # Import différé : le moteur d'indicateurs n'est utile qu'avec un panel local
+        from mdb_indicators import compute_screener_results, load_panel
+        results = compute_screener_results(load_panel(OHLCV_PANEL), config, stocks.df)
+    else:
+        results = fetch_screener_results(tuple(sorted(set(setup_files.values()))))
+    setup_results = {name: results[f] for name, f in setup_files.items()}
+    progress(f"📋 Setups : {sum(1 for r in results.values() if not r['error'])}"
+             f"/{len(results)} fichiers chargés")
+
+    if previous is not None:
+        for name, result in setup_results.items():
+            old = previous.membership.results.get(name)
+            if result["error"] and old is not None and not old["error"] \
+                    and old["output_file"] == result["output_file"]:
+                setup_results[name] = old
+
+    # Sans cache disque, les versions sont recalculées à partir des contenus
+    config_version = _digest([json.dumps(config, sort_keys=True)])
+    universe_version = response.version or _digest([response.text])
+    setup_versions = [(name, r["version"] or _digest([r["names"], r["symbols"]]))
+                      for name, r in sorted(setup_results.items())]
+    version = _digest([config_version, universe_version, setup_versions])
+
+    now = time.time()
+    if previous is not None and previous.version == version:
+        return Snapshot(version, universe_version, previous.config, previous.index,
+                        previous.membership, previous.search, previous.history,
+                        previous.stock_ids, previous.stocks, previous.delta, previous.built_at, now)
+
+    # Index et clés de jointure : repris, mis à jour pour les seules lignes modifiées, ou construits
+    if previous is not None and previous.universe_version == universe_version:
+        index, stocks, delta = previous.index, previous.stocks, previous.delta
+        keys = previous.membership.universe_keys
+        search = previous.search
+        stock_ids = previous.stock_ids
+    else:
+        if delta is not None:
+            index = FilterIndex(stocks.df, previous.index, delta.source_rows)
+            keys = {col: carry_keys(k, delta.source_rows, stocks.df[col])
+                    for col, k in previous.membership.universe_keys.items()
+                    if col in stocks.df.columns}
+        else:
+            index = FilterIndex(stocks.df)
+            keys = None
+        search = SearchIndex(stocks.df)
+        stock_ids = None
+    membership = SetupMembership(index.df, setup_results, keys)
+    progress("🔍 Index de filtrage et de recherche construits")
+
+    # Appartenance du jour ajoutée à l'historique (la dernière de la journée est conservée)
+    history = get_history()
+    if stock_ids is None:
+        stock_ids = history.ids_for(stock_keys(index.df, membership))
+    history.record(history_date(now), snapshot_members(index, membership, stock_ids))
+    return Snapshot(version, universe_version, config, index, membership, search, history,
+                    stock_ids, stocks, delta, now, now)
+
+
+class Refresher:
+    """Détient l'instantané courant et le renouvelle dans un thread de fond"""
+
+    def __init__(self, interval=REFRESH_INTERVAL, builder=build_snapshot):
+        self.interval = interval
+        self.builder = builder
+        self.snapshot = None
+        self.last_error = None
+        self.last_attempt = None
+        self._build_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, progress=None):
+        """Instantané courant ; le premier appel le construit et démarre le thread de fond"""
+        if self.snapshot is None:
+            self.refresh(only_if_missing=True, progress=progress)
+        if self.interval > 0 and self._thread is None:
+            self.start()
+        return self.snapshot
+
+    def refresh(self, only_if_missing=False, progress=None):
+        """Construit un nouvel instantané et le substitue au courant ; True si réussi"""
+        with self._build_lock:
+            # Les sessions arrivées pendant la première construction n'en relancent pas une
+            if only_if_missing and self.snapshot is not None:
+                return True
+            self.last_attempt = time.time()
+            try:
+                snapshot = self.builder(self.snapshot, progress)
+            except Exception as e:
+                # L'instantané précédent reste servi
+                self.last_error = str(e)
+                return False
+            self.last_error = None
+            previous = self.snapshot
+            # Une seule affectation : les lecteurs voient l'ancien ou le nouvel instantané
+            self.snapshot = snapshot
+            if previous is not None and previous.version != snapshot.version:
+                # Les résultats calculés sur l'ancienne version ne seront plus demandés
+                get_result_cache().retain(snapshot.version)
+            return True
+
+    def start(self):
+        """Démarre le thread de rafraîchissement périodique"""
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="mdb-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+
+def get_refresher():
+    """Retourne le rafraîchisseur partagé par toutes les sessions du processus"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = Refresher()
+    return _refresher
@@ -0,0 +1,223 @@
+"""Cache des résultats de filtrage partagé par toutes les sessions du processus
+
+Un état des filtres est identifié par l'empreinte de sa forme canonique
+(FilterSpec.canonical : l'ordre des sélections ne compte pas) et par la
+version de l'instantané. Les positions retenues, les agrégats, les pages
+d'affichage et les exports calculés pour cet état sont conservés dans un
+seul LRU borné en mémoire (MDB_RESULT_CACHE_MB) : une session qui ouvre un
+écran déjà calculé par une autre le reçoit sans rien recalculer. Un nouvel
+instantané retire les entrées des versions précédentes.
+
+Les filtres s'échangent aussi par l'URL (paramètres setup, marche, pea,
+critere, secteur, expr et q) : un lien partagé rouvre le même écran.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from mdb_index import PEA_FILTER_OPTIONS, FilterSpec
+
+# Mémoire maximale occupée par les résultats en cache, en Mo
+RESULT_CACHE_MB = float(os.environ.get("MDB_RESULT_CACHE_MB", "256"))
+
+# Paramètres d'URL des champs de FilterSpec : (paramètre, répété)
+QUERY_PARAMS = {
+    'setups': ("setup", True),
+    'markets': ("marche", True),
+    'pea_filter': ("pea", False),
+    'criteria': ("critere", True),
+    'sector': ("secteur", False),
+    'expression': ("expr", False),
+    'search': ("q", False),
+}
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ResultKey:
+    """Clé d'un état des filtres sur une version de l'instantané"""
+    version: str
+    digest: str
+
+
+def result_key(version, spec):
+    """Clé de cache de spec sur la version donnée, indépendante de l'ordre des sélections"""
+    canonical = json.dumps(asdict(spec.canonical()), sort_keys=True, ensure_ascii=False)
+    return ResultKey(version, hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16])
+
+
+def _nbytes(value):
+    """Taille estimée d'un résultat : tableaux, DataFrames, octets et leurs conteneurs"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """LRU des résultats, borné en octets, avec les succès et échecs par type de résultat
+
+    Les résultats sont partagés entre sessions : ils ne doivent pas être
+    modifiés après leur mise en cache.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._hits = {}
+        self._misses = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, kind, key, compute):
+        """Résultat de kind pour key (tuple commençant par un ResultKey), calculé au besoin
+
+        Deux sessions qui demandent en même temps un résultat absent le
+        calculent chacune ; la seconde remplace simplement la première.
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries.move_to_end((kind, key))
+                self._hits[kind] = self._hits.get(kind, 0) + 1
+                return entry[0]
+            self._misses[kind] = self._misses.get(kind, 0) + 1
+
+        value = compute()
+        size = _nbytes(value)
+        with self._lock:
+            if size > self.max_bytes:
+                # Plus grand que le cache entier : servi sans être conservé
+                return value
+            previous = self._entries.pop((kind, key), None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            self._entries[(kind, key)] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+        return value
+
+    def retain(self, version):
+        """Retire les résultats des versions autres que version (nouvel instantané)"""
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[1][0].version != version]:
+                self.nbytes -= self._entries.pop(entry_key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Par type de résultat : succès, échecs, taux de succès, entrées et mémoire occupée"""
+        with self._lock:
+            kinds = sorted(set(self._hits) | set(self._misses))
+            entries = {kind: [0, 0] for kind in kinds}
+            for (kind, _), (_, size) in self._entries.items():
+                entries[kind][0] += 1
+                entries[kind][1] += size
+            return [{
+                "kind": kind,
+                "hits": self._hits.get(kind, 0),
+                "misses": self._misses.get(kind, 0),
+                "hit_rate": self._hits.get(kind, 0)
+                / max(1, self._hits.get(kind, 0) + self._misses.get(kind, 0)),
+                "entries": entries[kind][0],
+                "mb": entries[kind][1] / 1024 / 1024
+            } for kind in kinds]
+
+
+def get_result_cache():
+    """Retourne le cache de résultats partagé par tout le processus"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+    return _result_cache
+
+
+def cached_result(kind):
+    """Décorateur de cache (voir mdb_instrument.instrumented) sur le cache du processus
+
+    Le premier argument de la fonction est un ResultKey ; comme avec
+    st.cache_data, les arguments dont le nom commence par « _ » ne font pas
+    partie de la clé.
+    """
+    def decorator(func):
+        parameters = list(inspect.signature(func).parameters)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = dict(zip(parameters, args), **kwargs)
+            key = tuple(bound[name] for name in parameters
+                        if name in bound and not name.startswith("_"))
+            return get_result_cache().get_or_compute(
+                kind, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def spec_to_params(spec):
+    """Paramètres d'URL de spec (nom -> liste de valeurs), sans les valeurs par défaut"""
+    default = FilterSpec()
+    params = {}
+    for field, (name, repeated) in QUERY_PARAMS.items():
+        value = getattr(spec, field)
+        if value != getattr(default, field):
+            params[name] = list(value) if repeated else [value]
+    return params
+
+
+def spec_from_params(params):
+    """FilterSpec décrit par des paramètres d'URL (nom -> liste de valeurs)
+
+    Les valeurs inconnues de l'application (setups, marchés, secteurs) sont
+    écartées ensuite par restrict_spec ; un filtre PEA inconnu est ignoré.
+    """
+    values = {}
+    for field, (name, repeated) in QUERY_PARAMS.items():
+        found = [v for v in params.get(name, []) if v]
+        if found:
+            values[field] = tuple(dict.fromkeys(found)) if repeated else found[-1]
+    if values.get('pea_filter') not in (None, *PEA_FILTER_OPTIONS):
+        del values['pea_filter']
+    return FilterSpec(**values)
+
+
+def restrict_spec(spec, setups, markets, criteria, sectors):
+    """spec privé des valeurs que l'application ne propose pas (lien ancien ou modifié)
+
+    Un secteur inconnu redevient « Tous » ; l'expression et la recherche
+    sont gardées telles quelles, l'expression étant validée à l'application.
+    """
+    return replace(
+        spec,
+        setups=tuple(s for s in spec.setups if s in setups),
+        markets=tuple(m for m in spec.markets if m in markets),
+        criteria=tuple(c for c in spec.criteria if c in criteria),
+        sector=spec.sector if spec.sector in sectors else "Tous"
+    )
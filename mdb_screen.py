@@ -0,0 +1,217 @@
+"""Screening sans Streamlit : API screen(spec) et exécution en lot de filtres sauvegardés
+
+Utilisation en ligne de commande :
+
+    python mdb_screen.py filtres.json --output-dir resultats/ --format csv.gz
+
+Le fichier de filtres est une liste JSON d'objets (ou un objet nom -> filtre,
+ou un fichier .jsonl avec un objet par ligne). Chaque filtre reprend les
+champs de FilterSpec : setups, markets, pea_filter, criteria, sector,
+expression (voir mdb_query) et search (voir mdb_search ; les lignes sont
+alors classées par pertinence).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import fields
+
+from mdb_data import (fetch_screener_config, fetch_screener_results,
+                      fetch_stocks_data, setup_output_files)
+from mdb_export import EXPORT_FORMATS, available_formats, write_export
+from mdb_index import PEA_FILTER_OPTIONS, FilterIndex, FilterSpec, SetupMembership
+from mdb_query import QueryError, QueryPlanner
+from mdb_search import SearchIndex
+
+_SPEC_FIELDS = {f.name for f in fields(FilterSpec)}
+
+_default_screener = None
+
+
+class Screener:
+    """Univers chargé une fois, sur lequel on évalue autant de filtres que voulu"""
+
+    def __init__(self, df, config, setup_results):
+        self.config = config
+        self.index = FilterIndex(df)
+        self.membership = SetupMembership(df, setup_results)
+        self.planner = QueryPlanner(self.index, self.membership)
+        self.search = SearchIndex(df)
+
+    @classmethod
+    def load(cls):
+        """Charge la configuration, l'univers et les résultats de tous les setups"""
+        config = fetch_screener_config()
+        df = fetch_stocks_data()
+        setup_files = setup_output_files(config)
+        results = fetch_screener_results(tuple(sorted(set(setup_files.values()))))
+        return cls(df, config, {name: results[f] for name, f in setup_files.items()})
+
+    @property
+    def df(self):
+        return self.index.df
+
+    def rows(self, spec, setup_rows=None):
+        """Positions des lignes retenues par spec, avec les règles de l'application"""
+        if setup_rows is None:
+            setup_rows = self.membership.filter_rows(spec.setups)
+        return self._resolve(spec, setup_rows)
+
+    def _resolve(self, spec, setup_rows):
+        # Filtres de l'index, expression puis recherche, dans l'ordre de l'application
+        rows = self.index.resolve(spec, setup_rows)
+        if spec.expression:
+            rows = self.planner.filter_rows(spec.expression, rows)
+        if spec.search:
+            rows = self.search.search(spec.search, rows)
+        return rows
+
+    def screen(self, spec):
+        """DataFrame des actions retenues par spec"""
+        return self.index.materialize(self.rows(spec))
+
+    def rows_many(self, specs):
+        """Positions retenues pour chaque filtre de specs (dict nom -> FilterSpec)
+
+        Le filtre des setups n'est calculé qu'une fois par combinaison de setups.
+        Lève mdb_query.QueryError si une expression est mal formée.
+        """
+        setup_rows = {}
+        results = {}
+        for name, spec in specs.items():
+            key = frozenset(spec.setups)
+            if key not in setup_rows:
+                setup_rows[key] = self.membership.filter_rows(spec.setups)
+            results[name] = self._resolve(spec, setup_rows[key])
+        return results
+
+
+def get_screener():
+    """Screener par défaut du processus, chargé au premier appel"""
+    global _default_screener
+    if _default_screener is None:
+        _default_screener = Screener.load()
+    return _default_screener
+
+
+def screen(spec, rows_only=False):
+    """Applique spec (FilterSpec ou dict) à l'univers ; renvoie un DataFrame ou des positions"""
+    if isinstance(spec, dict):
+        spec = spec_from_dict(spec)
+    screener = get_screener()
+    if rows_only:
+        return screener.rows(spec)
+    return screener.screen(spec)
+
+
+def spec_from_dict(data):
+    """Construit un FilterSpec à partir d'un dict (clés de FilterSpec uniquement)"""
+    unknown = set(data) - _SPEC_FIELDS
+    if unknown:
+        raise ValueError(f"Champs de filtre inconnus : {sorted(unknown)}")
+
+    values = {}
+    for key, value in data.items():
+        if key in ('setups', 'markets', 'criteria'):
+            values[key] = tuple([value] if isinstance(value, str) else value)
+        else:
+            values[key] = value
+    spec = FilterSpec(**values)
+    if spec.pea_filter not in PEA_FILTER_OPTIONS:
+        raise ValueError(f"Filtre PEA inconnu : {spec.pea_filter!r}")
+    return spec
+
+
+def load_specs(path):
+    """Lit un fichier de filtres et renvoie un dict nom -> FilterSpec"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+
+    if isinstance(entries, dict):
+        entries = [dict(spec, name=name) for name, spec in entries.items()]
+
+    specs = {}
+    for i, entry in enumerate(entries):
+        entry = dict(entry)
+        name = str(entry.pop("name", f"screen_{i + 1:03d}"))
+        if name in specs:
+            raise ValueError(f"Nom de filtre en double : {name!r}")
+        specs[name] = spec_from_dict(entry)
+    return specs
+
+
+def _file_name(name):
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or "screen"
+
+
+def _output_paths(names, directory, extension):
+    """Fichier produit pour chaque filtre ; lève ValueError si deux filtres visent le même"""
+    paths = {}
+    owners = {}
+    for name in names:
+        file_name = f"{_file_name(name)}.{extension}"
+        # Sans distinction de casse : certains systèmes de fichiers l'ignorent
+        owner = owners.setdefault(file_name.casefold(), name)
+        if owner != name:
+            raise ValueError(f"Les filtres {owner!r} et {name!r} seraient écrits dans le "
+                             f"même fichier {file_name} : renommez l'un des deux")
+        paths[name] = os.path.join(directory, file_name)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Évalue un lot de filtres du screener sans lancer Streamlit")
+    parser.add_argument("specs", help="fichier de filtres (.json ou .jsonl)")
+    parser.add_argument("-o", "--output-dir", default="screens",
+                        help="répertoire des fichiers produits (défaut : screens)")
+    parser.add_argument("-f", "--format", default="csv", choices=available_formats(),
+                        help="format des fichiers produits (défaut : csv)")
+    args = parser.parse_args(argv)
+
+    specs = load_specs(args.specs)
+    try:
+        paths = _output_paths(specs, args.output_dir, EXPORT_FORMATS[args.format]["extension"])
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    screener = Screener.load()
+    print(f"Univers chargé : {len(screener.df)} actions en "
+          f"{time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+    for setup_name, result in screener.membership.results.items():
+        if result["error"]:
+            print(f"Erreur lors du chargement de {result['output_file']}: "
+                  f"{result['error']}", file=sys.stderr)
+    for name, spec in specs.items():
+        unknown = [s for s in spec.setups if s not in screener.membership.results]
+        if unknown:
+            print(f"{name}: setups inconnus ignorés {unknown}", file=sys.stderr)
+        if spec.expression:
+            try:
+                screener.planner.parse(spec.expression)
+            except QueryError as e:
+                parser.error(f"{name}: expression invalide : {e}")
+
+    start = time.perf_counter()
+    all_rows = screener.rows_many(specs)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, rows in all_rows.items():
+        with open(paths[name], "wb") as f:
+            write_export(screener.index.materialize(rows), f, args.format)
+        print(f"{name}\t{len(rows)}\t{paths[name]}")
+
+    print(f"{len(specs)} filtres évalués en {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Recherche instantanée sur Name, Symbol, Sector et Industry
+
+L'index est construit une fois par instantané : chaque champ est découpé en
+mots normalisés (sans accents ni casse), chaque mot distinct du vocabulaire
+pointe vers les lignes qui le portent, et ses trigrammes servent à retrouver
+les mots proches d'un mot mal saisi. Une requête ne parcourt que les mots
+candidats, jamais les lignes de l'univers.
+"""
+import numpy as np
+import pandas as pd
+
+# Poids des champs dans le score d'une ligne
+FIELD_WEIGHTS = {'Symbol': 1.0, 'Name': 1.0, 'Industry': 0.5, 'Sector': 0.4}
+
+# Score d'un mot de l'index pour un mot de la requête : exact, préfixe, approché
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.6
+FUZZY_SCORE = 0.5
+
+# Similarité minimale (Dice sur les trigrammes) pour qu'un mot soit jugé proche
+MIN_SIMILARITY = 0.55
+# Longueur minimale d'un mot de requête pour la recherche approchée
+MIN_FUZZY_LENGTH = 3
+
+
+def normalize_text(values):
+    """Texte sans accents ni casse, la ponctuation remplacée par des espaces"""
+    return (pd.Series(values, dtype=object).fillna('').astype(str)
+            .str.normalize('NFKD')
+            .str.replace(r'[\u0300-\u036f]', '', regex=True)
+            .str.casefold()
+            .str.replace(r'[\W_]+', ' ', regex=True)
+            .str.strip())
+
+
+def trigrams(token):
+    """Trigrammes d'un mot, bornés par des espaces pour favoriser le début et la fin"""
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _csr(keys, values, n_keys):
+    """Listes de values groupées par clé : (offsets, valeurs triées par clé)"""
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+    return offsets, values[order]
+
+
+def _ranges(starts, lengths):
+    """Concaténation des intervalles [start, start + length), sans boucle Python"""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(total)
+
+
+class SearchIndex:
+    """Index de recherche : vocabulaire trié, postings mot -> lignes et trigramme -> mots"""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+
+        # Paires (mot, ligne, poids du champ) ; chaque valeur distincte est normalisée une fois
+        tokens, rows, weights = [], [], []
+        for col, weight in FIELD_WEIGHTS.items():
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col].astype(object))
+            words = normalize_text(uniques).str.split().explode().dropna()
+            # Lignes de chaque valeur, puis une paire par mot de la valeur et par ligne
+            value_offsets, value_rows = _csr(codes[codes >= 0], np.flatnonzero(codes >= 0),
+                                             len(uniques))
+            value_ids = words.index.to_numpy()
+            counts = value_offsets[value_ids + 1] - value_offsets[value_ids]
+            tokens.append(np.repeat(words.to_numpy(dtype=object), counts))
+            rows.append(value_rows[_ranges(value_offsets[value_ids], counts)])
+            weights.append(np.full(int(counts.sum()), weight, dtype=np.float32))
+
+        tokens = np.concatenate(tokens) if tokens else np.empty(0, dtype=object)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        weights = np.concatenate(weights) if weights else np.empty(0, dtype=np.float32)
+
+        # Vocabulaire trié : les préfixes sont des intervalles contigus
+        token_ids, vocabulary = pd.factorize(tokens, sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        self.token_offsets, postings = _csr(
+            token_ids, np.rec.fromarrays([rows, weights]), len(self.vocabulary))
+        self.posting_rows = postings.f0
+        self.posting_weights = postings.f1
+
+        # Trigrammes des mots alphabétiques : numéros et codes ne sont trouvés que par préfixe
+        gram_tokens, grams = [], []
+        self.gram_counts = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token_id, token in enumerate(self.vocabulary):
+            if len(token) >= MIN_FUZZY_LENGTH and token.isalpha():
+                token_grams = trigrams(token)
+                grams.extend(token_grams)
+                gram_tokens.extend([token_id] * len(token_grams))
+                self.gram_counts[token_id] = len(token_grams)
+        gram_ids, gram_values = pd.factorize(np.asarray(grams, dtype=object))
+        self.gram_lookup = {gram: i for i, gram in enumerate(gram_values)}
+        self.gram_offsets, self.gram_postings = _csr(
+            gram_ids, np.asarray(gram_tokens, dtype=np.int64), len(gram_values))
+
+    def _token_scores(self, word):
+        """Mots du vocabulaire proches de word : (identifiants, scores)"""
+        ids, scores = [], []
+
+        # Mots commençant par word (dont le mot exact)
+        start = np.searchsorted(self.vocabulary, word, side='left')
+        stop = np.searchsorted(self.vocabulary, word + '\uffff', side='left')
+        if stop > start:
+            prefix_ids = np.arange(start, stop)
+            lengths = np.fromiter((len(t) for t in self.vocabulary[start:stop]),
+                                  dtype=np.float32, count=stop - start)
+            # Plus le mot complété est court, plus il est proche de la saisie
+            prefix_scores = PREFIX_SCORE + (EXACT_SCORE - PREFIX_SCORE) * len(word) / lengths
+            ids.append(prefix_ids)
+            scores.append(prefix_scores.astype(np.float32))
+
+        # Mots partageant assez de trigrammes (fautes de frappe)
+        if len(word) >= MIN_FUZZY_LENGTH and word.isalpha():
+            word_grams = [self.gram_lookup[g] for g in trigrams(word) if g in self.gram_lookup]
+            if word_grams:
+                candidates = np.concatenate([
+                    self.gram_postings[self.gram_offsets[g]:self.gram_offsets[g + 1]]
+                    for g in word_grams])
+                shared_ids, shared = np.unique(candidates, return_counts=True)
+                similarity = 2 * shared / (len(trigrams(word)) + self.gram_counts[shared_ids])
+                close = similarity >= MIN_SIMILARITY
+                ids.append(shared_ids[close])
+                scores.append((FUZZY_SCORE * similarity[close]).astype(np.float32))
+
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(ids), np.concatenate(scores)
+
+    def search(self, query, rows=None, limit=None):
+        """Positions des lignes correspondant à query, de la plus pertinente à la moins
+
+        Chaque mot de la requête doit correspondre à un mot d'un des champs
+        (exactement, par préfixe ou approximativement) ; rows restreint la
+        recherche aux lignes déjà retenues par les autres filtres.
+        """
+        words = normalize_text([query]).iloc[0].split()
+        if not words:
+            return np.arange(self.n_rows) if rows is None else rows
+
+        total = np.zeros(self.n_rows, dtype=np.float32)
+        matched = np.ones(self.n_rows, dtype=bool)
+        for word in dict.fromkeys(words):
+            token_ids, token_scores = self._token_scores(word)
+            # Meilleur score de chaque ligne parmi les mots proches de word
+            starts = self.token_offsets[token_ids]
+            lengths = self.token_offsets[token_ids + 1] - starts
+            positions = _ranges(starts, lengths)
+            best = np.zeros(self.n_rows, dtype=np.float32)
+            np.maximum.at(best, self.posting_rows[positions],
+                          np.repeat(token_scores, lengths) * self.posting_weights[positions])
+            total += best
+            matched &= best > 0
+
+        if rows is not None:
+            restricted = np.zeros(self.n_rows, dtype=bool)
+            restricted[rows] = True
+            matched &= restricted
+        found = np.flatnonzero(matched)
+        # Score décroissant, puis ordre de l'univers à score égal
+        found = found[np.argsort(-total[found], kind='stable')]
+        return found if limit is None else found[:limit]
@@ -0,0 +1,97 @@
+"""Données des vues de l'application (tableau, graphiques, analyse), sans Streamlit"""
+import numpy as np
+import pandas as pd
+
+from mdb_data import CRITERIA_COLUMNS
+from mdb_instrument import instrumented
+
+
+@instrumented("prepare_display_dataframe")
+def prepare_display_dataframe(df, links=False):
+    """Prépare le DataFrame pour l'affichage, avec les URLs des liens si links"""
+    # Colonnes de base toujours affichées
+    base_columns = ['Market', 'Name', 'Symbol', 'PEA', 'PEA-PME']
+
+    # Ajouter TOUTES les colonnes de styles d'investissement
+    style_columns = ['MBagger', 'ROE', 'grow', 'growR',
+                     'mom', 'qual', 'qualR', 'small', 'trend', 'value']
+
+    # Ajouter les colonnes de secteur et industrie
+    sector_columns = ['Sector', 'Industry']
+
+    # Construire la liste complète des colonnes à afficher
+    all_columns = base_columns + style_columns + sector_columns
+
+    # Filtrer les colonnes qui existent dans le DataFrame
+    display_columns = [col for col in all_columns if col in df.columns]
+
+    # Colonnes construites d'un bloc, sans apply ni copie intermédiaire
+    columns = {}
+
+    # Créer la colonne graphique en première position
+    if 'ZB URL' in df.columns:
+        zb_url = df['ZB URL'].astype('string')
+        missing = (zb_url.fillna('') == '').to_numpy()
+        if links:
+            columns['📊'] = (zb_url.str.rstrip('/') + '/graphiques/').mask(missing)
+        else:
+            columns['📊'] = np.where(missing, "➖", "📊")
+
+    # Formatage des colonnes booléennes (PEA et styles d'investissement)
+    for col in display_columns:
+        if df[col].dtype == bool:
+            columns[col] = np.where(df[col].to_numpy(), '✅', '❌')
+        else:
+            columns[col] = df[col]
+
+    # Colonne Name remplacée par l'URL de la fiche, nom original conservé à part
+    if links and 'Name' in columns and 'ZB URL' in df.columns:
+        columns['Name_Original'] = df['Name']
+        columns['Name'] = zb_url.mask(missing)
+
+    return pd.DataFrame(columns, index=df.index)
+
+
+def page_rows(df, rows, sort_column, ascending, page, page_size):
+    """Positions dans df des lignes de la page demandée (numérotée à partir de 1) parmi rows"""
+    start = (page - 1) * page_size
+    if not sort_column:
+        return rows[start:start + page_size]
+
+    # Seule la colonne triée est extraite et ordonnée, le reste de df n'est pas copié
+    values = df[sort_column].take(rows).reset_index(drop=True)
+    order = values.sort_values(
+        ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+    return rows[order[start:start + page_size]]
+
+
+def sort_and_paginate(df, sort_column, ascending, page, page_size):
+    """Trie df sur une colonne et renvoie la page demandée (numérotée à partir de 1)"""
+    return df.iloc[page_rows(df, np.arange(len(df)), sort_column, ascending, page, page_size)]
+
+
+def compute_aggregates(df):
+    """Agrégats des vues Graphiques et Analyse : comptages, répartitions et corrélations"""
+    aggregates = {}
+
+    market_counts = df['Market'].value_counts()
+    aggregates['market_counts'] = market_counts[market_counts > 0].head(10)
+    aggregates['market_stats'] = df.groupby(
+        'Market', observed=True).size().sort_values(ascending=False)
+
+    sector_counts = df['Sector'].value_counts()
+    aggregates['sector_counts'] = sector_counts[sector_counts > 0].head(10)
+
+    # Répartitions PEA/PEA-PME
+    aggregates['pea_distribution'] = df['PEA'].value_counts() if 'PEA' in df.columns else None
+    aggregates['pea_pme_distribution'] = \
+        df['PEA-PME'].value_counts() if 'PEA-PME' in df.columns else None
+
+    # Styles d'investissement : nombre d'actions par style et corrélations
+    available_styles = [
+        col for col in CRITERIA_COLUMNS if col in df.columns]
+    aggregates['style_counts'] = pd.Series(
+        {style: int(df[style].sum()) for style in available_styles}, dtype='int64')
+    aggregates['corr'] = df[available_styles].corr() if len(available_styles) > 1 else None
+
+    return aggregates
@@ -0,0 +1,107 @@
+"""Fixtures partagées : serveur HTTP local qui remplace les gists, petit univers et setups"""
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mdb_data import clean_stocks_data  # noqa: E402
+
+# Univers de test : styles de MBagger à value, dans l'ordre de l'en-tête
+UNIVERSE_CSV = """\
+Market;Name;Symbol;PEA;PEA-PME;MBagger;ROE;grow;growR;mom;qual;qualR;small;trend;value;Sector;Industry;ZB URL
+Euronext Paris;Société Générale;GLE;True;False;;;;;;X;;;;X;Financial Services;Banks;
+Euronext Paris;L'Oréal;OR;True;False;;X;;;X;X;;;;;Consumer Defensive;Household & Personal Products;
+Euronext Paris;Hermès International;RMS;True;False;X;;X;;;X;;;X;;Consumer Cyclical;Luxury Goods;
+Nasdaq;Apple Inc;AAPL;False;False;;X;;;X;X;;;X;;Technology;Consumer Electronics;
+Nasdaq;Applied Materials;AMAT;False;False;;;X;;X;;;;;;Technology;Semiconductor Equipment;
+NYSE;Exxon Mobil;XOM;False;False;;;;;;;;;;X;Energy;Oil & Gas Integrated;
+Xetra;SAP SE;SAP;True;False;;;;X;;X;;;;;Technology;Software;
+Euronext Paris;Nexans;NEX;True;True;;;;;X;;;X;;X;Industrials;Electrical Equipment;
+Euronext Paris;Esker;ALESK;True;True;X;;X;;;;;X;;;Technology;Software;
+Nasdaq;Microsoft Corp;MSFT;False;False;;;;;;;;;;;Technology;Software;
+"""
+
+
+def setup_result(names, symbols=None, output_file="setup.csv"):
+    """Résultat d'un setup au format de mdb_data.fetch_screener_results"""
+    return {"output_file": output_file, "names": list(names),
+            "symbols": None if symbols is None else list(symbols),
+            "columns": ["Name"] + (["Symbol"] if symbols is not None else []),
+            "error": None, "quarantined": []}
+
+
+class GistHandler(BaseHTTPRequestHandler):
+    """Sert server.files avec ETag ; server.statuses impose les prochains statuts d'erreur"""
+
+    def do_GET(self):
+        server = self.server
+        name = self.path.lstrip("/")
+        with server.lock:
+            server.requests.append((name, dict(self.headers)))
+            status = server.statuses.pop(0) if server.statuses else None
+        if status is not None:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = server.files.get(name)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def gist_server():
+    """Serveur local : files (nom -> octets), statuses (statuts à renvoyer), requests reçues"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GistHandler)
+    server.daemon_threads = True
+    server.files = {}
+    server.statuses = []
+    server.requests = []
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def universe():
+    """Univers nettoyé de dix actions (UNIVERSE_CSV)"""
+    return clean_stocks_data(UNIVERSE_CSV)
+
+
+@pytest.fixture
+def setup_results():
+    """Trois setups : jointure sur Symbol, sur Name (casse et espaces variables), sans résultat"""
+    return {
+        "MM200_Cross_Up": setup_result(["Apple Inc", "Nexans", "SAP SE"],
+                                       ["AAPL", "NEX", "SAP"], "mm200.csv"),
+        "new_high_50_days": setup_result([" apple inc ", "ESKER", "Exxon  Mobil"],
+                                         output_file="high50.csv"),
+        "Weekly_SuperTrend_Cross": setup_result([], output_file="weekly.csv"),
+    }
@@ -0,0 +1,90 @@
+"""Backtest des setups : rendements suivant les signaux et statistiques par groupe"""
+import numpy as np
+import pandas as pd
+
+import mdb_indicators
+from mdb_backtest import forward_returns, run_backtest, signal_events, summarize
+from mdb_indicators import OHLCVPanel
+
+NAN = np.nan
+DATES = pd.bdate_range("2024-01-02", periods=6)
+# Moyenne sur 3 séances franchie à la hausse à la séance 3, et aussi à la séance 5 pour C
+CLOSES = {"A": [3, 2, 1, 2, 4, 5], "B": [5] * 6, "C": [3, 2, 1, 2, 1, 5]}
+HORIZONS = (1, 2)
+
+
+def long_frame(closes):
+    return pd.DataFrame([{"Date": date, "Symbol": symbol, "Open": close, "High": close,
+                          "Low": close, "Close": close}
+                         for symbol, values in closes.items()
+                         for date, close in zip(DATES, values)])
+
+
+def events_for(monkeypatch, setup_names=("MM200_Cross_Up",)):
+    monkeypatch.setattr(mdb_indicators, "SMA_PERIOD", 3)
+    panel = OHLCVPanel.from_long(long_frame(CLOSES))
+    return signal_events(panel, list(setup_names), HORIZONS)
+
+
+def test_forward_returns():
+    close = np.array([[1, 2], [2, 2], [4, 1], [2, NAN]], dtype=float)
+    np.testing.assert_allclose(forward_returns(close, 1),
+                               [[1, 0], [1, -0.5], [-0.5, NAN], [NAN, NAN]])
+    np.testing.assert_allclose(forward_returns(close, 2)[:, 0], [3, 0, NAN, NAN])
+    # Horizon plus long que le panel : aucun rendement connu
+    assert np.isnan(forward_returns(close, 10)).all()
+
+
+def test_signal_events(monkeypatch):
+    events = events_for(monkeypatch, ["MM200_Cross_Up", "Unknown_Setup"])
+    assert events['Setup'].tolist() == ["MM200_Cross_Up"] * 3
+    assert events['Symbol'].tolist() == ["A", "C", "C"]
+    assert events['Symbol'].cat.categories.tolist() == ["A", "B", "C"]
+    assert events['Date'].tolist() == [DATES[3], DATES[3], DATES[5]]
+    # Signal de la dernière séance : rendements encore inconnus
+    np.testing.assert_allclose(events['r1'], [1.0, -0.5, NAN])
+    np.testing.assert_allclose(events['r2'], [1.5, 1.5, NAN])
+    assert events['r1'].dtype == np.float32
+
+
+def test_signal_events_without_computable_setup(monkeypatch):
+    events = events_for(monkeypatch, ["Unknown_Setup"])
+    expected = events_for(monkeypatch).iloc[:0]
+    assert len(events) == 0
+    assert events.columns.tolist() == ["Setup", "Symbol", "Date", "r1", "r2"]
+    assert events.dtypes.to_dict() == expected.dtypes.to_dict()
+
+
+def test_run_backtest_shards_match_whole_panel(monkeypatch, tmp_path):
+    expected = events_for(monkeypatch)
+    path = str(tmp_path / "panel.parquet")
+    long_frame(CLOSES).to_parquet(path, index=False)
+    # Un ticker par lot, lus depuis le fichier dans le processus courant
+    events = run_backtest(path, ["MM200_Cross_Up"], HORIZONS, workers=1, shard_size=1)
+    assert events['Symbol'].tolist() == expected['Symbol'].tolist()
+    assert events['Date'].tolist() == expected['Date'].tolist()
+    np.testing.assert_array_equal(events['r2'], expected['r2'])
+
+
+def test_summarize(monkeypatch):
+    universe = pd.DataFrame({"Symbol": ["A", "C", "C"], "Market": ["Nasdaq", "NYSE", "NYSE"]})
+    summary = summarize(events_for(monkeypatch), universe, HORIZONS)
+    rows = summary.set_index(['Groupe', 'Valeur', 'Horizon'])
+
+    # Rendements à 1 séance de 100 % et -50 % ; le signal trop récent n'est pas compté
+    assert rows.loc[('Tous', 'Tous', 1)].to_dict() == {
+        'Setup': "MM200_Cross_Up", 'Signaux': 2, 'Taux de réussite (%)': 50.0,
+        'Rendement moyen (%)': 25.0, 'Médiane (%)': 25.0, 'Q1 (%)': -12.5, 'Q3 (%)': 62.5}
+    assert rows.loc[('Tous', 'Tous', 2), 'Taux de réussite (%)'] == 100.0
+    assert rows.loc[('Market', 'NYSE', 1), 'Rendement moyen (%)'] == -50.0
+    assert rows.loc[('Market', 'Nasdaq', 2), 'Signaux'] == 1
+    # Sector absent de l'univers
+    assert rows.loc[('Sector', 'Inconnu', 1), 'Signaux'] == 2
+
+
+def test_summarize_without_events(monkeypatch):
+    summary = summarize(events_for(monkeypatch, ["Unknown_Setup"]), None, HORIZONS)
+    assert len(summary) == 0
+    assert summary.columns.tolist() == [
+        'Setup', 'Groupe', 'Valeur', 'Horizon', 'Signaux', 'Taux de réussite (%)',
+        'Rendement moyen (%)', 'Médiane (%)', 'Q1 (%)', 'Q3 (%)']
@@ -0,0 +1,82 @@
+"""Mise à jour incrémentale de l'univers : mêmes résultats qu'un nettoyage complet"""
+import numpy as np
+import pandas as pd
+
+from mdb_data import clean_stocks_data, stocks_table, update_stocks_table
+from mdb_index import FilterIndex, SetupMembership, carry_keys
+
+HEADER = ("Market;Name;Symbol;PEA;PEA-PME;MBagger;ROE;grow;growR;mom;qual;qualR;small;"
+          "trend;value;Sector;Industry;ZB URL")
+MARKETS = ["Nasdaq", "Xetra", "Euronext Paris"]
+SECTORS = ["Technology", "Healthcare", "Energy"]
+
+
+def universe_line(i, name=None, qual="X"):
+    # Styles MBagger à value, qual (sixième) imposé
+    flags = ["X" if (i + k) % 3 == 0 else "" for k in range(10)]
+    flags[5] = qual
+    return (f"{MARKETS[i % 3]};{name or f'Company {i}'};SYM{i};{i % 2 == 0};{i % 5 == 0};"
+            f"{';'.join(flags)};{SECTORS[i % 3]};{SECTORS[i % 3]} ind{i % 4};"
+            f"https://www.zonebourse.com/cours/action/COMPANY-{i}-{1000 + i}/")
+
+
+def universe_text(lines):
+    return "\n".join([HEADER] + lines) + "\n"
+
+
+def test_delta_matches_full_clean():
+    lines = [universe_line(i) for i in range(40)]
+    text = universe_text(lines)
+    previous = stocks_table(clean_stocks_data(text), text)
+
+    changed = list(lines)
+    changed[3] = universe_line(3, qual="")
+    changed[10] = universe_line(10, name="Societe 10")
+    del changed[20]
+    changed.insert(25, universe_line(99))
+    next_text = universe_text(changed)
+
+    table, delta = update_stocks_table(previous, next_text)
+    pd.testing.assert_frame_equal(table.df, clean_stocks_data(next_text))
+    assert delta.inserted == ["SYM99"]
+    assert sorted(delta.updated) == ["SYM10", "SYM3"]
+    assert delta.deleted == ["SYM20"]
+    assert delta.unchanged == len(changed) - 3
+
+    # Index et clés de jointure mis à jour sur les seules lignes modifiées
+    index = FilterIndex(previous.df)
+    assert (FilterIndex(table.df, index, delta.source_rows).flags
+            == FilterIndex(table.df).flags).all()
+    membership = SetupMembership(previous.df, {})
+    keys = SetupMembership(previous.df, {"s": {"names": [], "symbols": ["SYM1"]}}).universe_keys
+    assert not membership.universe_keys
+    carried = carry_keys(keys["Symbol"], delta.source_rows, table.df["Symbol"])
+    fresh = SetupMembership(table.df, {"s": {"names": [], "symbols": ["SYM1"]}}).universe_keys
+    assert (carried == fresh["Symbol"]).all()
+
+    # Chaque ligne garde l'empreinte de sa ligne source : une seconde mise à jour est possible
+    again, delta = update_stocks_table(table, next_text)
+    pd.testing.assert_frame_equal(again.df, table.df)
+    assert delta.unchanged == len(changed)
+    assert np.array_equal(again.row_hashes, table.row_hashes)
+
+
+def test_header_change_requires_full_parse():
+    lines = [universe_line(i) for i in range(5)]
+    text = universe_text(lines)
+    previous = stocks_table(clean_stocks_data(text), text)
+    assert update_stocks_table(previous, text.replace("ZB URL", "URL")) is None
+
+
+def test_malformed_changed_line_is_quarantined():
+    lines = [universe_line(i) for i in range(10)]
+    text = universe_text(lines)
+    previous = stocks_table(clean_stocks_data(text), text)
+
+    changed = list(lines)
+    # Plus de champs que l'en-tête : ligne écartée, comme au parse complet
+    changed[4] = universe_line(4) + ";extra"
+    table, delta = update_stocks_table(previous, universe_text(changed))
+    assert [q.line for q in table.quarantine] == [6]
+    assert delta.deleted == ["SYM4"]
+    assert len(table.df) == 9
@@ -0,0 +1,56 @@
+"""Historique d'appartenance partagé par plusieurs processus"""
+import multiprocessing
+
+import numpy as np
+
+from mdb_history import MembershipHistory
+
+
+def test_ids_stay_consistent_across_instances(tmp_path):
+    directory = str(tmp_path)
+    first = MembershipHistory(directory)
+    # Chargé avant les ajouts de first : son dictionnaire en mémoire est périmé
+    second = MembershipHistory(directory)
+
+    assert first.ids_for([10, 20]).tolist() == [0, 1]
+    assert second.ids_for([30, 10]).tolist() == [2, 0]
+    assert first.ids_for([20, 30]).tolist() == [1, 2]
+    assert MembershipHistory(directory).keys.tolist() == [10, 20, 30]
+
+
+def _assign(directory, keys, queue):
+    history = MembershipHistory(directory)
+    ids = [int(history.ids_for([key])[0]) for key in keys]
+    queue.put(dict(zip(keys, ids)))
+
+
+def test_concurrent_processes_do_not_corrupt_the_dictionary(tmp_path):
+    directory = str(tmp_path)
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    # Clés en partie communes, ajoutées une à une par chaque processus
+    key_sets = [list(range(start, start + 40)) for start in (0, 20, 30, 50)]
+    processes = [context.Process(target=_assign, args=(directory, keys, queue))
+                 for keys in key_sets]
+    for process in processes:
+        process.start()
+    assigned = [queue.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=60)
+
+    keys = MembershipHistory(directory).keys
+    assert len(keys) == len(np.unique(keys)) == 90
+    for mapping in assigned:
+        for key, stock_id in mapping.items():
+            assert keys[stock_id] == key
+
+
+def test_records_are_shared_through_the_directory(tmp_path):
+    directory = str(tmp_path)
+    history = MembershipHistory(directory)
+    ids = history.ids_for([1, 2, 3])
+    history.record("2026-01-02", {"setup:a": np.sort(ids[:2])})
+
+    reloaded = MembershipHistory(directory)
+    assert reloaded.dates == ["2026-01-02"]
+    assert reloaded.as_of("2026-01-05")["setup:a"].tolist() == [0, 1]
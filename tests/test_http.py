@@ -0,0 +1,293 @@
+"""Cache disque, nouvelles tentatives et disjoncteur de mdb_http contre un serveur local"""
+import os
+import time
+
+import pytest
+import requests
+
+import mdb_http
+from mdb_http import CircuitBreaker, CircuitOpenError, DiskCache, fetch, http_get
+
+
+@pytest.fixture(autouse=True)
+def transport(monkeypatch):
+    # Disjoncteurs neufs, backoff court et ni cache ni miroir du processus
+    monkeypatch.setattr(mdb_http, "_breakers", {})
+    monkeypatch.setattr(mdb_http, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(mdb_http, "MAX_RETRIES", 2)
+    monkeypatch.setattr(mdb_http, "MIRROR_DIR", "")
+    mdb_http.set_cache(None)
+    monkeypatch.setattr(mdb_http, "CACHE_DIR", "")
+    yield
+    mdb_http.set_cache(None)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    disk_cache = DiskCache(str(tmp_path / "cache"), ttl=60)
+    mdb_http.set_cache(disk_cache)
+    return disk_cache
+
+
+def expire(cache, url):
+    """Fait vieillir l'entrée de url au-delà du TTL"""
+    meta = cache._read_meta(url)
+    meta["checked_at"] -= cache.ttl + 1
+    cache._write_meta(url, meta)
+
+
+PARSE_CALLS = []
+
+
+def parse_lines(text):
+    PARSE_CALLS.append(text)
+    return text.splitlines()
+
+
+def test_miss_then_hit(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+
+    first = fetch(url)
+    assert first.ok and first.cache_status == "miss"
+    assert first.text == "Name\nAlpha\n"
+    assert first.nbytes > 0 and first.version
+
+    second = fetch(url)
+    assert second.cache_status == "hit"
+    assert second.text == first.text and second.version == first.version
+    assert second.nbytes == 0
+    assert len(gist_server.requests) == 1
+
+
+def test_revalidation_reuses_parsed_result(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    PARSE_CALLS.clear()
+
+    first = fetch(url, parse_lines)
+    expire(cache, url)
+    second = fetch(url, parse_lines)
+
+    assert second.cache_status == "revalidated"
+    assert second.parsed == first.parsed == ["Name", "Alpha"]
+    assert len(PARSE_CALLS) == 1
+    # GET conditionnel sur l'ETag reçu au premier téléchargement
+    assert gist_server.requests[-1][1].get("If-None-Match")
+
+
+def test_parse_version_change_invalidates_parsed_result(gist_server, cache, monkeypatch):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    PARSE_CALLS.clear()
+
+    fetch(url, parse_lines)
+    assert fetch(url, parse_lines).cache_status == "hit"
+    assert len(PARSE_CALLS) == 1
+
+    # Nouvelle forme de sortie : le résultat parsé en cache n'est plus réutilisé
+    monkeypatch.setattr(parse_lines, "parse_version", 2, raising=False)
+    assert fetch(url, parse_lines).parsed == ["Name", "Alpha"]
+    assert len(PARSE_CALLS) == 2
+    assert len(gist_server.requests) == 1
+
+
+def test_ttl_expiry_downloads_new_content(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    PARSE_CALLS.clear()
+    first = fetch(url, parse_lines)
+
+    gist_server.files["a.csv"] = b"Name\nBeta\n"
+    # Dans le TTL, le contenu en cache est servi sans requête
+    assert fetch(url, parse_lines).text == first.text
+    expire(cache, url)
+    updated = fetch(url, parse_lines)
+
+    assert updated.cache_status == "miss"
+    assert updated.parsed == ["Name", "Beta"]
+    assert updated.version != first.version
+    assert len(PARSE_CALLS) == 2
+    assert len(gist_server.requests) == 2
+
+
+def test_stale_on_server_error(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    first = fetch(url)
+    expire(cache, url)
+
+    gist_server.statuses = [503] * 3
+    stale = fetch(url)
+    assert stale.ok and stale.cache_status == "stale"
+    assert stale.text == first.text
+    # Première tentative et deux nouvelles tentatives
+    assert len(gist_server.requests) == 4
+
+
+def test_stale_on_connection_error(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    fetch(url)
+    expire(cache, url)
+
+    gist_server.shutdown()
+    gist_server.server_close()
+    stale = fetch(url)
+    assert stale.ok and stale.cache_status == "stale"
+    assert stale.text == "Name\nAlpha\n"
+
+
+def test_lru_eviction(gist_server, tmp_path):
+    for name in ("a", "b", "c"):
+        gist_server.files[f"{name}.csv"] = name.encode() * 1000
+    # Date d'utilisation mise à jour à chaque hit pour observer l'ordre LRU
+    cache = DiskCache(str(tmp_path / "cache"), ttl=60, touch_interval=0)
+    mdb_http.set_cache(cache)
+    urls = {name: gist_server.url + f"{name}.csv" for name in ("a", "b", "c")}
+
+    fetch(urls["a"])
+    time.sleep(0.01)
+    fetch(urls["b"])
+    time.sleep(0.01)
+    # a redevient la plus récemment utilisée : b est évincée en premier
+    assert fetch(urls["a"]).cache_status == "hit"
+    time.sleep(0.01)
+    # Place pour deux entrées seulement
+    entry_bytes = sum(f.stat().st_size for f in (tmp_path / "cache").iterdir()) / 2
+    cache.max_bytes = int(2.5 * entry_bytes)
+    fetch(urls["c"])
+
+    assert cache._read_meta(urls["b"]) is None
+    assert cache._read_meta(urls["a"]) is not None
+    assert cache._read_meta(urls["c"]) is not None
+    assert fetch(urls["b"]).cache_status == "miss"
+
+
+def test_hit_rewrites_meta_once_per_touch_interval(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    fetch(url)
+    used_at = cache._read_meta(url)["used_at"]
+
+    assert fetch(url).cache_status == "hit"
+    assert cache._read_meta(url)["used_at"] == used_at
+    cache.touch_interval = 0
+    time.sleep(0.01)
+    assert fetch(url).cache_status == "hit"
+    assert cache._read_meta(url)["used_at"] > used_at
+
+
+def test_evict_tolerates_entries_removed_by_another_process(gist_server, cache, monkeypatch):
+    gist_server.files["a.csv"] = b"a" * 1000
+    fetch(gist_server.url + "a.csv")
+    directory = cache.directory
+    listdir, getsize = os.listdir, os.path.getsize
+
+    def removed_before_getsize(path):
+        if path.endswith(".body"):
+            os.remove(path)
+        return getsize(path)
+
+    # Entrée listée mais déjà supprimée, corps supprimé pendant la mesure
+    monkeypatch.setattr(os, "listdir", lambda path: listdir(path) + ["gone.json"])
+    monkeypatch.setattr(os.path, "getsize", removed_before_getsize)
+    cache.max_bytes = 0
+    cache.evict()
+    assert listdir(directory) == []
+
+
+def test_tmp_names_are_unique_per_process():
+    assert f".{os.getpid()}." in mdb_http._tmp_path("entry.body")
+
+
+def test_retry_then_success(gist_server):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    gist_server.statuses = [503, 429]
+
+    response = http_get(gist_server.url + "a.csv")
+    assert response.status_code == 200
+    assert len(gist_server.requests) == 3
+    assert mdb_http.get_breaker(gist_server.url).state == "closed"
+
+
+def test_retries_exhausted_returns_last_response(gist_server):
+    gist_server.statuses = [502] * 3
+
+    response = http_get(gist_server.url + "a.csv")
+    assert response.status_code == 502
+    assert len(gist_server.requests) == 3
+    assert mdb_http.get_breaker(gist_server.url).failures == 1
+
+
+def test_client_error_is_not_retried(gist_server):
+    response = http_get(gist_server.url + "missing.csv")
+    assert response.status_code == 404
+    assert len(gist_server.requests) == 1
+
+
+def test_retry_after_is_honoured():
+    response = requests.Response()
+    response.headers["Retry-After"] = "2"
+    assert mdb_http._retry_delay(0, response) >= 2
+
+
+def test_breaker_opens_and_recovers(gist_server, monkeypatch):
+    monkeypatch.setattr(mdb_http, "MAX_RETRIES", 0)
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    mdb_http._breakers[gist_server.url.split("/")[2]] = breaker
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+
+    gist_server.statuses = [503, 503]
+    http_get(url)
+    http_get(url)
+    assert breaker.state == "open"
+
+    # Disjoncteur ouvert : refus immédiat, sans requête
+    with pytest.raises(CircuitOpenError):
+        http_get(url)
+    assert len(gist_server.requests) == 2
+
+    time.sleep(0.25)
+    assert breaker.state == "half-open"
+    assert http_get(url).status_code == 200
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_breaker_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    # L'essai est en cours : les autres requêtes attendent son issue
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_open_breaker_serves_stale_copy(gist_server, cache):
+    gist_server.files["a.csv"] = b"Name\nAlpha\n"
+    url = gist_server.url + "a.csv"
+    fetch(url)
+    expire(cache, url)
+    breaker = mdb_http.get_breaker(url)
+    breaker.opened_at = time.monotonic()
+
+    result = fetch(url)
+    assert result.cache_status == "stale" and result.text == "Name\nAlpha\n"
+    assert len(gist_server.requests) == 1
+
+
+def test_mirror_fallback_without_cache(gist_server, tmp_path, monkeypatch):
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    (mirror / "a.csv").write_bytes(b"Name\nMirror\n")
+    monkeypatch.setattr(mdb_http, "MIRROR_DIR", str(mirror))
+
+    gist_server.statuses = [503] * 3
+    result = fetch(gist_server.url + "a.csv")
+    assert result.ok and result.cache_status == "mirror"
+    assert result.text == "Name\nMirror\n"
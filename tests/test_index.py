@@ -0,0 +1,81 @@
+"""Index de filtrage : mêmes lignes que les filtres pandas d'origine de l'application"""
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mdb_index import PEA_FILTER_OPTIONS, FilterIndex, FilterSpec
+
+MARKETS = [(), ("Euronext Paris",), ("Nasdaq", "NYSE"), ("Xetra", "Unknown")]
+CRITERIA = [(), ("qual",), ("qual", "value"), ("small", "mom", "growR")]
+SECTORS = ["Tous", "Technology", "Energy"]
+SETUP_ROWS = np.array([1, 3, 4, 5, 8])
+
+
+def reference_rows(df, spec, rows=None):
+    """Filtres de main() avant l'index : masques pandas successifs"""
+    view = df if rows is None else df.iloc[rows]
+    if spec.markets:
+        view = view[view['Market'].isin(spec.markets)]
+    if spec.pea_filter == "PEA Eligible":
+        view = view[view['PEA'].eq(True)]
+    elif spec.pea_filter == "Non PEA Eligible":
+        view = view[view['PEA'].eq(False)]
+    elif spec.pea_filter == "PEA-PME Eligible":
+        view = view[view['PEA-PME'].eq(True)]
+    if spec.criteria:
+        view = view[view[list(spec.criteria)].any(axis=1)]
+    if spec.sector != "Tous":
+        view = view[view['Sector'] == spec.sector]
+    return df.index.get_indexer(view.index)
+
+
+@pytest.fixture
+def universe_with_na(universe):
+    df = universe.copy()
+    # Critères manquants : booléens nullables et colonne objet avec NaN
+    df['qual'] = df['qual'].astype('boolean')
+    df.loc[[0, 3], 'qual'] = pd.NA
+    df['mom'] = df['mom'].astype(object)
+    df.loc[[1, 4], 'mom'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("frame", ["universe", "universe_with_na"])
+def test_resolve_matches_pandas_filters(frame, request):
+    df = request.getfixturevalue(frame)
+    index = FilterIndex(df)
+    for markets, pea_filter, criteria, sector in itertools.product(
+            MARKETS, PEA_FILTER_OPTIONS, CRITERIA, SECTORS):
+        spec = FilterSpec(markets=markets, pea_filter=pea_filter,
+                          criteria=criteria, sector=sector)
+        for rows in (None, SETUP_ROWS):
+            assert index.resolve(spec, rows).tolist() == \
+                reference_rows(df, spec, rows).tolist(), (spec, rows)
+
+
+def test_missing_criteria_are_not_matches(universe_with_na):
+    index = FilterIndex(universe_with_na)
+    assert index.resolve(FilterSpec(criteria=("qual",))).tolist() == [1, 2, 6]
+    assert index.resolve(FilterSpec(criteria=("mom",))).tolist() == [3, 7]
+    assert index.flag_counts['qual'] == 3
+
+
+def test_canonical_spec_resolves_like_the_original(universe):
+    index = FilterIndex(universe)
+    spec = FilterSpec(setups=("b", "a", "b"), markets=("Nasdaq", "Euronext Paris"),
+                      criteria=("value", "qual", "value"), expression=" qual  AND Value ",
+                      search="Apple  INC")
+    canonical = spec.canonical()
+    assert canonical == FilterSpec(setups=("a", "b"), markets=("Euronext Paris", "Nasdaq"),
+                                   criteria=("qual", "value"), expression="qual and value",
+                                   search="apple inc")
+    assert canonical.canonical() == canonical
+    assert index.resolve(canonical).tolist() == index.resolve(spec).tolist()
+
+
+def test_materialize_shares_the_universe_when_nothing_is_filtered(universe):
+    index = FilterIndex(universe)
+    assert index.materialize(index.resolve(FilterSpec())) is universe
+    assert index.materialize(np.array([2, 5]))['Symbol'].tolist() == ["RMS", "XOM"]
@@ -0,0 +1,97 @@
+"""Indicateurs et setups calculés localement, contre des séries calculées à la main"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import mdb_indicators
+from mdb_indicators import Indicators, OHLCVPanel, screen_panel, sma, supertrend, wma
+
+NAN = np.nan
+# Séances du mardi 2 au mardi 9 janvier 2024, sans le week-end
+DATES = pd.bdate_range("2024-01-02", periods=6)
+# Croise sa moyenne sur 3 séances (NaN, NaN, 2, 5/3, 7/3, 11/3) à la hausse le vendredi 5
+CROSSING = [3.0, 2.0, 1.0, 2.0, 4.0, 5.0]
+
+
+def column(values):
+    return np.array(values, dtype=float).reshape(-1, 1)
+
+
+def panel_from_closes(closes):
+    """Panel dont les cours d'ouverture, plus haut et plus bas valent la clôture"""
+    rows = [{"Date": date, "Symbol": symbol, "Open": close, "High": close,
+             "Low": close, "Close": close}
+            for symbol, values in closes.items() for date, close in zip(DATES, values)]
+    return OHLCVPanel.from_long(pd.DataFrame(rows))
+
+
+def test_sma_and_wma():
+    values = column([1, 2, 3, 4, 5])
+    np.testing.assert_allclose(sma(values, 3).ravel(), [NAN, NAN, 2, 3, 4])
+    # Poids 1, 2, 3 : (1 + 4 + 9) / 6, (2 + 6 + 12) / 6, (3 + 8 + 15) / 6
+    np.testing.assert_allclose(wma(values, 3).ravel(), [NAN, NAN, 14 / 6, 20 / 6, 26 / 6])
+    assert np.isnan(wma(column([1, 2]), 3)).all()
+
+
+def test_macd_up(monkeypatch):
+    monkeypatch.setattr(mdb_indicators, "MACD_FAST", 2)
+    monkeypatch.setattr(mdb_indicators, "MACD_SLOW", 3)
+    monkeypatch.setattr(mdb_indicators, "MACD_SIGNAL", 2)
+    # MACD : NaN, NaN, 23/9 - 9/4, 95/27 - 25/8, 257/81 - 49/16
+    # Signal (alpha 2/3 depuis la séance 2) : NaN, NaN, NaN, 0.3642, 0.1950
+    panel = panel_from_closes({"A": [1, 2, 3, 4, 3, 3]})
+    assert Indicators(panel).macd_up.ravel()[:5].tolist() == [False, False, False, True, False]
+
+
+def test_mm200_cross_up_and_wma12_up(monkeypatch):
+    monkeypatch.setattr(mdb_indicators, "SMA_PERIOD", 3)
+    monkeypatch.setattr(mdb_indicators, "WMA_PERIOD", 2)
+    indicators = Indicators(panel_from_closes({"A": CROSSING}))
+    assert indicators.mm200_cross_up.ravel().tolist() == [False] * 3 + [True] + [False] * 2
+    # WMA sur 2 séances : NaN, 7/3, 4/3, 5/3, 10/3, 14/3
+    assert indicators.wma12_up.ravel().tolist() == [False, False, False, True, True, True]
+
+
+def test_supertrend():
+    high = column([11, 12, 13, 12, 10, 13])
+    low = column([9, 10, 11, 8, 6, 8])
+    close = column([10, 11, 12, 9, 7, 12])
+    # True range 2, 2, 2, 4, 4, 6 ; ATR de Wilder sur 2 séances : -, 2, 2, 3, 3.5, 4.75
+    # Bande haute 13 tant que le cours ne la franchit pas, 11.5 ensuite ; la clôture
+    # de 12 la franchit à la dernière séance : tendance haussière sur la bande basse
+    line, bullish = supertrend(high, low, close, period=2, multiplier=1.0)
+    np.testing.assert_allclose(line.ravel(), [NAN, 13, 13, 13, 11.5, 5.75])
+    assert bullish.ravel().tolist() == [False] * 5 + [True]
+
+
+def test_supertrend_skips_missing_sessions():
+    high = column([11, 12, 13, 12, 10, 13])
+    low = column([9, 10, 11, 8, 6, 8])
+    close = column([10, 11, 12, 9, 7, 12])
+    line, bullish = supertrend(high, low, close, period=2, multiplier=1.0)
+    # Même ticker avec une séance non cotée : même état sur les séances cotées
+    gap = [np.insert(values, 3, NAN, axis=0) for values in (high, low, close)]
+    gap_line, gap_bullish = supertrend(*gap, period=2, multiplier=1.0)
+    np.testing.assert_allclose(np.delete(gap_line, 3, axis=0), line)
+    assert np.isnan(gap_line[3]).all() and not gap_bullish[3].any()
+    assert np.delete(gap_bullish, 3, axis=0).tolist() == bullish.tolist()
+
+
+def test_screen_panel_as_of(monkeypatch):
+    monkeypatch.setattr(mdb_indicators, "SMA_PERIOD", 3)
+    panel = panel_from_closes({"A": CROSSING, "B": [5.0] * 6})
+    universe = pd.DataFrame({"Symbol": ["A"], "Name": ["Alpha"]})
+
+    def screened(as_of):
+        return screen_panel(panel, ["mm200_cross_up"], universe, as_of)["mm200_cross_up"]
+
+    assert screened("2024-01-05") == {"names": ["Alpha"], "symbols": ["A"],
+                                      "columns": ["Name", "Symbol"]}
+    # Dimanche : dernière séance au plus tard ce jour-là, le vendredi
+    assert screened("2024-01-07")["symbols"] == ["A"]
+    # Par défaut, et après la fin du panel : dernière séance
+    assert screened(None)["symbols"] == []
+    assert screened("2030-01-01")["symbols"] == []
+    assert screened("2024-01-02")["symbols"] == []
+    with pytest.raises(ValueError, match="première séance disponible le 2024-01-02"):
+        screened("2024-01-01")
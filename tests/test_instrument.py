@@ -0,0 +1,89 @@
+"""Pics d'allocation des étapes instrumentées quand plusieurs sessions s'exécutent"""
+import threading
+import tracemalloc
+
+import pytest
+
+import mdb_instrument
+from mdb_instrument import instrumented
+
+
+@pytest.fixture
+def tracing(monkeypatch):
+    monkeypatch.setattr(mdb_instrument, "ENABLED", True)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    yield
+    if started:
+        tracemalloc.stop()
+
+
+def test_peak_survives_reset_by_another_thread(tracing):
+    allocated = threading.Event()
+    other_done = threading.Event()
+    records = {}
+
+    @instrumented("large")
+    def large():
+        buffer = bytearray(20 * 1024 * 1024)
+        del buffer
+        allocated.set()
+        # L'étape de l'autre thread remet le pic à zéro avant la fin de celle-ci
+        other_done.wait(10)
+
+    @instrumented("small")
+    def small():
+        return bytearray(1024)
+
+    def run(func, name):
+        mdb_instrument.begin_run()
+        func()
+        records[name] = mdb_instrument.run_records()[-1]
+
+    first = threading.Thread(target=run, args=(large, "large"))
+    first.start()
+    allocated.wait(10)
+    second = threading.Thread(target=run, args=(small, "small"))
+    second.start()
+    second.join(10)
+    other_done.set()
+    first.join(10)
+
+    assert records["large"]["peak_alloc_kb"] >= 20 * 1024
+    assert records["large"]["concurrent"] and records["small"]["concurrent"]
+
+
+def test_single_session_is_not_concurrent(tracing):
+    @instrumented("alone")
+    def alone():
+        return bytearray(1024 * 1024)
+
+    mdb_instrument.begin_run()
+    alone()
+    record = mdb_instrument.run_records()[-1]
+    assert not record["concurrent"]
+    assert record["peak_alloc_kb"] >= 1024
+
+
+def test_threads_leave_no_open_stack(tracing):
+    idents = []
+
+    @instrumented("outer")
+    def outer():
+        idents.append(threading.get_ident())
+        inner()
+
+    @instrumented("inner")
+    def inner():
+        return bytearray(1024)
+
+    threads = [threading.Thread(target=outer) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    outer()
+
+    assert len(idents) == 21
+    assert not set(idents) & set(mdb_instrument._open_stacks)
@@ -0,0 +1,54 @@
+"""Matrice d'appartenance aux setups : jointure normalisée sur Symbol ou Name"""
+import numpy as np
+
+from conftest import setup_result
+from mdb_index import SetupMembership, normalize_keys
+
+
+def test_normalize_keys_ignores_case_spacing_and_unicode_form():
+    # Accents composés ou décomposés (NFD), espace insécable ; pas d'accents : autre clé
+    keys = normalize_keys(["Société Générale", "  société   GÉNÉRALE ",
+                           "Socie\u0301te\u0301\u00a0Ge\u0301ne\u0301rale", "Societe Generale"])
+    assert keys[0] == keys[1] == keys[2]
+    assert keys[3] != keys[0]
+
+
+def test_join_on_symbol_when_available(universe, setup_results):
+    membership = SetupMembership(universe, setup_results)
+    assert membership.rows_for(["MM200_Cross_Up"]).tolist() == [3, 6, 7]
+    assert membership.unmatched["MM200_Cross_Up"] == 0
+
+
+def test_join_on_name_ignores_case_and_whitespace(universe, setup_results):
+    membership = SetupMembership(universe, setup_results)
+    # « apple inc », « ESKER » et « Exxon  Mobil »
+    assert membership.rows_for(["new_high_50_days"]).tolist() == [3, 5, 8]
+    assert membership.counts.tolist() == [3, 3, 0]
+
+
+def test_unmatched_names_are_counted(universe):
+    membership = SetupMembership(universe, {
+        "s": setup_result(["Nexans", "Unknown Corp", "NEXANS"]),
+    })
+    assert membership.rows_for(["s"]).tolist() == [7]
+    assert membership.unmatched["s"] == 1
+
+
+def test_filter_rows_skips_setups_without_results(universe, setup_results):
+    membership = SetupMembership(universe, setup_results)
+    # Comme dans l'application : aucun setup sélectionné avec des résultats, pas de filtre
+    assert membership.filter_rows([]) is None
+    assert membership.filter_rows(["Weekly_SuperTrend_Cross"]) is None
+    assert membership.filter_rows(["unknown"]) is None
+    # Un setup vide ou inconnu n'efface pas les autres
+    assert membership.filter_rows(
+        ["Weekly_SuperTrend_Cross", "MM200_Cross_Up", "unknown"]).tolist() == [3, 6, 7]
+    assert membership.filter_rows(
+        ["MM200_Cross_Up", "new_high_50_days"]).tolist() == [3, 5, 6, 7, 8]
+
+
+def test_precomputed_universe_keys_give_the_same_matrix(universe, setup_results):
+    membership = SetupMembership(universe, setup_results)
+    reused = SetupMembership(universe, setup_results, membership.universe_keys)
+    assert np.array_equal(reused.matrix, membership.matrix)
+    assert set(membership.universe_keys) == {"Symbol", "Name"}
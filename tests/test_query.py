@@ -0,0 +1,109 @@
+"""Expressions de filtre : analyse, priorité des opérateurs et évaluation planifiée"""
+import re
+
+import numpy as np
+import pytest
+
+from mdb_index import FilterIndex, SetupMembership
+from mdb_query import And, Not, Or, QueryError, QueryPlanner, Term
+
+
+@pytest.fixture
+def planner(universe, setup_results):
+    return QueryPlanner(FilterIndex(universe), SetupMembership(universe, setup_results))
+
+
+def test_precedence_and_flattening(planner):
+    qual, value, small = (Term('flag', c) for c in ('qual', 'value', 'small'))
+    # NOT avant AND, AND avant OR
+    assert planner.parse("qual OR value AND NOT small") == Or((qual, And((value, Not(small)))))
+    assert planner.parse("(qual | mom) & value & PEA") == And((
+        Or((qual, Term('flag', 'mom'))), value, Term('flag', 'PEA')))
+    # (a AND b) AND c aplati, double négation supprimée
+    assert planner.parse("(qual AND value) AND small") == And((qual, value, small))
+    assert planner.parse("NOT !qual") == qual
+
+
+def test_names_and_keywords_ignore_case(planner):
+    assert planner.parse("mm200_cross_up and Qual or not pea-pme") == Or((
+        And((Term('setup', 'MM200_Cross_Up'), Term('flag', 'qual'))),
+        Not(Term('flag', 'PEA-PME'))))
+
+
+def test_quoted_values(planner):
+    assert planner.parse('market:"Euronext Paris"') == Term('Market', 'Euronext Paris')
+    assert planner.parse("sector:'consumer defensive'") == Term('Sector', 'Consumer Defensive')
+    assert planner.parse("MARKET:nasdaq") == Term('Market', 'Nasdaq')
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("", "Expression vide"),
+    ("   ", "Expression vide"),
+    ("qual AND", "Un terme attendu, la fin de l'expression trouvé"),
+    ("AND qual", "Terme attendu, « & » trouvé"),
+    ("(qual OR value", "« ) » attendu"),
+    ("qual )", "« ) » inattendu"),
+    ("qual value", "opérateur AND ou OR manquant"),
+    ("market:", "Un terme attendu"),
+    ('market:"Euronext', "Caractère inattendu en position 8"),
+    ("unknown_setup", "Terme inconnu « unknown_setup »"),
+    ("country:France", "Préfixe inconnu « country: »"),
+    ("market:Tokyo", "Valeur inconnue pour market: « Tokyo »"),
+])
+def test_malformed_expressions(planner, expression, message):
+    with pytest.raises(QueryError, match=re.escape(message)):
+        planner.parse(expression)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("qual OR value AND NOT small", lambda df, s: df.qual | (df.value & ~df.small)),
+    ("NOT (qual OR mom)", lambda df, s: ~(df.qual | df.mom)),
+    ("MM200_Cross_Up AND NOT small AND (qual OR value)",
+     lambda df, s: s["MM200_Cross_Up"] & ~df.small & (df.qual | df.value)),
+    ('market:"Euronext Paris" AND NOT sector:Technology',
+     lambda df, s: (df.Market == "Euronext Paris") & (df.Sector != "Technology")),
+    ("new_high_50_days OR PEA-PME", lambda df, s: s["new_high_50_days"] | df["PEA-PME"]),
+    ("NOT Weekly_SuperTrend_Cross", lambda df, s: ~s["Weekly_SuperTrend_Cross"]),
+])
+def test_evaluation_matches_masks(planner, universe, expression, expected):
+    members = {name: planner.membership.matrix[:, j]
+               for j, name in enumerate(planner.membership.setups)}
+    mask = np.asarray(expected(universe, members), dtype=bool)
+    assert planner.filter_rows(expression).tolist() == np.flatnonzero(mask).tolist()
+
+    # Restreinte aux lignes déjà retenues par les autres filtres
+    rows = np.array([0, 2, 3, 5, 7, 9])
+    assert planner.filter_rows(expression, rows).tolist() == rows[mask[rows]].tolist()
+
+
+def test_and_runs_most_selective_term_first(planner):
+    trace = []
+    assert planner.filter_rows("qual AND PEA-PME", trace=trace).tolist() == []
+    # PEA-PME (2 lignes) d'abord, puis qual sur ces seules lignes
+    assert trace == [("PEA-PME", 2, 10), ("qual", 5, 2)]
+
+    trace = []
+    planner.filter_rows("qual AND PEA-PME AND trend", trace=trace)
+    # Plus aucune ligne après trend : qual n'est pas évalué
+    assert [label for label, _, _ in trace] == ["PEA-PME", "trend"]
+
+
+@pytest.mark.parametrize("setups", [
+    ("MM200_Cross_Up",),
+    ("MM200_Cross_Up", "new_high_50_days"),
+    ("new_high_50_days", "Weekly_SuperTrend_Cross"),
+    ("Weekly_SuperTrend_Cross",),
+])
+def test_or_of_setups_matches_setup_filter(planner, setups):
+    expected = planner.membership.filter_rows(setups)
+    if expected is None:
+        # Aucun des setups n'a de résultats : le filtre ne retient rien de moins
+        expected = np.arange(planner.n_rows)
+    assert planner.filter_rows(" OR ".join(setups)).tolist() == expected.tolist()
+    assert planner.filter_rows(" or ".join(s.upper() for s in setups)).tolist() \
+        == expected.tolist()
+
+
+def test_or_of_setups_is_the_union(planner):
+    # Symboles AAPL, SAP, NEX ; noms apple inc, exxon mobil, esker
+    assert planner.filter_rows("MM200_Cross_Up OR new_high_50_days").tolist() == [3, 5, 6, 7, 8]
@@ -0,0 +1,115 @@
+"""Cache de résultats partagé et filtres échangés par l'URL"""
+import numpy as np
+import pytest
+
+import mdb_results
+from mdb_index import FilterSpec
+from mdb_results import (ResultCache, cached_result, restrict_spec, result_key,
+                         spec_from_params, spec_to_params)
+
+SPEC = FilterSpec(setups=("MM200_Cross_Up", "new_high_50_days"), markets=("Nasdaq",),
+                  pea_filter="PEA Eligible", criteria=("qual", "value"),
+                  sector="Technology", expression="qual AND NOT small", search="app")
+
+
+def block(n_bytes):
+    return np.zeros(n_bytes, dtype=np.uint8)
+
+
+def test_result_key_ignores_selection_order_and_case():
+    reordered = FilterSpec(setups=("new_high_50_days", "MM200_Cross_Up"), markets=("Nasdaq",),
+                           pea_filter="PEA Eligible", criteria=("value", "qual", "qual"),
+                           sector="Technology", expression="QUAL  and not SMALL", search="App")
+    assert result_key("v1", reordered) == result_key("v1", SPEC)
+    assert result_key("v2", SPEC) != result_key("v1", SPEC)
+    assert result_key("v1", FilterSpec(sector="Energy")) != result_key("v1", FilterSpec())
+
+
+def test_lru_is_bounded_in_bytes():
+    cache = ResultCache(max_bytes=3000)
+    keys = [(result_key("v1", FilterSpec(sector=s)),) for s in ("a", "b", "c", "d")]
+    for key in keys[:3]:
+        cache.get_or_compute("rows", key, lambda: block(900))
+    # a redevient la plus récemment utilisée : b est évincée par d
+    assert cache.get_or_compute("rows", keys[0], lambda: pytest.fail("recalculé")).nbytes == 900
+    cache.get_or_compute("rows", keys[3], lambda: block(900))
+
+    assert cache.evictions == 1
+    assert cache.nbytes == 2700
+    computed = []
+    cache.get_or_compute("rows", keys[1], lambda: computed.append(1) or block(900))
+    assert computed == [1]
+    assert cache.stats() == [{"kind": "rows", "hits": 1, "misses": 5, "hit_rate": 1 / 6,
+                              "entries": 3, "mb": 2700 / 1024 / 1024}]
+
+
+def test_value_larger_than_the_cache_is_not_kept():
+    cache = ResultCache(max_bytes=1000)
+    key = (result_key("v1", SPEC),)
+    assert cache.get_or_compute("export", key, lambda: b"x" * 2000) == b"x" * 2000
+    assert cache.nbytes == 0 and cache.evictions == 0
+    assert cache.stats()[0]["entries"] == 0
+
+
+def test_retain_drops_older_snapshot_versions():
+    cache = ResultCache()
+    for version in ("v1", "v2"):
+        for kind in ("rows", "aggregates"):
+            cache.get_or_compute(kind, (result_key(version, SPEC), kind), lambda: block(100))
+    cache.retain("v2")
+
+    assert cache.nbytes == 2 * block(100).nbytes
+    assert {entry["kind"]: entry["entries"] for entry in cache.stats()} == {
+        "aggregates": 1, "rows": 1}
+    computed = []
+    cache.get_or_compute("rows", (result_key("v1", SPEC), "rows"),
+                         lambda: computed.append(1) or block(100))
+    assert computed == [1]
+
+
+def test_cached_result_ignores_underscore_arguments(monkeypatch):
+    monkeypatch.setattr(mdb_results, "_result_cache", ResultCache())
+    calls = []
+
+    @cached_result("rows")
+    def rows(key, limit, _index):
+        calls.append(_index)
+        return np.arange(limit)
+
+    key = result_key("v1", SPEC)
+    assert rows(key, 3, "first").tolist() == [0, 1, 2]
+    assert rows(key, limit=3, _index="second").tolist() == [0, 1, 2]
+    assert rows(key, 4, "third").tolist() == [0, 1, 2, 3]
+    assert calls == ["first", "third"]
+
+
+def test_url_params_round_trip():
+    params = spec_to_params(SPEC)
+    assert params == {
+        "setup": ["MM200_Cross_Up", "new_high_50_days"], "marche": ["Nasdaq"],
+        "pea": ["PEA Eligible"], "critere": ["qual", "value"], "secteur": ["Technology"],
+        "expr": ["qual AND NOT small"], "q": ["app"]}
+    assert spec_from_params(params) == SPEC
+    # Valeurs par défaut absentes de l'URL
+    assert spec_to_params(FilterSpec()) == {}
+    assert spec_from_params({}) == FilterSpec()
+
+
+def test_url_params_are_cleaned():
+    spec = spec_from_params({"setup": ["a", "b", "a", ""], "pea": ["Inconnu"],
+                             "secteur": ["Energy", "Technology"], "q": [""], "other": ["x"]})
+    assert spec == FilterSpec(setups=("a", "b"), sector="Technology")
+
+
+def test_restore_drops_values_unknown_to_the_app():
+    # Lien partagé avant la suppression d'un setup, ou modifié à la main
+    shared = spec_from_params({
+        "setup": ["MM200_Cross_Up", "Removed_Setup"], "marche": ["Nasdaq", "Tokyo"],
+        "critere": ["qual", "unknown"], "secteur": ["Utilities"], "expr": ["qual"]})
+    restored = restrict_spec(shared, {"MM200_Cross_Up": "", "new_high_50_days": ""},
+                             ["Euronext Paris", "Nasdaq"], ["qual", "value"],
+                             ["Energy", "Technology"])
+    assert restored == FilterSpec(setups=("MM200_Cross_Up",), markets=("Nasdaq",),
+                                  criteria=("qual",), expression="qual")
+    assert restrict_spec(SPEC, ["MM200_Cross_Up", "new_high_50_days"], ["Nasdaq"],
+                         ["qual", "value"], ["Technology"]) == SPEC
@@ -0,0 +1,112 @@
+"""Screening sans Streamlit : filtres sauvegardés, évaluation en lot et CLI"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import mdb_screen
+from mdb_index import FilterSpec
+from mdb_screen import Screener, _output_paths, load_specs, spec_from_dict
+
+
+@pytest.fixture
+def screener(universe, setup_results, monkeypatch):
+    screener = Screener(universe, {}, setup_results)
+    # La CLI évalue les filtres sur cet univers au lieu de le télécharger
+    monkeypatch.setattr(Screener, "load", classmethod(lambda cls: screener))
+    return screener
+
+
+def test_spec_from_dict():
+    spec = spec_from_dict({"setups": "MM200_Cross_Up", "markets": ["Nasdaq", "NYSE"],
+                           "pea_filter": "PEA Eligible", "expression": "qual"})
+    assert spec == FilterSpec(setups=("MM200_Cross_Up",), markets=("Nasdaq", "NYSE"),
+                              pea_filter="PEA Eligible", expression="qual")
+    with pytest.raises(ValueError, match="Champs de filtre inconnus : \\['market'\\]"):
+        spec_from_dict({"market": "Nasdaq"})
+    with pytest.raises(ValueError, match="Filtre PEA inconnu"):
+        spec_from_dict({"pea_filter": "PEA"})
+
+
+def test_load_specs_forms(tmp_path):
+    listed = tmp_path / "list.json"
+    listed.write_text(json.dumps([{"name": "paris", "markets": "Euronext Paris"},
+                                  {"criteria": ["qual"]}]), encoding="utf-8")
+    assert load_specs(str(listed)) == {
+        "paris": FilterSpec(markets=("Euronext Paris",)),
+        "screen_002": FilterSpec(criteria=("qual",)),
+    }
+
+    named = tmp_path / "named.json"
+    named.write_text(json.dumps({"tech": {"sector": "Technology"}}), encoding="utf-8")
+    assert load_specs(str(named)) == {"tech": FilterSpec(sector="Technology")}
+
+    lines = tmp_path / "lines.jsonl"
+    lines.write_text('{"name": "a", "search": "apple"}\n\n{"name": "b"}\n', encoding="utf-8")
+    assert load_specs(str(lines)) == {"a": FilterSpec(search="apple"), "b": FilterSpec()}
+
+
+def test_load_specs_rejects_duplicate_names(tmp_path):
+    path = tmp_path / "dup.jsonl"
+    path.write_text('{"name": "a"}\n{"name": "a", "criteria": "qual"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="Nom de filtre en double : 'a'"):
+        load_specs(str(path))
+
+
+def test_output_paths_reject_colliding_file_names(tmp_path):
+    paths = _output_paths(["Paris PEA", "paris-pea"], str(tmp_path), "csv")
+    assert paths == {"Paris PEA": str(tmp_path / "Paris_PEA.csv"),
+                     "paris-pea": str(tmp_path / "paris-pea.csv")}
+    with pytest.raises(ValueError, match="'a/b' et 'a b'.*a_b.csv"):
+        _output_paths(["a/b", "a b"], str(tmp_path), "csv")
+    # Même fichier sur un système de fichiers insensible à la casse
+    with pytest.raises(ValueError, match="même fichier"):
+        _output_paths(["Tech", "tech"], str(tmp_path), "csv")
+
+
+def test_rows_many_matches_rows(screener):
+    specs = {
+        "setups": FilterSpec(setups=("MM200_Cross_Up", "new_high_50_days")),
+        "empty_setup": FilterSpec(setups=("Weekly_SuperTrend_Cross",), criteria=("qual",)),
+        "expression": FilterSpec(setups=("MM200_Cross_Up",), expression="NOT small"),
+    }
+    results = screener.rows_many(specs)
+    assert {name: rows.tolist() for name, rows in results.items()} == {
+        "setups": [3, 5, 6, 7, 8],
+        # Setup sans résultat : ignoré, comme dans l'application
+        "empty_setup": [0, 1, 2, 3, 6],
+        "expression": [3, 6],
+    }
+    for name, spec in specs.items():
+        assert screener.rows(spec).tolist() == results[name].tolist()
+
+
+def test_main_writes_one_file_per_screen(screener, tmp_path, capsys):
+    specs = tmp_path / "specs.json"
+    specs.write_text(json.dumps({
+        "paris": {"markets": ["Euronext Paris"], "pea_filter": "PEA-PME Eligible"},
+        "apple": {"search": "app"},
+    }), encoding="utf-8")
+    output_dir = tmp_path / "out"
+
+    assert mdb_screen.main([str(specs), "-o", str(output_dir)]) == 0
+    assert sorted(os.listdir(output_dir)) == ["apple.csv", "paris.csv"]
+    assert pd.read_csv(output_dir / "paris.csv", sep=';')['Symbol'].tolist() == ["NEX", "ALESK"]
+    assert pd.read_csv(output_dir / "apple.csv", sep=';')['Symbol'].tolist() == ["AAPL", "AMAT"]
+    out = capsys.readouterr().out
+    assert f"paris\t2\t{output_dir / 'paris.csv'}" in out
+
+
+@pytest.mark.parametrize("entries, message", [
+    ([{"name": "bad", "expression": "qual AND"}], "bad: expression invalide"),
+    ([{"name": "a/b"}, {"name": "a b"}], "même fichier a_b.csv"),
+])
+def test_main_rejects_invalid_screens(screener, tmp_path, capsys, entries, message):
+    specs = tmp_path / "specs.json"
+    specs.write_text(json.dumps(entries), encoding="utf-8")
+    with pytest.raises(SystemExit) as excinfo:
+        mdb_screen.main([str(specs), "-o", str(tmp_path / "out")])
+    assert excinfo.value.code == 2
+    assert message in capsys.readouterr().err
+    assert not (tmp_path / "out").exists()
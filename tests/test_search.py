@@ -0,0 +1,73 @@
+"""Recherche sur l'univers : accents, fautes de frappe, préfixes et ordre de pertinence"""
+import numpy as np
+import pytest
+
+from mdb_index import FilterSpec
+from mdb_screen import Screener
+from mdb_search import SearchIndex, normalize_text
+
+
+@pytest.fixture
+def search(universe):
+    return SearchIndex(universe)
+
+
+def test_normalize_text():
+    assert normalize_text(["Société Générale", "L'ORÉAL", None]).tolist() == [
+        "societe generale", "l oreal", ""]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("societe generale", [0]),
+    ("Société", [0]),
+    ("L'ORÉAL", [1]),
+    ("hermes", [2]),
+])
+def test_accent_and_case_insensitive(search, query, expected):
+    assert search.search(query).tolist() == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("microsft", [9]),
+    ("exon mobil", [5]),
+    ("hermès internatonal", [2]),
+])
+def test_typo_tolerant(search, query, expected):
+    assert search.search(query).tolist() == expected
+
+
+def test_prefix_match_ranks_shorter_completions_first(search):
+    # « apple » complète mieux « app » que « applied »
+    assert search.search("app").tolist() == [3, 4]
+    assert search.search("techno").tolist() == search.search("technology").tolist()
+
+
+def test_relevance_follows_field_weights(search):
+    # Industry (Consumer Electronics) avant Sector (Consumer Defensive, Consumer Cyclical),
+    # puis l'ordre de l'univers à score égal
+    assert search.search("consumer").tolist() == [3, 1, 2]
+    assert search.search("software").tolist() == [6, 8, 9]
+    assert search.search("consumer", limit=1).tolist() == [3]
+
+
+def test_every_word_must_match(search):
+    assert search.search("apple materials").tolist() == []
+    assert search.search("apple inc").tolist() == [3]
+
+
+def test_no_match_and_empty_query(search):
+    assert search.search("zzzz").tolist() == []
+    assert search.search("").tolist() == list(range(10))
+    assert search.search(" ,; ").tolist() == list(range(10))
+    # Requête vide : les lignes déjà retenues, inchangées
+    assert search.search("", np.array([1, 2])).tolist() == [1, 2]
+
+
+def test_restricted_to_rows(search):
+    assert search.search("technology", np.array([0, 3, 9])).tolist() == [3, 9]
+
+
+def test_screener_applies_search(universe, setup_results):
+    screener = Screener(universe, {}, setup_results)
+    assert screener.rows(FilterSpec(markets=("Nasdaq",), search="app")).tolist() == [3, 4]
+    assert screener.rows(FilterSpec(search="zzzz")).tolist() == []